@@ -0,0 +1 @@
+# Copyright 2021-present Kensho Technologies, LLC.
@@ -0,0 +1,405 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Time pipeline tasks and their hot helpers on synthetic dumps.
+
+Example (from the repository root)::
+
+    python -m benchmarks.run_benchmarks --scale 100k --data_path /tmp/kwnlp-bench-100k
+
+Synthetic inputs are generated once per data path (see benchmarks.synthetic)
+and reused by later runs. Every task main is run in order, each in a fresh
+process, and measured with the same instrumentation used for pipeline run
+reports. Then each helper benchmark times a hot function over a sample of
+the generated data. Results are printed and written as JSON.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+from tempfile import TemporaryDirectory
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+import mwtext
+
+from benchmarks import synthetic
+from kwnlp_preprocessor import (
+    argconfig,
+    bz2_blocks,
+    instrumentation,
+    run_all_tasks,
+    scheduler,
+    task_18p1_filter_wikidata_dump,
+    task_27p1_parse_wikitext,
+    title_index,
+)
+
+logger = logging.getLogger(__name__)
+
+
+WP_YYYYMMDD = "20210701"
+WD_YYYYMMDD = "20210705"
+GENERATED_MARKER = "kwnlp-synthetic-inputs.json"
+
+
+class HelperInputs(NamedTuple):
+    data_path: str
+    wiki: str
+    sample_size: int
+    wikidata_split: str = argconfig.DEFAULT_KWNLP_WIKIDATA_SPLIT
+
+
+# helper benchmarks
+# each setup function returns (function to time, number of rows it processes)
+# ============================================================
+
+
+def _get_first_file(dir_path: str) -> str:
+    return os.path.join(dir_path, sorted(os.listdir(dir_path))[0])
+
+
+def _read_sample_pages(inputs: HelperInputs) -> List[task_27p1_parse_wikitext.PageText]:
+    dir_path = os.path.join(inputs.data_path, f"wikipedia-raw-{WP_YYYYMMDD}", "articlesdump")
+    return list(
+        task_27p1_parse_wikitext._iter_page_texts(_get_first_file(dir_path), inputs.sample_size)
+    )
+
+
+def _open_title_index(inputs: HelperInputs) -> title_index.TitleIndex:
+    dir_path = os.path.join(
+        inputs.data_path,
+        f"wikipedia-derived-{WP_YYYYMMDD}",
+        "kwnlp-sql",
+        f"kwnlp-{inputs.wiki}-{WP_YYYYMMDD}-title-index",
+    )
+    return title_index.TitleIndex(dir_path)
+
+
+def _setup_link_annotated_text(inputs: HelperInputs) -> Tuple[Callable[[], None], int]:
+    pages = _read_sample_pages(inputs)
+    transformer = mwtext.Wikitext2Structured(
+        forbidden_wikilink_prefixes=task_27p1_parse_wikitext.FORBIDDEN_WIKILINK_PREFIXES,
+    )
+
+    def run() -> None:
+        for page_text in pages:
+            task_27p1_parse_wikitext._get_link_annotated_text_from_page(page_text, transformer)
+
+    return run, len(pages)
+
+
+def _setup_compressed_link_annotated_text(
+    inputs: HelperInputs,
+) -> Tuple[Callable[[], None], int]:
+    title_id_index = _open_title_index(inputs)
+    transformer = mwtext.Wikitext2Structured(
+        forbidden_wikilink_prefixes=task_27p1_parse_wikitext.FORBIDDEN_WIKILINK_PREFIXES,
+    )
+    link_annotated_texts = [
+        task_27p1_parse_wikitext._get_link_annotated_text_from_page(page_text, transformer)
+        for page_text in _read_sample_pages(inputs)
+    ]
+
+    def run() -> None:
+        for link_annotated_text in link_annotated_texts:
+            task_27p1_parse_wikitext._create_compressed_link_annotated_text(
+                link_annotated_text, title_id_index
+            )
+
+    return run, len(link_annotated_texts)
+
+
+def _read_sample_entity_lines(inputs: HelperInputs) -> List[bytes]:
+    dir_path = os.path.join(inputs.data_path, f"wikidata-raw-chunks-{WD_YYYYMMDD}")
+    if inputs.wikidata_split == "blocks":
+        # sample the first range of blocks of the raw dump
+        block_index_path = os.path.join(dir_path, f"wikidata-{WD_YYYYMMDD}-block-index.npz")
+        first, last = bz2_blocks.read_block_index(block_index_path).get_ranges()[0]
+        args = {
+            "wikidata_file_path": os.path.join(
+                inputs.data_path,
+                f"wikidata-raw-{WD_YYYYMMDD}",
+                f"wikidata-{WD_YYYYMMDD}-all.json.bz2",
+            ),
+            "block_index_path": block_index_path,
+            "block_range": [first, last],
+        }
+    else:
+        args = {"wikidata_file_path": _get_first_file(dir_path)}
+    lines = []
+    for line in task_18p1_filter_wikidata_dump._iter_entity_lines(args):
+        lines.append(line)
+        if len(lines) >= inputs.sample_size:
+            break
+    return lines
+
+
+def _setup_entity_json_loads(inputs: HelperInputs) -> Tuple[Callable[[], None], int]:
+    lines = _read_sample_entity_lines(inputs)
+
+    def run() -> None:
+        for line in lines:
+            task_18p1_filter_wikidata_dump._json_loads(line)
+
+    return run, len(lines)
+
+
+def _setup_item_field_extraction(inputs: HelperInputs) -> Tuple[Callable[[], None], int]:
+    task_18p1 = task_18p1_filter_wikidata_dump
+    entity_dicts = [task_18p1._json_loads(line) for line in _read_sample_entity_lines(inputs)]
+    item_dicts = [entity_dict for entity_dict in entity_dicts if entity_dict["type"] == "item"]
+
+    def run() -> None:
+        # the per item work of task_18p1.parse_file without the csv writing
+        for item_dict in item_dicts:
+            source_id = item_dict["id"][1:]
+            claim_groups = task_18p1._get_claim_groups(item_dict)
+            task_18p1._get_target_rows(source_id, claim_groups.get("P31", []))
+            task_18p1._get_target_rows(source_id, claim_groups.get("P279", []))
+            for claims in claim_groups.values():
+                item_claims = [
+                    claim
+                    for claim in task_18p1._get_truthy_claims(claims)
+                    if claim["mainsnak"].get("datatype") == "wikibase-item"
+                ]
+                task_18p1._get_target_rows(source_id, item_claims)
+            task_18p1._get_text(item_dict, "labels", "en")
+            task_18p1._get_text(item_dict, "descriptions", "en")
+            task_18p1._get_aliases(item_dict, "en")
+            sitelinks = item_dict.get("sitelinks")
+            isinstance(sitelinks, dict) and inputs.wiki in sitelinks
+
+    return run, len(item_dicts)
+
+
+HELPER_BENCHMARKS: Dict[str, Callable[[HelperInputs], Tuple[Callable[[], None], int]]] = {
+    "task_27p1._get_link_annotated_text_from_page": _setup_link_annotated_text,
+    "task_27p1._create_compressed_link_annotated_text": _setup_compressed_link_annotated_text,
+    "task_18p1._json_loads": _setup_entity_json_loads,
+    "task_18p1.item field extraction": _setup_item_field_extraction,
+}
+
+
+# harness
+# ============================================================
+
+
+def ensure_inputs(data_path: str, num_articles: int, wiki: str) -> float:
+    """Generate synthetic inputs unless they exist. Return seconds spent generating."""
+    marker_path = os.path.join(data_path, GENERATED_MARKER)
+    expected = {"num_articles": num_articles, "wiki": wiki}
+    if instrumentation.read_json(marker_path) == expected:
+        logger.info(f"reusing synthetic inputs in {data_path}")
+        return 0.0
+    t_start = time.perf_counter()
+    synthetic.generate(data_path, num_articles, WP_YYYYMMDD, WD_YYYYMMDD, wiki)
+    instrumentation.write_json(marker_path, expected)
+    return time.perf_counter() - t_start
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def run_tasks(
+    data_path: str,
+    wiki: str,
+    workers: int,
+    task_prefixes: Sequence[str],
+    pipeline_readers: int = argconfig.DEFAULT_KWNLP_PIPELINE_READERS,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    wikidata_split: str = argconfig.DEFAULT_KWNLP_WIKIDATA_SPLIT,
+    wikidata_codec: str = argconfig.DEFAULT_KWNLP_WIKIDATA_CODEC,
+) -> List[Dict[str, Any]]:
+    """Run task mains in pipeline order and return their metrics."""
+    params = {
+        "wp_yyyymmdd": WP_YYYYMMDD,
+        "wd_yyyymmdd": WD_YYYYMMDD,
+        "data_path": data_path,
+        "wiki": wiki,
+        "max_entities": argconfig.DEFAULT_KWNLP_MAX_ENTITIES,
+        "workers": workers,
+        "pipeline_readers": pipeline_readers,
+        "table_format": table_format,
+        "wikidata_split": wikidata_split,
+        "wikidata_codec": wikidata_codec,
+        "include_item_statements": True,
+    }
+    # nothing to download
+    module_names = [task.__name__ for task in run_all_tasks.TASKS[1:]]
+    ctx = multiprocessing.get_context("spawn")
+    loglevel = logging.getLogger().getEffectiveLevel()
+    results = []
+    with TemporaryDirectory() as metrics_dir:
+        for stage in scheduler.build_stages(module_names, params, cpu_budget=workers):
+            if task_prefixes and not scheduler._matches_stage_name(stage.name, task_prefixes):
+                continue
+            logger.info(f"running {stage.name}")
+            # start from scratch so chunk checkpoints from earlier runs are not reused
+            for out_path in stage.outputs:
+                _remove(os.path.join(data_path, out_path))
+            metrics_path = os.path.join(metrics_dir, f"{stage.name}.json")
+            # a fresh process per task so peak memory is not carried over between tasks
+            process = ctx.Process(
+                target=scheduler._run_stage,
+                args=(stage.module_name, stage.kwargs, loglevel, metrics_path),
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f"{stage.name} failed with exit code {process.exitcode}")
+            metrics = instrumentation.read_json(metrics_path)
+            if metrics is None:
+                raise RuntimeError(f"{stage.name} exited without writing metrics to {metrics_path}")
+            metrics["name"] = stage.name
+            metrics["inputs"] = instrumentation.get_path_sizes(data_path, stage.inputs)
+            metrics["outputs"] = instrumentation.get_path_sizes(data_path, stage.outputs)
+            results.append(metrics)
+    return results
+
+
+def run_helpers(inputs: HelperInputs, repeat: int, names: Sequence[str]) -> List[Dict[str, Any]]:
+    """Time helper benchmarks, keeping the best of `repeat` runs."""
+    results = []
+    for name, setup in HELPER_BENCHMARKS.items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        run, rows = setup(inputs)
+        timings = []
+        for _ in range(repeat):
+            t_start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - t_start)
+        seconds = min(timings)
+        results.append(
+            {
+                "name": name,
+                "rows": rows,
+                "repeat": repeat,
+                "seconds": seconds,
+                "rows_per_second": rows / max(seconds, 1e-9),
+            }
+        )
+    return results
+
+
+def print_results(report: Dict[str, Any]) -> None:
+    print(f"scale: {report['scale']} ({report['num_articles']} articles)")
+    print(f"{'task':<48} {'wall s':>9} {'cpu s':>9} {'peak rss MB':>12}")
+    for metrics in report["tasks"]:
+        peak_rss = max(metrics["peak_rss_bytes"], metrics["peak_child_rss_bytes"])
+        print(
+            "{:<48} {:>9.2f} {:>9.2f} {:>12.1f}".format(
+                metrics["name"], metrics["wall_seconds"], metrics["cpu_seconds"], peak_rss / 1e6
+            )
+        )
+    print(f"{'helper':<48} {'rows':>9} {'s':>9} {'rows/s':>12}")
+    for result in report["helpers"]:
+        print(
+            "{:<48} {:>9d} {:>9.3f} {:>12.1f}".format(
+                result["name"], result["rows"], result["seconds"], result["rows_per_second"]
+            )
+        )
+
+
+def main(
+    scale: str,
+    data_path: str,
+    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
+    pipeline_readers: int = argconfig.DEFAULT_KWNLP_PIPELINE_READERS,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    wikidata_split: str = argconfig.DEFAULT_KWNLP_WIKIDATA_SPLIT,
+    wikidata_codec: str = argconfig.DEFAULT_KWNLP_WIKIDATA_CODEC,
+    tasks: Sequence[str] = (),
+    helpers: Sequence[str] = (),
+    sample_size: int = 1000,
+    repeat: int = 3,
+    report_path: str = "",
+) -> Dict[str, Any]:
+    num_articles = synthetic.get_num_articles(scale)
+    report: Dict[str, Any] = {
+        "scale": scale,
+        "num_articles": num_articles,
+        "workers": workers,
+        "pipeline_readers": pipeline_readers,
+        "table_format": table_format,
+        "wikidata_split": wikidata_split,
+        "wikidata_codec": wikidata_codec,
+    }
+    report["generate_seconds"] = ensure_inputs(data_path, num_articles, wiki)
+    report["tasks"] = run_tasks(
+        data_path,
+        wiki,
+        workers,
+        tasks,
+        pipeline_readers,
+        table_format,
+        wikidata_split,
+        wikidata_codec,
+    )
+    helper_inputs = HelperInputs(data_path, wiki, sample_size, wikidata_split)
+    report["helpers"] = run_helpers(helper_inputs, repeat, helpers)
+    print_results(report)
+    if report_path:
+        instrumentation.write_json(report_path, report)
+    return report
+
+
+if __name__ == "__main__":
+
+    description = "benchmark tasks on synthetic dumps"
+    arg_names = [
+        "wiki",
+        "workers",
+        "pipeline_readers",
+        "table_format",
+        "wikidata_split",
+        "wikidata_codec",
+        "loglevel",
+    ]
+    parser = argconfig.get_argparser(description, arg_names)
+    parser.add_argument(
+        "--scale",
+        default="1k",
+        help="number of articles as {} or an integer".format("/".join(synthetic.SCALES)),
+    )
+    parser.add_argument(
+        "--data_path", required=True, help="directory for synthetic inputs and task outputs"
+    )
+    parser.add_argument(
+        "--tasks",
+        default="",
+        help="comma separated task prefixes to run (e.g. task_18p1). outputs of earlier tasks "
+        "must already be in data_path. default is all tasks.",
+    )
+    parser.add_argument(
+        "--helpers",
+        default="",
+        help="comma separated helper benchmark prefixes to run (e.g. task_27p1). default is all.",
+    )
+    parser.add_argument("--sample_size", default=1000, type=int, help="rows per helper benchmark")
+    parser.add_argument("--repeat", default=3, type=int, help="runs per helper benchmark")
+    parser.add_argument("--report_path", default="", help="write JSON results to this path")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel)
+    logger.info(f"args={args}")
+
+    main(
+        args.scale,
+        args.data_path,
+        wiki=args.wiki,
+        workers=args.workers,
+        pipeline_readers=args.pipeline_readers,
+        table_format=args.table_format,
+        wikidata_split=args.wikidata_split,
+        wikidata_codec=args.wikidata_codec,
+        tasks=argconfig.list_from_comma_delimited_string(args.tasks) if args.tasks else [],
+        helpers=argconfig.list_from_comma_delimited_string(args.helpers) if args.helpers else [],
+        sample_size=args.sample_size,
+        repeat=args.repeat,
+        report_path=args.report_path,
+    )
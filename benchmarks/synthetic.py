@@ -0,0 +1,565 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Generate synthetic raw dumps in the formats the pipeline consumes.
+
+The generated data directory has the same layout as the one written by
+task_00_download_raw_dumps,
+
+* wikipedia-raw-YYYYMMDD/pageviewcomplete/pageviews-YYYYMMDD-user.bz2 (one per day)
+* wikipedia-raw-YYYYMMDD/{pagetable,pagepropstable,redirecttable}/WIKI-YYYYMMDD-TABLE.sql.gz
+* wikipedia-raw-YYYYMMDD/articlesdump/WIKI-YYYYMMDD-pages-articlesN.xml-pXpY.bz2 (multistream)
+* wikidata-raw-YYYYMMDD/wikidata-YYYYMMDD-all.json.bz2
+
+Everything is a deterministic function of the number of articles so the
+same scale always produces the same bytes. For every two articles there is
+one redirect and every tenth redirect points at another redirect. Articles
+link to each other and to redirects, and each article has a Wikidata item
+with a sitelink, labels, aliases and a few claims. One in twenty items is an
+instance of scholarly article so that the skip logic in task_18p1 is hit.
+"""
+import bz2
+import datetime
+import gzip
+import json
+import logging
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+logger = logging.getLogger(__name__)
+
+
+SCALES = {"1k": 1_000, "100k": 100_000, "10m": 10_000_000}
+
+SQL_ROWS_PER_INSERT = 1_000
+XML_PAGES_PER_STREAM = 100
+ARTICLES_PER_CHUNK = 250_000
+MIN_ARTICLE_CHUNKS = 4
+
+ITEM_QID_OFFSET = 1_000_000
+HUMAN_NQID = 5
+ORGANIZATION_NQID = 43229
+BUSINESS_NQID = 4830453
+GEOGRAPHIC_LOCATION_NQID = 2221906
+SCHOLARLY_ARTICLE_NQID = 13442814
+COUNTRY_NQID = 30
+ENTITY_NQID = 35120
+ARTICLE_P31_NQIDS = [HUMAN_NQID, BUSINESS_NQID, GEOGRAPHIC_LOCATION_NQID]
+
+
+class Page(NamedTuple):
+    page_id: int
+    title: str
+    is_redirect: bool
+    target_title: str
+    article_idx: int
+
+
+def get_num_articles(scale: str) -> int:
+    """Convert a scale name (e.g. "100k") or integer string to a number of articles."""
+    return SCALES[scale.lower()] if scale.lower() in SCALES else int(scale)
+
+
+def _rand(idx: int, salt: int) -> float:
+    """Cheap deterministic pseudo random number in [0, 1)."""
+    return ((idx * 2654435761 + salt * 40503 + 12345) % 4294967296) / 4294967296
+
+
+def _article_title(article_idx: int) -> str:
+    if article_idx % 50 == 7:
+        return f"O'Synthetic_article_{article_idx}"
+    return f"Synthetic_article_{article_idx}"
+
+
+def _redirect_title(redirect_idx: int) -> str:
+    return f"Synthetic_redirect_{redirect_idx}"
+
+
+def _article_page_id(article_idx: int) -> int:
+    return 3 * (article_idx // 2) + article_idx % 2 + 1
+
+
+def _redirect_target_title(redirect_idx: int, num_articles: int) -> str:
+    if redirect_idx % 10 == 9:
+        # double redirect, always to an earlier redirect so there are no cycles
+        return _redirect_title(redirect_idx // 2)
+    return _article_title((redirect_idx * 7919) % num_articles)
+
+
+def iter_pages(num_articles: int) -> Iterator[Page]:
+    """Generate article and redirect pages in page_id order."""
+    for article_idx in range(num_articles):
+        yield Page(
+            _article_page_id(article_idx), _article_title(article_idx), False, "", article_idx
+        )
+        if article_idx % 2 == 1:
+            redirect_idx = article_idx // 2
+            yield Page(
+                3 * redirect_idx + 3,
+                _redirect_title(redirect_idx),
+                True,
+                _redirect_target_title(redirect_idx, num_articles),
+                -1,
+            )
+
+
+def _sql_quote(value: str) -> str:
+    return "'{}'".format(value.replace("\\", "\\\\").replace("'", "\\'"))
+
+
+# sql dumps
+# ============================================================
+
+PAGE_CREATE_TABLE = """CREATE TABLE `page` (
+  `page_id` int(8) unsigned NOT NULL AUTO_INCREMENT,
+  `page_namespace` int(11) NOT NULL DEFAULT 0,
+  `page_title` varbinary(255) NOT NULL DEFAULT '',
+  `page_restrictions` tinyblob DEFAULT NULL,
+  `page_is_redirect` tinyint(1) unsigned NOT NULL DEFAULT 0,
+  `page_is_new` tinyint(1) unsigned NOT NULL DEFAULT 0,
+  `page_random` double unsigned NOT NULL DEFAULT 0,
+  `page_touched` varbinary(14) NOT NULL,
+  `page_links_updated` varbinary(14) DEFAULT NULL,
+  `page_latest` int(8) unsigned NOT NULL DEFAULT 0,
+  `page_len` int(8) unsigned NOT NULL DEFAULT 0,
+  `page_content_model` varbinary(32) DEFAULT NULL,
+  `page_lang` varbinary(35) DEFAULT NULL,
+  PRIMARY KEY (`page_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=binary ROW_FORMAT=COMPRESSED;
+"""
+
+PAGE_PROPS_CREATE_TABLE = """CREATE TABLE `page_props` (
+  `pp_page` int(11) NOT NULL DEFAULT 0,
+  `pp_propname` varbinary(60) NOT NULL DEFAULT '',
+  `pp_value` blob NOT NULL,
+  `pp_sortkey` float DEFAULT NULL,
+  PRIMARY KEY (`pp_page`,`pp_propname`)
+) ENGINE=InnoDB DEFAULT CHARSET=binary ROW_FORMAT=COMPRESSED;
+"""
+
+REDIRECT_CREATE_TABLE = """CREATE TABLE `redirect` (
+  `rd_from` int(8) unsigned NOT NULL DEFAULT 0,
+  `rd_namespace` int(11) NOT NULL DEFAULT 0,
+  `rd_title` varbinary(255) NOT NULL DEFAULT '',
+  `rd_interwiki` varbinary(32) DEFAULT NULL,
+  `rd_fragment` varbinary(255) DEFAULT NULL,
+  PRIMARY KEY (`rd_from`)
+) ENGINE=InnoDB DEFAULT CHARSET=binary ROW_FORMAT=COMPRESSED;
+"""
+
+
+def _write_sql_dump(file_path: str, table: str, create_table: str, rows: Iterator[str]) -> None:
+    """Write rows (already formatted as "(...)") as a mysqldump style gzip file."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with gzip.open(file_path, "wt", encoding="utf-8", compresslevel=1) as fp:
+        fp.write(f"-- synthetic dump of table `{table}`\n\n")
+        fp.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+        fp.write(create_table)
+        fp.write("\n")
+        buffer: List[str] = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == SQL_ROWS_PER_INSERT:
+                fp.write("INSERT INTO `{}` VALUES {};\n".format(table, ",".join(buffer)))
+                buffer = []
+        if buffer:
+            fp.write("INSERT INTO `{}` VALUES {};\n".format(table, ",".join(buffer)))
+
+
+PAGE_ROW_TEMPLATE = (
+    "({},0,{},'',{},0,{:.8f},'20210629135708','20210629135919',{},{},'wikitext',NULL)"
+)
+
+
+def _iter_page_rows(num_articles: int) -> Iterator[str]:
+    for page in iter_pages(num_articles):
+        text_len = 12 + len(page.target_title) if page.is_redirect else 2000
+        yield PAGE_ROW_TEMPLATE.format(
+            page.page_id,
+            _sql_quote(page.title),
+            int(page.is_redirect),
+            _rand(page.page_id, 1),
+            900_000_000 + page.page_id,
+            text_len,
+        )
+
+
+def _iter_page_props_rows(num_articles: int) -> Iterator[str]:
+    for page in iter_pages(num_articles):
+        if page.is_redirect:
+            continue
+        idx = page.article_idx
+        if idx % 5 == 0:
+            yield "({},'defaultsort',{},NULL)".format(page.page_id, _sql_quote(f"Article {idx}"))
+        yield "({},'wikibase-shortdesc',{},NULL)".format(
+            page.page_id, _sql_quote(f"Synthetic description {idx}")
+        )
+        yield "({},'wikibase_item','Q{}',NULL)".format(page.page_id, ITEM_QID_OFFSET + idx)
+
+
+def _iter_redirect_rows(num_articles: int) -> Iterator[str]:
+    for page in iter_pages(num_articles):
+        if page.is_redirect:
+            yield "({},0,{},'','')".format(page.page_id, _sql_quote(page.target_title))
+
+
+# pageviews
+# ============================================================
+
+
+def _get_prior_month_days(wp_yyyymmdd: str) -> List[datetime.date]:
+    wp_date = datetime.date(int(wp_yyyymmdd[0:4]), int(wp_yyyymmdd[4:6]), int(wp_yyyymmdd[6:8]))
+    last_day = wp_date.replace(day=1) - datetime.timedelta(days=1)
+    return [last_day.replace(day=day) for day in range(1, last_day.day + 1)]
+
+
+def _write_pageviews(file_path: str, num_articles: int, wiki: str, day: int) -> None:
+    """Write one day of pageviews with lines for this wiki and for another project."""
+    code = wiki.replace("wiki", "")
+    other_code = "de" if code != "de" else "fr"
+    with bz2.open(file_path, "wt", encoding="utf-8", compresslevel=1) as fp:
+        lines = []
+        for page in iter_pages(num_articles):
+            views = int(_rand(page.page_id, day) * 1000)
+            lines.append(f"{code}.wikipedia {page.title} {page.page_id} desktop {views} A{views}\n")
+            if page.page_id % 2 == 0:
+                lines.append(
+                    f"{code}.wikipedia {page.title} {page.page_id} mobile-web {views // 2 + 1} "
+                    f"A{views // 2 + 1}\n"
+                )
+            if page.page_id % 7 == 0:
+                lines.append(f"{code}.wikipedia {page.title} null mobile-app 1 A1\n")
+            if page.page_id % 10 == 0:
+                lines.append(f"{other_code}.wikipedia {page.title} {page.page_id} desktop 3 A3\n")
+            if len(lines) >= 10_000:
+                fp.write("".join(lines))
+                lines = []
+        fp.write("".join(lines))
+
+
+# article dumps
+# ============================================================
+
+MEDIAWIKI_HEADER = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="en">
+  <siteinfo>
+    <sitename>Wikipedia</sitename>
+    <dbname>{wiki}</dbname>
+    <base>https://en.wikipedia.org/wiki/Main_Page</base>
+    <generator>MediaWiki 1.37.0-wmf.11</generator>
+    <case>first-letter</case>
+    <namespaces>
+      <namespace key="0" case="first-letter" />
+      <namespace key="6" case="first-letter">File</namespace>
+      <namespace key="10" case="first-letter">Template</namespace>
+      <namespace key="14" case="first-letter">Category</namespace>
+    </namespaces>
+  </siteinfo>
+"""
+
+PAGE_TEMPLATE = """  <page>
+    <title>{title}</title>
+    <ns>0</ns>
+    <id>{page_id}</id>
+{redirect}    <revision>
+      <id>{revision_id}</id>
+      <timestamp>2021-06-16T21:20:17Z</timestamp>
+      <contributor>
+        <username>Synthetic</username>
+        <id>1</id>
+      </contributor>
+      <model>wikitext</model>
+      <format>text/x-wiki</format>
+      <text bytes="{num_bytes}" xml:space="preserve">{text}</text>
+    </revision>
+  </page>
+"""
+
+
+def _link_title(article_idx: int, salt: int, num_articles: int) -> str:
+    """Title with spaces of a random article or (sometimes) redirect."""
+    target_idx = int(_rand(article_idx, salt) * num_articles)
+    if salt % 4 == 3 and num_articles > 1:
+        return _redirect_title(target_idx // 2).replace("_", " ")
+    return _article_title(target_idx).replace("_", " ")
+
+
+def get_article_wikitext(article_idx: int, num_articles: int) -> str:
+    """Return wikitext with sections, links, templates and categories."""
+    title = _article_title(article_idx).replace("_", " ")
+    pieces = [
+        f"{{{{short description|Synthetic description {article_idx}}}}}",
+    ]
+    if article_idx % 50 == 0:
+        pieces.append("{{good article}}")
+    if article_idx % 97 == 0:
+        pieces.append("{{featured article}}")
+    pieces.append(
+        f"'''{title}''' is a synthetic article that links to "
+        f"[[{_link_title(article_idx, 1, num_articles)}]] and "
+        f"[[{_link_title(article_idx, 2, num_articles)}|another article]]."
+    )
+    salt = 3
+    for section_idx in range(1, 4):
+        pieces.append(f"\n== Section {section_idx} ==")
+        for _ in range(2):
+            links = []
+            for _ in range(5):
+                links.append(f"[[{_link_title(article_idx, salt, num_articles)}|link {salt}]]")
+                salt += 1
+            pieces.append(
+                "This paragraph mentions {} as well as [[File:Image.jpg]] and {}.".format(
+                    ", ".join(links), "some plain text " * 4
+                )
+            )
+    pieces.append(f"\n[[Category:Synthetic articles {article_idx % 10}]]")
+    return "\n".join(pieces)
+
+
+def _get_page_xml(page: Page, num_articles: int) -> str:
+    if page.is_redirect:
+        text = "#REDIRECT [[{}]]".format(page.target_title.replace("_", " "))
+        redirect = "    <redirect title={} />\n".format(
+            quoteattr(page.target_title.replace("_", " "))
+        )
+    else:
+        text = get_article_wikitext(page.article_idx, num_articles)
+        redirect = ""
+    return PAGE_TEMPLATE.format(
+        title=escape(page.title.replace("_", " ")),
+        page_id=page.page_id,
+        redirect=redirect,
+        revision_id=900_000_000 + page.page_id,
+        num_bytes=len(text.encode("utf-8")),
+        text=escape(text),
+    )
+
+
+def _write_article_dumps(dir_path: str, num_articles: int, wiki: str, wp_yyyymmdd: str) -> None:
+    """Write multistream article chunks with contiguous page_id ranges."""
+    os.makedirs(dir_path, exist_ok=True)
+    num_chunks = min(max(MIN_ARTICLE_CHUNKS, num_articles // ARTICLES_PER_CHUNK), num_articles)
+    chunk_edges = [num_articles * ii // num_chunks for ii in range(num_chunks + 1)]
+    pages = iter_pages(num_articles)
+    page: Optional[Page] = next(pages, None)
+    for ii_chunk in range(num_chunks):
+        last_article_idx = chunk_edges[ii_chunk + 1] - 1
+        chunk_pages = []
+        while page is not None and (page.is_redirect or page.article_idx <= last_article_idx):
+            chunk_pages.append(page)
+            page = next(pages, None)
+        if not chunk_pages:
+            continue
+        file_name = "{}-{}-pages-articles{}.xml-p{}p{}.bz2".format(
+            wiki, wp_yyyymmdd, ii_chunk + 1, chunk_pages[0].page_id, chunk_pages[-1].page_id
+        )
+        with open(os.path.join(dir_path, file_name), "wb") as fp:
+            fp.write(bz2.compress(MEDIAWIKI_HEADER.format(wiki=wiki).encode("utf-8")))
+            for start in range(0, len(chunk_pages), XML_PAGES_PER_STREAM):
+                xml = "".join(
+                    _get_page_xml(chunk_page, num_articles)
+                    for chunk_page in chunk_pages[start : start + XML_PAGES_PER_STREAM]
+                )
+                fp.write(bz2.compress(xml.encode("utf-8")))
+            fp.write(bz2.compress(b"</mediawiki>\n"))
+
+
+# wikidata dump
+# ============================================================
+
+
+def _item_snak(property_id: str, nqid: int) -> Dict[str, Any]:
+    return {
+        "snaktype": "value",
+        "property": property_id,
+        "datavalue": {
+            "value": {"entity-type": "item", "numeric-id": nqid, "id": f"Q{nqid}"},
+            "type": "wikibase-entityid",
+        },
+        "datatype": "wikibase-item",
+    }
+
+
+def _claim(qid: str, mainsnak: Dict[str, Any], idx: int, rank: str = "normal") -> Dict[str, Any]:
+    return {
+        "mainsnak": mainsnak,
+        "type": "statement",
+        "id": f"{qid}${mainsnak['property']}-{idx}",
+        "rank": rank,
+    }
+
+
+def _terms(language_values: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    return {lang: {"language": lang, "value": value} for lang, value in language_values.items()}
+
+
+def _entity(
+    qid: str,
+    label: str,
+    description: str,
+    claims: Dict[str, List[Dict[str, Any]]],
+    sitelinks: Optional[Dict[str, Dict[str, Any]]] = None,
+    aliases: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    return {
+        "type": "item",
+        "id": qid,
+        "labels": _terms({"en": label, "fr": f"{label} (fr)"}),
+        "descriptions": _terms({"en": description}),
+        "aliases": {"en": [{"language": "en", "value": alias} for alias in aliases or []]},
+        "claims": claims,
+        "sitelinks": sitelinks or {},
+        "lastrevid": 1,
+    }
+
+
+def _property(pid: str, label: str, datatype: str) -> Dict[str, Any]:
+    return {
+        "type": "property",
+        "datatype": datatype,
+        "id": pid,
+        "labels": _terms({"en": label}),
+        "descriptions": _terms({"en": f"synthetic {label} property"}),
+        "aliases": {"en": [{"language": "en", "value": f"{label} alias"}]},
+        "claims": {},
+        "lastrevid": 1,
+    }
+
+
+def _iter_wikidata_entities(num_articles: int, wiki: str) -> Iterator[Dict[str, Any]]:
+    yield _property("P31", "instance of", "wikibase-item")
+    yield _property("P279", "subclass of", "wikibase-item")
+    yield _property("P17", "country", "wikibase-item")
+    yield _property("P1082", "population", "quantity")
+    # every root class of task_24p1 has to be in the subclass of graph
+    classes = [
+        (ENTITY_NQID, "entity", []),
+        (17442446, "Wikimedia internal item", [ENTITY_NQID]),
+        (14795564, "point in time with respect to recurrent timeframe", [ENTITY_NQID]),
+        (18340514, "events in a specific year or time period", [ENTITY_NQID]),
+        (HUMAN_NQID, "human", [ENTITY_NQID]),
+        (ORGANIZATION_NQID, "organization", [ENTITY_NQID]),
+        (BUSINESS_NQID, "business", [ORGANIZATION_NQID]),
+        (GEOGRAPHIC_LOCATION_NQID, "geographic location", [ENTITY_NQID]),
+        (SCHOLARLY_ARTICLE_NQID, "scholarly article", [ENTITY_NQID]),
+        (COUNTRY_NQID, "United States of America", []),
+    ]
+    for nqid, label, parent_nqids in classes:
+        qid = f"Q{nqid}"
+        claims: Dict[str, List[Dict[str, Any]]] = {}
+        if parent_nqids:
+            claims["P279"] = [
+                _claim(qid, _item_snak("P279", parent_nqid), ii)
+                for ii, parent_nqid in enumerate(parent_nqids)
+            ]
+        yield _entity(qid, label, f"synthetic class {label}", claims)
+
+    for article_idx in range(num_articles):
+        qid = f"Q{ITEM_QID_OFFSET + article_idx}"
+        if article_idx % 20 == 13:
+            p31_nqids = [SCHOLARLY_ARTICLE_NQID]
+        else:
+            p31_nqids = [ARTICLE_P31_NQIDS[article_idx % len(ARTICLE_P31_NQIDS)]]
+        claims = {
+            "P31": [_claim(qid, _item_snak("P31", nqid), ii) for ii, nqid in enumerate(p31_nqids)],
+            "P17": [
+                _claim(qid, _item_snak("P17", COUNTRY_NQID), 0, rank="preferred"),
+                _claim(qid, _item_snak("P17", ORGANIZATION_NQID), 1, rank="deprecated"),
+            ],
+        }
+        if article_idx % 3 == 2:
+            claims["P1082"] = [
+                _claim(
+                    qid,
+                    {
+                        "snaktype": "value",
+                        "property": "P1082",
+                        "datavalue": {
+                            "value": {"amount": f"+{article_idx * 10}", "unit": "1"},
+                            "type": "quantity",
+                        },
+                        "datatype": "quantity",
+                    },
+                    0,
+                )
+            ]
+        title = _article_title(article_idx).replace("_", " ")
+        yield _entity(
+            qid,
+            title,
+            f"Synthetic description {article_idx}",
+            claims,
+            sitelinks={wiki: {"site": wiki, "title": title, "badges": []}},
+            aliases=[f"Alias {article_idx}"] if article_idx % 4 == 0 else [],
+        )
+
+        # items without a sitelink to this wiki
+        if article_idx % 5 == 0:
+            other_qid = f"Q{ITEM_QID_OFFSET + num_articles + article_idx}"
+            yield _entity(
+                other_qid,
+                f"Unlinked item {article_idx}",
+                "synthetic item without an article",
+                {"P31": [_claim(other_qid, _item_snak("P31", HUMAN_NQID), 0)]},
+            )
+
+
+def _write_wikidata_dump(file_path: str, num_articles: int, wiki: str) -> None:
+    """Write the JSON array with one entity per line, as in the real dump."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with bz2.open(file_path, "wt", encoding="utf-8", compresslevel=1) as fp:
+        fp.write("[\n")
+        lines = []
+        for ii, entity in enumerate(_iter_wikidata_entities(num_articles, wiki)):
+            lines.append(("" if ii == 0 else ",\n") + json.dumps(entity))
+            if len(lines) >= 1000:
+                fp.write("".join(lines))
+                lines = []
+        fp.write("".join(lines))
+        fp.write("\n]\n")
+
+
+# all inputs
+# ============================================================
+
+
+def generate(
+    data_path: str,
+    num_articles: int,
+    wp_yyyymmdd: str = "20210701",
+    wd_yyyymmdd: str = "20210705",
+    wiki: str = "enwiki",
+) -> None:
+    """Write all raw inputs for the pipeline into `data_path`."""
+    wp_raw_path = os.path.join(data_path, f"wikipedia-raw-{wp_yyyymmdd}")
+
+    logger.info(f"writing synthetic sql dumps for {num_articles} articles")
+    for dir_name, table, create_table, rows in [
+        ("pagetable", "page", PAGE_CREATE_TABLE, _iter_page_rows(num_articles)),
+        (
+            "pagepropstable",
+            "page_props",
+            PAGE_PROPS_CREATE_TABLE,
+            _iter_page_props_rows(num_articles),
+        ),
+        ("redirecttable", "redirect", REDIRECT_CREATE_TABLE, _iter_redirect_rows(num_articles)),
+    ]:
+        file_path = os.path.join(wp_raw_path, dir_name, f"{wiki}-{wp_yyyymmdd}-{table}.sql.gz")
+        _write_sql_dump(file_path, table, create_table, rows)
+
+    logger.info("writing synthetic pageviews")
+    pageview_path = os.path.join(wp_raw_path, "pageviewcomplete")
+    os.makedirs(pageview_path, exist_ok=True)
+    for date in _get_prior_month_days(wp_yyyymmdd):
+        file_name = "pageviews-{}-user.bz2".format(date.strftime("%Y%m%d"))
+        _write_pageviews(os.path.join(pageview_path, file_name), num_articles, wiki, date.day)
+
+    logger.info("writing synthetic article dumps")
+    _write_article_dumps(os.path.join(wp_raw_path, "articlesdump"), num_articles, wiki, wp_yyyymmdd)
+
+    logger.info("writing synthetic wikidata dump")
+    _write_wikidata_dump(
+        os.path.join(
+            data_path, f"wikidata-raw-{wd_yyyymmdd}", f"wikidata-{wd_yyyymmdd}-all.json.bz2"
+        ),
+        num_articles,
+        wiki,
+    )
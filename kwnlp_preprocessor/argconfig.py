@@ -3,7 +3,7 @@ import argparse
 import logging
 import multiprocessing
 import sys
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 DEFAULT_KWNLP_DATA_PATH: str = ""
 DEFAULT_KWNLP_WIKI_MIRROR_URL: str = "https://dumps.wikimedia.org"
@@ -14,6 +14,16 @@ DEFAULT_KWNLP_DOWNLOAD_JOBS: str = (
 DEFAULT_KWNLP_LOGGING_LEVEL: int = logging.INFO
 DEFAULT_KWNLP_MAX_ENTITIES: int = sys.maxsize
 DEFAULT_KWNLP_WORKERS = multiprocessing.cpu_count() - 1
+DEFAULT_KWNLP_CPU_BUDGET = multiprocessing.cpu_count()
+DEFAULT_KWNLP_PIPELINE_READERS: int = 0
+DEFAULT_KWNLP_PAGEVIEW_WINDOW: str = "prior-month"
+DEFAULT_KWNLP_TABLE_FORMAT: str = "csv"
+DEFAULT_KWNLP_WIKIDATA_SPLIT: str = "chunks"
+DEFAULT_KWNLP_WIKIDATA_CODEC: str = "bz2"
+DEFAULT_KWNLP_CHUNK_CODEC: str = "none"
+
+# page_props kept by task 03p2 (each one is a column in task 06p1)
+KWNLP_PAGE_PROPNAMES: Tuple[str, ...] = ("wikibase_item", "wikibase-shortdesc")
 
 
 ap_wp_yyyymmdd = argparse.ArgumentParser(add_help=False)
@@ -43,6 +53,16 @@ ap_wiki.add_argument(
     help="selects which language wikipedia to use (e.g. enwiki)",
 )
 
+ap_wikis = argparse.ArgumentParser(add_help=False)
+ap_wikis.add_argument(
+    "--wikis",
+    default="",
+    help=(
+        "comma separated list of wikis to process in one run (e.g. enwiki,dewiki,frwiki). "
+        "the wikidata and pageview dumps are read once for all of them. overrides --wiki"
+    ),
+)
+
 ap_jobs = argparse.ArgumentParser(add_help=False)
 ap_jobs.add_argument(
     "--jobs",
@@ -66,6 +86,102 @@ ap_workers.add_argument(
     type=int,
 )
 
+ap_pipeline_readers = argparse.ArgumentParser(add_help=False)
+ap_pipeline_readers.add_argument(
+    "--pipeline_readers",
+    default=DEFAULT_KWNLP_PIPELINE_READERS,
+    help=(
+        "number of reader processes for pipelined wikitext parsing. "
+        "0 parses each dump file in a single worker"
+    ),
+    type=int,
+)
+
+ap_pageview_window = argparse.ArgumentParser(add_help=False)
+ap_pageview_window.add_argument(
+    "--pageview_window",
+    default=DEFAULT_KWNLP_PAGEVIEW_WINDOW,
+    help="days to sum pageviews over (prior-month, last-N-days or YYYYMMDD-YYYYMMDD)",
+)
+
+ap_sql_split_tables = argparse.ArgumentParser(add_help=False)
+ap_sql_split_tables.add_argument(
+    "--sql_split_tables",
+    default="",
+    help="comma separated SQL tables to parse in parallel INSERT statement batches (e.g. page)",
+)
+
+ap_table_format = argparse.ArgumentParser(add_help=False)
+ap_table_format.add_argument(
+    "--table_format",
+    default=DEFAULT_KWNLP_TABLE_FORMAT,
+    choices=["csv", "parquet", "feather"],
+    help="file format of the tables written by tasks (parquet and feather need pyarrow)",
+)
+
+ap_wikidata_split = argparse.ArgumentParser(add_help=False)
+ap_wikidata_split.add_argument(
+    "--wikidata_split",
+    default=DEFAULT_KWNLP_WIKIDATA_SPLIT,
+    choices=["chunks", "blocks"],
+    help=(
+        "chunks: split the wikidata dump into compressed chunk files. "
+        "blocks: index the bz2 blocks of the dump and read ranges of it in parallel"
+    ),
+)
+
+ap_wikidata_codec = argparse.ArgumentParser(add_help=False)
+ap_wikidata_codec.add_argument(
+    "--wikidata_codec",
+    default=DEFAULT_KWNLP_WIKIDATA_CODEC,
+    help=(
+        "codec of the wikidata chunks written by task 15p1 as name or name:level "
+        "(none, gzip, bz2, zstd or lz4, e.g. zstd:3). zstd and lz4 need pyarrow"
+    ),
+)
+
+ap_chunk_codec = argparse.ArgumentParser(add_help=False)
+ap_chunk_codec.add_argument(
+    "--chunk_codec",
+    default=DEFAULT_KWNLP_CHUNK_CODEC,
+    help="codec of the chunks written by tasks 27p1 and 30p1 (see --wikidata_codec)",
+)
+
+ap_extraction_spec = argparse.ArgumentParser(add_help=False)
+ap_extraction_spec.add_argument(
+    "--extraction_spec",
+    default="",
+    help=(
+        "JSON file listing extra wikidata tables (properties, languages and sitelinks) "
+        "to extract in the same pass (see kwnlp_preprocessor/wikidata_extraction.py)"
+    ),
+)
+
+ap_previous_wp_yyyymmdd = argparse.ArgumentParser(add_help=False)
+ap_previous_wp_yyyymmdd.add_argument(
+    "--previous_wp_yyyymmdd",
+    default="",
+    help="update redirect and title mapper tables from those of this earlier wikipedia dump",
+)
+
+ap_cpu_budget = argparse.ArgumentParser(add_help=False)
+ap_cpu_budget.add_argument(
+    "--cpu_budget",
+    default=DEFAULT_KWNLP_CPU_BUDGET,
+    help="maximum number of cpus used by all concurrently running tasks",
+    type=int,
+)
+
+ap_force = argparse.ArgumentParser(add_help=False)
+ap_force.add_argument(
+    "--force",
+    default="",
+    help=(
+        "comma separated list of tasks to rerun even if up to date, along with all tasks "
+        "downstream of them (e.g. task_27p1 or all)"
+    ),
+)
+
 ap_loglevel = argparse.ArgumentParser(add_help=False)
 ap_loglevel.add_argument(
     "--loglevel",
@@ -89,9 +205,21 @@ ARGS: Dict[str, argparse.ArgumentParser] = {
     "data_path": ap_data_path,
     "mirror_url": ap_mirror_url,
     "wiki": ap_wiki,
+    "wikis": ap_wikis,
     "jobs": ap_jobs,
     "max_entities": ap_max_entities,
     "workers": ap_workers,
+    "pipeline_readers": ap_pipeline_readers,
+    "pageview_window": ap_pageview_window,
+    "sql_split_tables": ap_sql_split_tables,
+    "table_format": ap_table_format,
+    "previous_wp_yyyymmdd": ap_previous_wp_yyyymmdd,
+    "wikidata_split": ap_wikidata_split,
+    "wikidata_codec": ap_wikidata_codec,
+    "chunk_codec": ap_chunk_codec,
+    "extraction_spec": ap_extraction_spec,
+    "cpu_budget": ap_cpu_budget,
+    "force": ap_force,
     "loglevel": ap_loglevel,
     "include_item_statements": ap_include_item_statements,
 }
@@ -0,0 +1,238 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Read ranges of blocks of a bzip2 file in parallel.
+
+A bzip2 stream is a header (BZh1-9), a sequence of blocks that each start
+with the 48 bit magic 0x314159265359 followed by the CRC of the block, and an
+end of stream marker 0x177245385090 followed by the CRC of the stream. Blocks
+are not byte aligned but every block can be decompressed on its own by
+wrapping it in a stream of one block.
+
+`build_block_index` finds the bit offsets of all block and end of stream
+markers without decompressing anything. `iter_range_lines` decompresses a
+range of blocks and yields the lines that belong to it so that many processes
+can read disjoint parts of one (single or multi stream) bz2 file.
+
+The lines of a range are those that start after the first newline at or after
+the start of its first block (or at the start of the file for the first range)
+up to and including the first line that ends at or after the start of the
+next range. Lines that cross range boundaries are read by the range they start
+in and skipped by the next one.
+
+Compressed data can contain a marker by chance (about once every 2**48 bits).
+A block whose end is such a false marker fails to decompress and is retried
+with the following marker as its end.
+"""
+import bz2
+import logging
+import os
+from typing import BinaryIO, Iterator, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+BLOCK_MAGIC = 0x314159265359
+EOS_MAGIC = 0x177245385090
+SCAN_BYTES = 64 * 1024 * 1024
+MAX_JOINED_MARKERS = 4
+
+# bytes of a 7 byte window that can hold a 48 bit magic at any bit shift
+WINDOW_BYTES = 7
+
+
+class BlockIndex(NamedTuple):
+    """Sorted bit offsets of the markers in a bz2 file.
+
+    markers: bit offset of each marker (int64)
+    is_block: True for block markers, False for end of stream markers
+    range_starts: marker index of the first block of each range (int64)
+    """
+
+    markers: np.ndarray
+    is_block: np.ndarray
+    range_starts: np.ndarray
+
+    def get_ranges(self) -> List[Tuple[int, int]]:
+        """Return (first, last) marker indices of each range. last is not included."""
+        ends = list(self.range_starts[1:]) + [len(self.markers)]
+        return [(int(first), int(last)) for first, last in zip(self.range_starts, ends)]
+
+
+def _get_patterns(magic: int) -> List[Tuple[int, bytes, int, int, int]]:
+    """Return (shift, literal, literal offset, mask, value) of a magic at each bit shift.
+
+    The literal is the run of bytes the magic covers completely and is searched
+    for first. Candidates are then checked with `mask` and `value` against the
+    7 byte window that starts `literal offset` bytes before the literal.
+    """
+    patterns = []
+    for shift in range(8):
+        value = magic << (8 - shift)
+        mask = ((1 << 48) - 1) << (8 - shift)
+        value_bytes = value.to_bytes(WINDOW_BYTES, "big")
+        mask_bytes = mask.to_bytes(WINDOW_BYTES, "big")
+        full = [ii for ii in range(WINDOW_BYTES) if mask_bytes[ii] == 0xFF]
+        patterns.append((shift, value_bytes[full[0] : full[-1] + 1], full[0], mask, value))
+    return patterns
+
+
+def _find_markers(buffer: bytes, base: int, at_eof: bool, magic: int) -> List[int]:
+    """Return bit offsets of `magic` in `buffer` which starts at byte `base` of the file."""
+    bit_offsets = []
+    for shift, literal, literal_offset, mask, value in _get_patterns(magic):
+        pos = buffer.find(literal)
+        while pos != -1:
+            start = pos - literal_offset
+            window = buffer[start : start + WINDOW_BYTES]
+            if start >= 0 and (len(window) == WINDOW_BYTES or at_eof):
+                window = window.ljust(WINDOW_BYTES, b"\0")
+                if int.from_bytes(window, "big") & mask == value:
+                    bit_offsets.append((base + start) * 8 + shift)
+            pos = buffer.find(literal, pos + 1)
+    return bit_offsets
+
+
+def build_block_index(file_path: str, range_bytes: int) -> BlockIndex:
+    """Scan a bz2 file for markers and split its blocks into ranges.
+
+    Args:
+        file_path: bz2 file
+        range_bytes: target compressed size of each range
+    """
+    block_markers = set()
+    eos_markers = set()
+    with open(file_path, "rb") as fp:
+        base = 0
+        tail = b""
+        while True:
+            data = fp.read(SCAN_BYTES)
+            at_eof = not data
+            buffer = tail + data
+            block_markers.update(_find_markers(buffer, base, at_eof, BLOCK_MAGIC))
+            eos_markers.update(_find_markers(buffer, base, at_eof, EOS_MAGIC))
+            if at_eof:
+                break
+            tail = buffer[-(WINDOW_BYTES - 1) :]
+            base += len(buffer) - len(tail)
+
+    markers = np.array(sorted(block_markers | eos_markers), dtype=np.int64)
+    is_block = np.isin(markers, list(block_markers))
+    logger.info(f"found {is_block.sum()} blocks and {(~is_block).sum()} streams in {file_path}")
+    range_starts = _get_range_starts(file_path, markers, is_block, range_bytes)
+    return BlockIndex(markers, is_block, range_starts)
+
+
+def _get_range_starts(
+    file_path: str, markers: np.ndarray, is_block: np.ndarray, range_bytes: int
+) -> np.ndarray:
+    """Return the first block of each range, skipping blocks that do not decompress."""
+    block_idxs = np.flatnonzero(is_block)
+    if len(block_idxs) == 0:
+        return np.array([], dtype=np.int64)
+    block_markers = markers[block_idxs]
+    range_starts = [int(block_idxs[0])]
+    with open(file_path, "rb") as fp:
+        for target in range(range_bytes * 8, int(block_markers[-1]) + 1, range_bytes * 8):
+            pos = int(np.searchsorted(block_markers, target))
+            while pos < len(block_idxs) and block_idxs[pos] > range_starts[-1]:
+                try:
+                    next(_iter_blocks(fp, markers, is_block, int(block_idxs[pos])))
+                    range_starts.append(int(block_idxs[pos]))
+                    break
+                except ValueError:
+                    logger.info(f"skipping false block marker at bit {block_markers[pos]}")
+                    pos += 1
+    return np.array(range_starts, dtype=np.int64)
+
+
+def write_block_index(file_path: str, index: BlockIndex) -> None:
+    """Atomically write a block index."""
+    tmp_file_path = f"{file_path}.tmp.npz"
+    np.savez(
+        tmp_file_path,
+        markers=index.markers,
+        is_block=index.is_block,
+        range_starts=index.range_starts,
+    )
+    os.replace(tmp_file_path, file_path)
+
+
+def read_block_index(file_path: str) -> BlockIndex:
+    with np.load(file_path) as npz:
+        return BlockIndex(npz["markers"], npz["is_block"], npz["range_starts"])
+
+
+def _decompress_block(fp: BinaryIO, start_bit: int, end_bit: int) -> bytes:
+    """Decompress the block between two bit offsets by wrapping it in a stream."""
+    start_byte = start_bit // 8
+    end_byte = (end_bit + 7) // 8
+    fp.seek(start_byte)
+    value = int.from_bytes(fp.read(end_byte - start_byte), "big")
+    num_bits = end_bit - start_bit
+    value = (value >> (end_byte * 8 - end_bit)) & ((1 << num_bits) - 1)
+    # the CRC of a stream of one block is the CRC of the block
+    crc = (value >> (num_bits - 80)) & 0xFFFFFFFF
+    value = (((value << 48) | EOS_MAGIC) << 32) | crc
+    num_bits += 80
+    padding = -num_bits % 8
+    stream = b"BZh9" + (value << padding).to_bytes((num_bits + padding) // 8, "big")
+    return bz2.decompress(stream)
+
+
+def _iter_blocks(
+    fp: BinaryIO, markers: Sequence[int], is_block: Sequence[bool], first: int
+) -> Iterator[Tuple[int, bytes]]:
+    """Yield the marker index and decompressed data of each block from marker `first` on."""
+    ii = first
+    while ii < len(markers):
+        if not is_block[ii]:
+            ii += 1
+            continue
+        for jj in range(ii + 1, min(ii + 1 + MAX_JOINED_MARKERS, len(markers))):
+            try:
+                data = _decompress_block(fp, int(markers[ii]), int(markers[jj]))
+                break
+            except (OSError, EOFError, ValueError):
+                continue
+        else:
+            raise ValueError(f"could not decompress bz2 block at bit {markers[ii]}")
+        yield ii, data
+        ii = jj
+
+
+def iter_range_lines(file_path: str, index: BlockIndex, first: int, last: int) -> Iterator[bytes]:
+    """Yield the lines (without newlines) of the range of blocks from `first` to `last`."""
+    with open(file_path, "rb") as fp:
+        skipping = first != index.range_starts[0]
+        end_offset = None
+        total = 0
+        buffer = b""
+        for ii, data in _iter_blocks(fp, index.markers, index.is_block, first):
+            if end_offset is None and ii >= last:
+                end_offset = total
+            buffer += data
+            total += len(data)
+
+            if skipping:
+                newline_idx = buffer.find(b"\n")
+                if newline_idx == -1:
+                    buffer = b""
+                    continue
+                if end_offset is not None and total - len(buffer) + newline_idx >= end_offset:
+                    return
+                buffer = buffer[newline_idx + 1 :]
+                skipping = False
+
+            line_start = total - len(buffer)
+            lines = buffer.split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                newline_offset = line_start + len(line)
+                yield line
+                if end_offset is not None and newline_offset >= end_offset:
+                    return
+                line_start = newline_offset + 1
+
+        if buffer and not skipping:
+            yield buffer
@@ -0,0 +1,141 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Compression of the intermediate chunk files written by tasks.
+
+A codec is given as ``name`` or ``name:level`` (e.g. gzip:1) and is recorded
+in the extension of each file it writes so readers detect it from the file
+name,
+
+* none: no compression (no extension)
+* gzip: .gz
+* bz2: .bz2
+* zstd: .zst (needs pyarrow)
+* lz4: .lz4 (lz4 frame format, needs pyarrow)
+
+zstd and lz4 are much faster than bz2 and gzip to decompress. Compressed
+files are written as a sequence of independently compressed streams (or
+frames) which all of these formats read back as one file.
+"""
+import bz2
+import gzip
+import io
+import os
+from typing import IO, Any, Dict, NamedTuple, Optional
+
+CODEC_EXTENSIONS: Dict[str, str] = {
+    "none": "",
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "zstd": ".zst",
+    "lz4": ".lz4",
+}
+ARROW_CODECS = ("zstd", "lz4")
+FRAME_BYTES = 4 * 1024 * 1024
+
+
+class Codec(NamedTuple):
+    name: str
+    level: Optional[int] = None
+
+    @property
+    def extension(self) -> str:
+        return CODEC_EXTENSIONS[self.name]
+
+
+def parse_codec(spec: str) -> Codec:
+    """Parse a codec given as name or name:level and check that it is available."""
+    name, _, level = spec.partition(":")
+    if name not in CODEC_EXTENSIONS:
+        raise ValueError(f"codec must be one of {tuple(CODEC_EXTENSIONS)}, got {spec}")
+    if name in ARROW_CODECS:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ValueError(f"{name} needs pyarrow (pip install kwnlp_preprocessor[columnar])")
+        if not pa.Codec.is_available(name):
+            raise ValueError(f"{name} is not available in this build of pyarrow")
+    if name == "none" and level:
+        raise ValueError(f"codec none does not have a level, got {spec}")
+    return Codec(name, int(level) if level else None)
+
+
+def get_codec(file_path: str) -> Codec:
+    """Return the codec of a file from its extension."""
+    for name, extension in CODEC_EXTENSIONS.items():
+        if extension and file_path.endswith(extension):
+            return Codec(name)
+    return Codec("none")
+
+
+def strip_extension(file_path: str) -> str:
+    """Return `file_path` without its codec extension."""
+    extension = get_codec(file_path).extension
+    return file_path[: -len(extension)] if extension else file_path
+
+
+def remove_stale(file_path: str) -> None:
+    """Remove copies of `file_path` written earlier with other codecs."""
+    base = strip_extension(file_path)
+    for extension in CODEC_EXTENSIONS.values():
+        path = base + extension
+        if path != file_path and os.path.exists(path):
+            os.remove(path)
+
+
+def compress(data: bytes, codec: Codec) -> bytes:
+    """Compress `data` into one complete stream. Streams can be concatenated."""
+    if codec.name == "none":
+        return data
+    elif codec.name == "gzip":
+        return gzip.compress(data, 9 if codec.level is None else codec.level)
+    elif codec.name == "bz2":
+        return bz2.compress(data, 9 if codec.level is None else codec.level)
+    import pyarrow as pa
+
+    return pa.Codec(codec.name, codec.level).compress(data, asbytes=True)
+
+
+class _FrameWriter(io.RawIOBase):
+    """Compress each write into its own frame (see `open_chunk`)."""
+
+    def __init__(self, file_path: str, codec: Codec):
+        self._fp = open(file_path, "wb")
+        self._codec = codec
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self._fp.write(compress(bytes(data), self._codec))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._fp.close()
+        super().close()
+
+
+def open_chunk(file_path: str, mode: str = "rb", level: Optional[int] = None) -> IO:
+    """Open a chunk file with the codec given by its extension.
+
+    Args:
+        file_path: path of the file. the extension gives the codec.
+        mode: one of r, rb, w or wb. text is utf-8.
+        level: compression level used when writing (the codec default if None)
+    """
+    codec = Codec(get_codec(file_path).name, level)
+    if codec.name == "none":
+        return open(file_path, mode)
+    binary_mode = mode.rstrip("b") + "b"
+    fp: Any
+    if codec.name == "gzip":
+        fp = gzip.open(file_path, binary_mode, compresslevel=9 if level is None else level)
+    elif codec.name == "bz2":
+        fp = bz2.open(file_path, binary_mode, compresslevel=9 if level is None else level)
+    elif binary_mode == "rb":
+        import pyarrow as pa
+
+        fp = io.BufferedReader(pa.CompressedInputStream(pa.OSFile(file_path), codec.name))
+    else:
+        # buffer writes so that frames are about FRAME_BYTES each
+        fp = io.BufferedWriter(_FrameWriter(file_path, codec), buffer_size=FRAME_BYTES)
+    return fp if mode.endswith("b") else io.TextIOWrapper(fp, encoding="utf-8")
@@ -0,0 +1,120 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Helpers for updating derived tables from the tables of a previous dump.
+
+Tasks 06p2, 09p1 and 12p1 take an optional ``previous_wp_yyyymmdd``. When the
+derived tables of that dump exist, each task starts from its previous output,
+recomputes only the rows affected by what changed between the two dumps and
+writes a change log next to its output. The change log of one task tells the
+next task which rows to look at.
+
+A change log is a table with the key column of the table it describes and a
+``change`` column that is one of added, removed or changed. It is sorted by
+key. Updated tables are the same as tables built from scratch.
+"""
+import logging
+import os
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from kwnlp_preprocessor import table_io
+
+logger = logging.getLogger(__name__)
+
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+def get_changes_path(file_path: str) -> str:
+    """Return the path of the change log of the table at `file_path`."""
+    base, ext = os.path.splitext(file_path)
+    return f"{base}-changes{ext}"
+
+
+def has_previous(previous_file_paths: Sequence[str]) -> bool:
+    """Return True if every table of the previous dump exists."""
+    missing = [path for path in previous_file_paths if not os.path.exists(path)]
+    for path in missing:
+        logger.warning(f"{path} does not exist, rebuilding from scratch")
+    return not missing
+
+
+def remove_changes(file_path: str) -> None:
+    """Remove a stale change log so it is not mistaken for one of this build."""
+    changes_path = get_changes_path(file_path)
+    if os.path.exists(changes_path):
+        os.remove(changes_path)
+
+
+def get_changes(df_old: pd.DataFrame, df_new: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Return the change log between two tables with unique keys.
+
+    Rows are compared on the columns of `df_new` (which `df_old` must have).
+    """
+    columns = [column for column in df_new.columns if column != key]
+    df = pd.merge(
+        df_old[[key] + columns],
+        df_new[[key] + columns],
+        on=key,
+        how="outer",
+        suffixes=("_old", "_new"),
+        indicator=True,
+    )
+    is_changed = np.zeros(len(df), dtype=bool)
+    for column in columns:
+        is_changed |= (df[f"{column}_old"] != df[f"{column}_new"]).values
+    change = np.select(
+        [df["_merge"] == "right_only", df["_merge"] == "left_only", is_changed],
+        [ADDED, REMOVED, CHANGED],
+        default="",
+    )
+    df_changes = pd.DataFrame({key: df[key].values, "change": change})
+    df_changes = df_changes[df_changes["change"] != ""]
+    return df_changes.sort_values(key).reset_index(drop=True)
+
+
+def write_changes(df_changes: pd.DataFrame, file_path: str) -> None:
+    """Write the change log of the table at `file_path`."""
+    changes_path = get_changes_path(file_path)
+    counts = df_changes["change"].value_counts()
+    logger.info(
+        "writing {} ({} added, {} removed, {} changed)".format(
+            changes_path, counts.get(ADDED, 0), counts.get(REMOVED, 0), counts.get(CHANGED, 0)
+        )
+    )
+    table_io.write_table(df_changes, changes_path)
+
+
+def read_changed_keys(file_path: str, key: str) -> np.ndarray:
+    """Return the keys in the change log of the table at `file_path`."""
+    return table_io.read_table(get_changes_path(file_path), columns=[key])[key].values
+
+
+def update_rows(
+    df_previous: pd.DataFrame,
+    df_recomputed: pd.DataFrame,
+    key: str,
+    affected_keys: Any,
+    order: Optional[pd.Index] = None,
+) -> pd.DataFrame:
+    """Replace the rows of affected keys in a previous table with recomputed rows.
+
+    Args:
+        df_previous: table of the previous dump
+        df_recomputed: new rows for (some of) the affected keys. affected keys
+            without a recomputed row are removed.
+        key: name of the key column
+        affected_keys: keys to take from `df_recomputed` instead of `df_previous`
+        order: keys in output order. the output is sorted by key if not given.
+    """
+    df = pd.concat(
+        [df_previous[~df_previous[key].isin(affected_keys)], df_recomputed[df_previous.columns]],
+        ignore_index=True,
+    )
+    if order is None:
+        return df.sort_values(key).reset_index(drop=True)
+    positions = order.get_indexer(df[key])
+    return df.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
@@ -0,0 +1,167 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Resource usage metrics for stages and their pool workers.
+
+Each stage runs in its own process (see the scheduler module). That process
+measures wall time, cpu time and peak resident memory of itself and its pool
+workers around the call to the task main function. Tasks can add row counts
+with `add_count` and per worker breakdowns with `record_workers`. Pool
+worker functions build their metrics with `measure_worker` and return them
+so the stage process can record them.
+
+The scheduler collects the metrics of every stage together with the sizes
+of its input and output files into one JSON run report.
+"""
+from contextlib import contextmanager
+import datetime
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from kwnlp_preprocessor import manifest
+
+logger = logging.getLogger(__name__)
+
+
+REPORT_VERSION = 1
+
+# ru_maxrss is in kilobytes on linux and bytes on macos
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+_stage_metrics: Dict[str, Any] = {"counters": {}, "workers": []}
+
+
+def _get_cpu_seconds(who: int) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _get_peak_rss_bytes(who: int) -> int:
+    return resource.getrusage(who).ru_maxrss * _MAXRSS_UNIT
+
+
+def add_count(name: str, count: int) -> None:
+    """Add to a named row counter of the current stage."""
+    counters = _stage_metrics["counters"]
+    counters[name] = counters.get(name, 0) + count
+
+
+def record_workers(worker_metrics: Sequence[Dict[str, Any]], unit: str) -> None:
+    """Record metrics returned by pool workers (see `measure_worker`).
+
+    The rows of all workers are added to the stage counter named `unit`.
+    """
+    wall_seconds = 0.0
+    for metrics in worker_metrics:
+        metrics["unit"] = unit
+        _stage_metrics["workers"].append(metrics)
+        add_count(unit, metrics["rows"])
+        wall_seconds = max(wall_seconds, metrics["wall_seconds"])
+    rows = sum(metrics["rows"] for metrics in worker_metrics)
+    logger.info(f"{len(worker_metrics)} calls processed {rows} {unit} in {wall_seconds:.2f}s")
+
+
+@contextmanager
+def measure_worker(name: str) -> Iterator[Dict[str, Any]]:
+    """Measure one call of a pool worker function.
+
+    The caller increments ``metrics["rows"]`` as it processes rows. Pool worker
+    processes can be reused for several calls so peak memory is the peak of the
+    worker process up to the end of this call.
+
+    Args:
+        name: name of the work item (e.g. the input file path)
+    """
+    metrics: Dict[str, Any] = {"name": name, "pid": os.getpid(), "rows": 0}
+    t_start = time.perf_counter()
+    cpu_start = _get_cpu_seconds(resource.RUSAGE_SELF)
+    yield metrics
+    metrics["wall_seconds"] = time.perf_counter() - t_start
+    metrics["cpu_seconds"] = _get_cpu_seconds(resource.RUSAGE_SELF) - cpu_start
+    metrics["peak_rss_bytes"] = _get_peak_rss_bytes(resource.RUSAGE_SELF)
+    metrics["rows_per_second"] = metrics["rows"] / max(metrics["wall_seconds"], 1e-9)
+
+
+@contextmanager
+def measure_stage() -> Iterator[Dict[str, Any]]:
+    """Measure the current (stage) process and all of its child processes.
+
+    Child processes are only included once they have been waited for, which
+    happens when a pool is closed.
+    """
+    _stage_metrics["counters"] = {}
+    _stage_metrics["workers"] = []
+    metrics: Dict[str, Any] = {}
+    t_start = time.perf_counter()
+    cpu_start = _get_cpu_seconds(resource.RUSAGE_SELF) + _get_cpu_seconds(resource.RUSAGE_CHILDREN)
+    yield metrics
+    cpu_end = _get_cpu_seconds(resource.RUSAGE_SELF) + _get_cpu_seconds(resource.RUSAGE_CHILDREN)
+    metrics["wall_seconds"] = time.perf_counter() - t_start
+    metrics["cpu_seconds"] = cpu_end - cpu_start
+    metrics["peak_rss_bytes"] = _get_peak_rss_bytes(resource.RUSAGE_SELF)
+    metrics["peak_child_rss_bytes"] = _get_peak_rss_bytes(resource.RUSAGE_CHILDREN)
+    metrics["counters"] = dict(_stage_metrics["counters"])
+    metrics["workers"] = list(_stage_metrics["workers"])
+
+
+def get_path_sizes(data_path: str, rel_paths: Sequence[str]) -> Dict[str, int]:
+    """Return total size and number of files at or below the given paths."""
+    num_bytes = 0
+    num_files = 0
+    for rel_path in rel_paths:
+        for file_rel_path in manifest.iter_files(data_path, rel_path):
+            num_bytes += os.path.getsize(os.path.join(data_path, file_rel_path))
+            num_files += 1
+    return {"bytes": num_bytes, "files": num_files}
+
+
+def write_json(file_path: str, obj: Any) -> None:
+    os.makedirs(os.path.dirname(file_path) or os.curdir, exist_ok=True)
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w") as fp:
+        json.dump(obj, fp, indent=1, default=str)
+    os.replace(tmp_file_path, file_path)
+
+
+def read_json(file_path: str) -> Optional[Any]:
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path) as fp:
+        return json.load(fp)
+
+
+def get_report_path(data_path: str) -> str:
+    """Return a new timestamped run report path inside `data_path`."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    return os.path.join(data_path, "kwnlp-run-reports", f"kwnlp-run-{timestamp}.json")
+
+
+def write_run_report(
+    report_path: str,
+    started: datetime.datetime,
+    cpu_budget: int,
+    stage_records: Sequence[Dict[str, Any]],
+) -> None:
+    """Write the run report.
+
+    Args:
+        report_path: path of the JSON report
+        started: time the run started
+        cpu_budget: cpu budget of the run
+        stage_records: one record per stage in the order the stages were declared
+    """
+    finished = datetime.datetime.now()
+    report = {
+        "version": REPORT_VERSION,
+        "started": started.isoformat(),
+        "finished": finished.isoformat(),
+        "wall_seconds": (finished - started).total_seconds(),
+        "cpu_seconds": sum(record.get("cpu_seconds", 0.0) for record in stage_records),
+        "cpu_budget": cpu_budget,
+        "stages": list(stage_records),
+    }
+    write_json(report_path, report)
+    logger.info(f"wrote run report {report_path}")
@@ -0,0 +1,158 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Run manifest used to skip stages that are already up to date.
+
+The manifest is a JSON file in the top level data directory. For every stage
+that finished successfully it records,
+
+* a fingerprint of the stage parameters and the contents of its input files
+  (and of files named by parameters such as an extraction spec)
+* the size and modification time of every output file it wrote
+
+A stage is up to date if its current fingerprint matches the recorded one and
+its output files are unchanged. Input files are fingerprinted by content.
+Content digests are cached in the manifest by (size, modification time) so
+that large raw dumps are only hashed once.
+
+In a multi wiki run, the stage of one wiki only looks at the files of that
+wiki in directories shared by all wikis (e.g. the articles dump directory)
+so that adding or rerunning one wiki does not invalidate the others.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List
+
+if TYPE_CHECKING:
+    from kwnlp_preprocessor.scheduler import Stage
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_FILE_NAME = "kwnlp-run-manifest.json"
+MANIFEST_VERSION = 1
+
+# parameters that do not change what a stage produces
+NON_FINGERPRINT_PARAMS = frozenset(["data_path", "workers", "pipeline_readers", "mirror_url"])
+# parameters that name a file whose contents change what a stage produces
+FILE_PARAMS = frozenset(["extraction_spec"])
+
+_READ_SIZE = 1 << 20
+
+
+def get_manifest_path(data_path: str) -> str:
+    return os.path.join(data_path, MANIFEST_FILE_NAME)
+
+
+def load_manifest(data_path: str) -> Dict[str, Any]:
+    file_path = get_manifest_path(data_path)
+    if os.path.exists(file_path):
+        with open(file_path) as fp:
+            manifest = json.load(fp)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+        logger.info(f"ignoring manifest with old version {file_path}")
+    return {"version": MANIFEST_VERSION, "digests": {}, "stages": {}}
+
+
+def save_manifest(manifest: Dict[str, Any], data_path: str) -> None:
+    """Write manifest atomically so a crash never leaves a truncated file."""
+    file_path = get_manifest_path(data_path)
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w") as fp:
+        json.dump(manifest, fp, indent=1, sort_keys=True)
+    os.replace(tmp_file_path, file_path)
+
+
+def iter_files(data_path: str, rel_path: str, wiki: str = "") -> Iterator[str]:
+    """Generate relative paths of all files at or below `rel_path`.
+
+    If `wiki` is given and `rel_path` is a directory shared by all wikis, only
+    files with the wiki in their name (e.g. kwnlp-dewiki-...) are generated.
+    """
+    path = os.path.join(data_path, rel_path)
+    if os.path.isfile(path):
+        yield rel_path
+    elif os.path.isdir(path):
+        wiki_pattern = re.compile(rf"(^|-){re.escape(wiki)}-") if wiki not in rel_path else None
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if wiki_pattern is not None and not wiki_pattern.search(file_name):
+                    continue
+                yield os.path.relpath(os.path.join(dir_path, file_name), data_path or os.curdir)
+
+
+def _hash_file(file_path: str) -> str:
+    logger.info(f"hashing {file_path}")
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as fp:
+        for block in iter(lambda: fp.read(_READ_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _get_file_digest(data_path: str, rel_path: str, digests: Dict[str, Dict]) -> str:
+    stat = os.stat(os.path.join(data_path, rel_path))
+    cached = digests.get(rel_path)
+    if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+        return cached["digest"]
+
+    digest = _hash_file(os.path.join(data_path, rel_path))
+    digests[rel_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    return digest
+
+
+def get_fingerprint(stage: "Stage", data_path: str, manifest: Dict[str, Any]) -> str:
+    """Return a digest of stage parameters and input file contents."""
+    params = {
+        name: value for name, value in stage.kwargs.items() if name not in NON_FINGERPRINT_PARAMS
+    }
+    inputs: List[List[str]] = []
+    for in_path in stage.inputs:
+        for rel_path in iter_files(data_path, in_path, stage.wiki):
+            inputs.append([rel_path, _get_file_digest(data_path, rel_path, manifest["digests"])])
+    # files named by parameters can be outside data_path. they are small, so they
+    # are hashed every time instead of going through the digest cache.
+    for name in sorted(FILE_PARAMS & set(params)):
+        if params[name]:
+            file_path = os.path.abspath(params[name])
+            inputs.append([file_path, _hash_file(file_path)])
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(stage.name.encode("utf-8"))
+    hasher.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    hasher.update(json.dumps(inputs).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _get_output_stats(stage: "Stage", data_path: str) -> Dict[str, List[int]]:
+    stats = {}
+    for out_path in stage.outputs:
+        for rel_path in iter_files(data_path, out_path, stage.wiki):
+            stat = os.stat(os.path.join(data_path, rel_path))
+            stats[rel_path] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def is_up_to_date(
+    stage: "Stage", data_path: str, manifest: Dict[str, Any], fingerprint: str
+) -> bool:
+    entry = manifest["stages"].get(stage.name)
+    if entry is None or entry["fingerprint"] != fingerprint:
+        return False
+    outputs = _get_output_stats(stage, data_path)
+    return len(outputs) > 0 and outputs == entry["outputs"]
+
+
+def clear_stage(stage: "Stage", manifest: Dict[str, Any]) -> None:
+    manifest["stages"].pop(stage.name, None)
+
+
+def record_stage(
+    stage: "Stage", data_path: str, manifest: Dict[str, Any], fingerprint: str
+) -> None:
+    manifest["stages"][stage.name] = {
+        "fingerprint": fingerprint,
+        "outputs": _get_output_stats(stage, data_path),
+    }
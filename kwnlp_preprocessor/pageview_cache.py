@@ -0,0 +1,60 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Cache of daily pageview counts for one wiki.
+
+Each day is stored in its own .npz file with,
+
+* titles: page titles joined with newlines as utf-8 bytes (uint8)
+* views: views of each title on that day (int32), aligned with titles
+* page_ids: page id of each title (int32, -1 if unknown), aligned with titles
+
+Titles are kept in the order they were first seen in the daily pageviews
+file so summing cached days in date order gives the same page order as
+reading the daily files. Daily pageview files do not change once they are
+published so a cached day is reused by every dump (and every window) that
+includes it.
+"""
+import datetime
+import logging
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_VERSION = 2
+
+
+def get_cache_dir(data_path: str, wiki: str) -> str:
+    return os.path.join(data_path, "pageviews-daily-cache", wiki)
+
+
+def get_day_path(cache_dir: str, date_obj: datetime.date) -> str:
+    return os.path.join(cache_dir, f"v{CACHE_VERSION}-{date_obj:%Y%m%d}.npz")
+
+
+def write_day(
+    file_path: str, titles: Sequence[str], views: Sequence[int], page_ids: Sequence[int]
+) -> None:
+    """Atomically write the counts of one day."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    titles_blob = "\n".join(titles).encode("utf-8")
+    tmp_file_path = f"{file_path}.tmp.npz"
+    np.savez_compressed(
+        tmp_file_path,
+        titles=np.frombuffer(titles_blob, dtype=np.uint8),
+        views=np.array(views, dtype=np.int32),
+        page_ids=np.array(page_ids, dtype=np.int32),
+    )
+    os.replace(tmp_file_path, file_path)
+
+
+def read_day(file_path: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Return the titles, views and page ids of one day."""
+    with np.load(file_path) as npz:
+        titles_blob = npz["titles"].tobytes()
+        views = npz["views"]
+        page_ids = npz["page_ids"]
+    titles = titles_blob.decode("utf-8").split("\n") if len(views) > 0 else []
+    return titles, views, page_ids
@@ -1,9 +1,12 @@
 # Copyright 2021-present Kensho Technologies, LLC.
 import logging
-from typing import List
+import os
+from typing import List, Sequence
 
 from kwnlp_preprocessor import (
     argconfig,
+    instrumentation,
+    scheduler,
     task_00_download_raw_dumps,
     task_03p1_create_kwnlp_pagecounts,
     task_03p2_convert_sql_to_csv,
@@ -27,62 +30,86 @@ from kwnlp_preprocessor import (
 logger = logging.getLogger(__name__)
 
 
+# tasks in the order they would run sequentially. the scheduler works out which
+# of them can run concurrently from the INPUTS and OUTPUTS each task declares.
+TASKS = [
+    task_00_download_raw_dumps,
+    task_03p1_create_kwnlp_pagecounts,
+    task_03p2_convert_sql_to_csv,
+    task_06p1_create_kwnlp_page_props,
+    task_06p2_create_kwnlp_redirect_it2,
+    task_09p1_create_kwnlp_ultimate_redirect,
+    task_12p1_create_kwnlp_title_mapper,
+    task_15p1_split_and_compress_wikidata,
+    task_18p1_filter_wikidata_dump,
+    task_21p1_gather_wikidata_chunks,
+    task_24p1_create_kwnlp_article_pre,
+    task_27p1_parse_wikitext,
+    task_30p1_post_process_link_chunks,
+    task_33p1_collect_post_processed_link_data,
+    task_36p1_collect_template_data,
+    task_36p2_collect_length_data,
+    task_39p1_create_kwnlp_article,
+    task_42p1_collect_section_names,
+]
+
+
 def main(
     wp_yyyymmdd: str,
     wd_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    wikis: Sequence[str] = (),
     mirror_url: str = argconfig.DEFAULT_KWNLP_WIKI_MIRROR_URL,
     jobs_to_download: List[str] = argconfig.DEFAULT_KWNLP_DOWNLOAD_JOBS.split(","),
     max_entities: int = argconfig.DEFAULT_KWNLP_MAX_ENTITIES,
     workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
+    pipeline_readers: int = argconfig.DEFAULT_KWNLP_PIPELINE_READERS,
+    pageview_window: str = argconfig.DEFAULT_KWNLP_PAGEVIEW_WINDOW,
+    sql_split_tables: Sequence[str] = (),
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    previous_wp_yyyymmdd: str = "",
+    wikidata_split: str = argconfig.DEFAULT_KWNLP_WIKIDATA_SPLIT,
+    wikidata_codec: str = argconfig.DEFAULT_KWNLP_WIKIDATA_CODEC,
+    chunk_codec: str = argconfig.DEFAULT_KWNLP_CHUNK_CODEC,
+    extraction_spec: str = "",
     include_item_statements: bool = False,
+    cpu_budget: int = argconfig.DEFAULT_KWNLP_CPU_BUDGET,
+    force: Sequence[str] = (),
 ) -> None:
 
-    task_00_download_raw_dumps.main(
-        wp_yyyymmdd,
-        wd_yyyymmdd,
-        data_path=data_path,
-        mirror_url=mirror_url,
-        wiki=wiki,
-        jobs_to_download=jobs_to_download,
-    )
-    task_03p1_create_kwnlp_pagecounts.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_03p2_convert_sql_to_csv.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_06p1_create_kwnlp_page_props.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_06p2_create_kwnlp_redirect_it2.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_09p1_create_kwnlp_ultimate_redirect.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_12p1_create_kwnlp_title_mapper.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_15p1_split_and_compress_wikidata.main(
-        wd_yyyymmdd, data_path=data_path, max_entities=max_entities
-    )
-    task_18p1_filter_wikidata_dump.main(
-        wd_yyyymmdd,
+    params = {
+        "wp_yyyymmdd": wp_yyyymmdd,
+        "wd_yyyymmdd": wd_yyyymmdd,
+        "data_path": data_path,
+        "wiki": wiki,
+        "wikis": list(wikis),
+        "mirror_url": mirror_url,
+        "jobs_to_download": jobs_to_download,
+        "max_entities": max_entities,
+        "workers": workers,
+        "pipeline_readers": pipeline_readers,
+        "pageview_window": pageview_window,
+        "sql_split_tables": sql_split_tables,
+        "table_format": table_format,
+        "previous_wp_yyyymmdd": previous_wp_yyyymmdd,
+        "wikidata_split": wikidata_split,
+        "wikidata_codec": wikidata_codec,
+        "chunk_codec": chunk_codec,
+        # an absolute path so that the fingerprint does not depend on the working directory
+        "extraction_spec": os.path.abspath(extraction_spec) if extraction_spec else "",
+        "include_item_statements": include_item_statements,
+    }
+    stages = scheduler.build_stages([task.__name__ for task in TASKS], params, cpu_budget)
+    for stage in stages:
+        logger.info(f"stage {stage.name} depends on {sorted(stage.deps)}")
+    scheduler.run_stages(
+        stages,
+        cpu_budget,
         data_path=data_path,
-        wiki=wiki,
-        workers=workers,
-        max_entities=max_entities,
-        include_item_statements=include_item_statements,
+        force=force,
+        report_path=instrumentation.get_report_path(data_path),
     )
-    task_21p1_gather_wikidata_chunks.main(wd_yyyymmdd, data_path=data_path)
-    task_24p1_create_kwnlp_article_pre.main(
-        wp_yyyymmdd, wd_yyyymmdd, data_path=data_path, wiki=wiki
-    )
-    task_27p1_parse_wikitext.main(
-        wp_yyyymmdd,
-        data_path=data_path,
-        wiki=wiki,
-        workers=workers,
-        max_entities=max_entities,
-    )
-    task_30p1_post_process_link_chunks.main(
-        wp_yyyymmdd, data_path=data_path, wiki=wiki, workers=workers
-    )
-    task_33p1_collect_post_processed_link_data.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_36p1_collect_template_data.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_36p2_collect_length_data.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_39p1_create_kwnlp_article.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
-    task_42p1_collect_section_names.main(wp_yyyymmdd, data_path=data_path, wiki=wiki)
 
 
 if __name__ == "__main__":
@@ -94,10 +121,23 @@ if __name__ == "__main__":
         "data_path",
         "mirror_url",
         "wiki",
+        "wikis",
         "jobs",
         "max_entities",
         "workers",
+        "pipeline_readers",
+        "pageview_window",
+        "sql_split_tables",
+        "table_format",
+        "previous_wp_yyyymmdd",
+        "wikidata_split",
+        "wikidata_codec",
+        "chunk_codec",
+        "extraction_spec",
+        "cpu_budget",
+        "force",
         "loglevel",
+        "include_item_statements",
     ]
     parser = argconfig.get_argparser(description, arg_names)
 
@@ -105,6 +145,12 @@ if __name__ == "__main__":
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
     jobs_to_download = argconfig.list_from_comma_delimited_string(args.jobs)
+    force = argconfig.list_from_comma_delimited_string(args.force) if args.force else []
+    sql_split_tables = (
+        argconfig.list_from_comma_delimited_string(args.sql_split_tables)
+        if args.sql_split_tables
+        else []
+    )
 
     main(
         args.wp_yyyymmdd,
@@ -112,7 +158,20 @@ if __name__ == "__main__":
         data_path=args.data_path,
         mirror_url=args.mirror_url,
         wiki=args.wiki,
+        wikis=argconfig.list_from_comma_delimited_string(args.wikis) if args.wikis else [],
         jobs_to_download=jobs_to_download,
         max_entities=args.max_entities,
         workers=args.workers,
+        pipeline_readers=args.pipeline_readers,
+        pageview_window=args.pageview_window,
+        sql_split_tables=sql_split_tables,
+        table_format=args.table_format,
+        previous_wp_yyyymmdd=args.previous_wp_yyyymmdd,
+        wikidata_split=args.wikidata_split,
+        wikidata_codec=args.wikidata_codec,
+        chunk_codec=args.chunk_codec,
+        extraction_spec=args.extraction_spec,
+        include_item_statements=args.include_item_statements,
+        cpu_budget=args.cpu_budget,
+        force=force,
     )
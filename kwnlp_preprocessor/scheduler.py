@@ -0,0 +1,345 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Dependency aware scheduler for running tasks in parallel.
+
+Each task module declares the paths it reads and writes (relative to the
+top level data directory) in the module level ``INPUTS`` and ``OUTPUTS``
+lists. Paths ending in "/" are directories. A stage depends on every other
+stage that writes one of its inputs (or a directory containing one of its
+inputs).
+
+Stages run in their own processes as soon as their dependencies have
+finished. The number of cpus in use at one time is limited by a global
+budget. A stage that takes a ``workers`` argument is charged ``workers``
+cpus (plus ``pipeline_readers`` if it takes that too), every other stage is
+charged one.
+
+When a data path is given, stages whose inputs, parameters and outputs are
+unchanged since their last successful run are skipped (see the manifest
+module). Forcing a stage also reruns everything downstream of it.
+
+When a report path is given, resource usage of every stage (see the
+instrumentation module) is written to a JSON run report.
+
+Several wikis can be processed in one run by giving a list of ``wikis`` in
+the parameters. Tasks whose main accepts ``wikis`` (e.g. the wikidata and
+pageview passes) run as one stage for all of them. Every other task that
+takes a ``wiki`` runs as one stage per wiki named ``{task}_{wiki}`` (e.g.
+task_27p1_parse_wikitext_dewiki). Stages of different wikis never depend on
+each other because the file names of every per wiki output start with (or
+contain) the wiki.
+"""
+import datetime
+import importlib
+import inspect
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+from tempfile import TemporaryDirectory
+import time
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from kwnlp_preprocessor import instrumentation, manifest
+
+logger = logging.getLogger(__name__)
+
+
+class Stage(NamedTuple):
+    name: str
+    module_name: str
+    kwargs: Dict[str, Any]
+    inputs: List[str]
+    outputs: List[str]
+    cpus: int
+    deps: FrozenSet[str]
+    # wiki of a per wiki stage in a multi wiki run ("" otherwise)
+    wiki: str = ""
+
+
+def _get_stage_name(module_name: str) -> str:
+    return module_name.split(".")[-1]
+
+
+def _format_paths(templates: Sequence[str], params: Dict[str, Any]) -> List[str]:
+    return [template.format(**params) for template in templates]
+
+
+def _path_contains(outer: str, inner: str) -> bool:
+    """Return True if path `inner` is `outer` or is inside directory `outer`."""
+    return inner == outer or (outer.endswith("/") and inner.startswith(outer))
+
+
+def _get_kwargs(main: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Select the parameters accepted by a task main function."""
+    parameters = inspect.signature(main).parameters
+    return {name: value for name, value in params.items() if name in parameters}
+
+
+def _get_wiki_bindings(
+    module: Any, params: Dict[str, Any], wikis: Sequence[str]
+) -> List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]:
+    """Return (wiki, kwargs, path params) of each stage of a task.
+
+    `wiki` is "" unless the task runs as one stage per wiki. Paths are
+    formatted with each of the path params.
+    """
+    parameters = inspect.signature(module.main).parameters
+    if len(wikis) < 2 or "wiki" not in parameters:
+        return [("", _get_kwargs(module.main, params), [params])]
+    params_by_wiki = [dict(params, wiki=wiki) for wiki in wikis]
+    if "wikis" in parameters:
+        shared_params = {name: value for name, value in params.items() if name != "wiki"}
+        return [("", _get_kwargs(module.main, dict(shared_params, wikis=wikis)), params_by_wiki)]
+    return [
+        (wiki, _get_kwargs(module.main, wiki_params), [wiki_params])
+        for wiki, wiki_params in zip(wikis, params_by_wiki)
+    ]
+
+
+def build_stages(
+    module_names: Sequence[str], params: Dict[str, Any], cpu_budget: int
+) -> List[Stage]:
+    """Build stages and their dependencies from task module declarations.
+
+    Args:
+        module_names: task modules in their canonical (sequential) order
+        params: all pipeline parameters. each task main receives the subset it accepts.
+            a list of several ``wikis`` makes a multi wiki run (see module docstring).
+        cpu_budget: maximum number of cpus to use at one time
+
+    Returns:
+        stages in the same order as `module_names` (per wiki stages in the order of `wikis`)
+    """
+    wikis = list(params.get("wikis") or [])
+    params = {name: value for name, value in params.items() if name != "wikis"}
+    if len(wikis) == 1:
+        params["wiki"] = wikis[0]
+
+    declared = []
+    for module_name in module_names:
+        module = importlib.import_module(module_name)
+        for wiki, kwargs, path_params in _get_wiki_bindings(module, params, wikis):
+            if "workers" in kwargs:
+                cpus = min(kwargs["workers"] + kwargs.get("pipeline_readers", 0), cpu_budget)
+            else:
+                cpus = 1
+            inputs: List[str] = []
+            outputs: List[str] = []
+            for stage_params in path_params:
+                inputs.extend(_format_paths(module.INPUTS, stage_params))
+                outputs.extend(_format_paths(module.OUTPUTS, stage_params))
+            name = _get_stage_name(module_name)
+            declared.append(
+                Stage(
+                    name=f"{name}_{wiki}" if wiki else name,
+                    module_name=module_name,
+                    kwargs=kwargs,
+                    inputs=list(dict.fromkeys(inputs)),
+                    outputs=list(dict.fromkeys(outputs)),
+                    cpus=max(cpus, 1),
+                    deps=frozenset(),
+                    wiki=wiki,
+                )
+            )
+
+    stages = []
+    for stage in declared:
+        deps = frozenset(
+            other.name
+            for other in declared
+            if other.module_name != stage.module_name
+            and not (stage.wiki and other.wiki and stage.wiki != other.wiki)
+            and any(
+                _path_contains(out_path, in_path) or _path_contains(in_path, out_path)
+                for out_path in other.outputs
+                for in_path in stage.inputs
+            )
+        )
+        stages.append(stage._replace(deps=deps))
+
+    _check_acyclic(stages)
+    return stages
+
+
+def _check_acyclic(stages: Sequence[Stage]) -> None:
+    deps = {stage.name: set(stage.deps) for stage in stages}
+    resolved: Set[str] = set()
+    while deps:
+        ready = [name for name, stage_deps in deps.items() if stage_deps <= resolved]
+        if not ready:
+            raise ValueError(f"dependency cycle between stages {sorted(deps)}")
+        for name in ready:
+            resolved.add(name)
+            del deps[name]
+
+
+def _matches_stage_name(name: str, patterns: Sequence[str]) -> bool:
+    """Match full stage names or task prefixes (e.g. "task_27p1")."""
+    return any(name == pattern or name.startswith(f"{pattern}_") for pattern in patterns)
+
+
+def get_downstream(stages: Sequence[Stage], names: Sequence[str]) -> Set[str]:
+    """Return names of the matching stages and all stages that depend on them."""
+    downstream = set(stage.name for stage in stages if _matches_stage_name(stage.name, names))
+    if "all" in names:
+        downstream = set(stage.name for stage in stages)
+    # stages are in topological order so one pass is enough
+    for stage in stages:
+        if stage.deps & downstream:
+            downstream.add(stage.name)
+    return downstream
+
+
+def _run_stage(module_name: str, kwargs: Dict[str, Any], loglevel: int, metrics_path: str) -> None:
+    """Entry point for stage processes."""
+    logging.basicConfig(level=loglevel)
+    module = importlib.import_module(module_name)
+    with instrumentation.measure_stage() as metrics:
+        module.main(**kwargs)
+    instrumentation.write_json(metrics_path, metrics)
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    cpu_budget: int,
+    data_path: Optional[str] = None,
+    force: Sequence[str] = (),
+    report_path: Optional[str] = None,
+) -> None:
+    """Run stages in parallel respecting dependencies and the cpu budget.
+
+    Stages are started in the order given whenever their dependencies are done
+    and enough of the cpu budget is free. A stage that needs more cpus than the
+    whole budget is started once nothing else is running. If a stage fails, no
+    new stages are started, running stages are allowed to finish and then a
+    RuntimeError is raised.
+
+    Args:
+        stages: stages in topological order (as returned by `build_stages`)
+        cpu_budget: maximum number of cpus to use at one time
+        data_path: if not None, skip up to date stages using the run manifest in this directory
+            and report the sizes of stage inputs and outputs
+        force: stage names (or task prefixes, or "all") to rerun along with everything downstream
+        report_path: if not None, write a JSON run report to this path. the report is
+            also written when stages fail.
+    """
+    with TemporaryDirectory() as metrics_dir:
+        records = _run_stages(stages, cpu_budget, data_path, force, metrics_dir)
+    if report_path is not None:
+        instrumentation.write_run_report(
+            report_path, records["started"], cpu_budget, records["stages"]
+        )
+    failed = [record["name"] for record in records["stages"] if record["status"] == "failed"]
+    not_run = [record["name"] for record in records["stages"] if record["status"] == "pending"]
+    if failed or not_run:
+        raise RuntimeError(f"stages failed: {failed}, stages not run: {not_run}")
+
+
+def _run_stages(
+    stages: Sequence[Stage],
+    cpu_budget: int,
+    data_path: Optional[str],
+    force: Sequence[str],
+    metrics_dir: str,
+) -> Dict[str, Any]:
+    """Run stages and return a record of what happened to each of them."""
+    started = datetime.datetime.now()
+    t_start = time.perf_counter()
+    records = {
+        stage.name: {
+            "name": stage.name,
+            "status": "pending",
+            "cpus": stage.cpus,
+            "kwargs": stage.kwargs,
+        }
+        for stage in stages
+    }
+    ctx = multiprocessing.get_context("spawn")
+    loglevel = logging.getLogger().getEffectiveLevel()
+    stage_names = set(stage.name for stage in stages)
+    pending = list(stages)
+    running: Dict[Any, Stage] = {}
+    done: Set[str] = set()
+    failed: List[str] = []
+    cpus_in_use = 0
+    fingerprints: Dict[str, str] = {}
+    forced = get_downstream(stages, force)
+    if data_path is not None:
+        run_manifest = manifest.load_manifest(data_path)
+
+    while pending or running:
+
+        # start every stage that is ready and fits in the budget
+        # ------------------------------------------------------------
+        if not failed:
+            for stage in list(pending):
+                if not (stage.deps & stage_names) <= done:
+                    continue
+                if data_path is not None and stage.name not in fingerprints:
+                    fingerprints[stage.name] = manifest.get_fingerprint(
+                        stage, data_path, run_manifest
+                    )
+                    if stage.name not in forced and manifest.is_up_to_date(
+                        stage, data_path, run_manifest, fingerprints[stage.name]
+                    ):
+                        logger.info(f"skipping up to date stage {stage.name}")
+                        records[stage.name]["status"] = "skipped"
+                        done.add(stage.name)
+                        pending.remove(stage)
+                        continue
+                    manifest.clear_stage(stage, run_manifest)
+                    manifest.save_manifest(run_manifest, data_path)
+                if running and cpus_in_use + stage.cpus > cpu_budget:
+                    continue
+                logger.info(f"starting stage {stage.name} with {stage.cpus} cpus")
+                record = records[stage.name]
+                record["status"] = "running"
+                record["start_seconds"] = time.perf_counter() - t_start
+                if data_path is not None:
+                    record["inputs"] = instrumentation.get_path_sizes(data_path, stage.inputs)
+                process = ctx.Process(
+                    target=_run_stage,
+                    args=(
+                        stage.module_name,
+                        stage.kwargs,
+                        loglevel,
+                        os.path.join(metrics_dir, f"{stage.name}.json"),
+                    ),
+                    name=stage.name,
+                )
+                process.start()
+                running[process] = stage
+                cpus_in_use += stage.cpus
+                pending.remove(stage)
+
+        if not running:
+            break
+
+        # wait for at least one stage to finish
+        # ------------------------------------------------------------
+        sentinels = {process.sentinel: process for process in running}
+        for sentinel in wait(list(sentinels)):
+            process = sentinels[sentinel]
+            process.join()
+            stage = running.pop(process)
+            cpus_in_use -= stage.cpus
+            record = records[stage.name]
+            record["end_seconds"] = time.perf_counter() - t_start
+            metrics = instrumentation.read_json(os.path.join(metrics_dir, f"{stage.name}.json"))
+            if metrics is not None:
+                record.update(metrics)
+            if data_path is not None:
+                record["outputs"] = instrumentation.get_path_sizes(data_path, stage.outputs)
+            if process.exitcode == 0:
+                logger.info(f"finished stage {stage.name}")
+                record["status"] = "done"
+                done.add(stage.name)
+                if data_path is not None:
+                    manifest.record_stage(stage, data_path, run_manifest, fingerprints[stage.name])
+                    manifest.save_manifest(run_manifest, data_path)
+            else:
+                logger.error(f"stage {stage.name} failed with exit code {process.exitcode}")
+                record["status"] = "failed"
+                failed.append(stage.name)
+
+    return {"started": started, "stages": [records[stage.name] for stage in stages]}
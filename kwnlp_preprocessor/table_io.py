@@ -0,0 +1,278 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Read and write the tables passed between tasks.
+
+The format of a table is given by the extension of its path,
+
+* csv: plain CSV (the default)
+* parquet: typed, compressed columnar file
+* feather: typed, compressed Arrow IPC file
+
+Parquet and Feather need pyarrow (``pip install kwnlp_preprocessor[columnar]``).
+They keep column types, so readers do not have to parse and infer them again,
+and they can read only the columns they need.
+
+Chunk files written while parsing dumps (e.g. links-chunks) are always CSV
+(optionally compressed, see chunk_codecs) so they can be appended to one page
+at a time. ``gather_tables`` streams them into one table in any of the formats
+with the column types its writer declares (see CHUNK_COLUMN_TYPES). pyarrow
+detects the codec of a chunk from its extension like chunk_codecs does.
+"""
+import logging
+import os
+from typing import Any, Dict, Iterator, Mapping, Optional, Sequence
+
+import pandas as pd
+
+from kwnlp_preprocessor import utils
+
+logger = logging.getLogger(__name__)
+
+
+TABLE_FORMATS = ("csv", "parquet", "feather")
+COMPRESSION = "zstd"
+
+# pyarrow type names of the columns of the CSV chunk files written by tasks
+# 18p1 and 27p1, in file order, keyed by chunk directory (without -chunks).
+# empty values in columns that are not strings are read as missing.
+CHUNK_COLUMN_TYPES: Dict[str, Dict[str, str]] = {
+    # task_18p1_filter_wikidata_dump
+    "p31-claim": {"source_id": "int64", "target_id": "int64", "rnk": "int64"},
+    "p279-claim": {"source_id": "int64", "target_id": "int64", "rnk": "int64"},
+    "qpq-claim": {
+        "source_id": "int64",
+        "property_id": "int64",
+        "target_id": "int64",
+        "rnk": "int64",
+    },
+    "item": {"item_id": "int64", "en_label": "string", "en_description": "string"},
+    "item-alias": {"item_id": "int64", "en_alias": "string"},
+    "item-statements": {
+        "statement_id": "string",
+        "mainsnak_datatype": "string",
+        "datavalue_datatype": "string",
+        "source_item_id": "int64",
+        "edge_property_id": "int64",
+        "target_datavalue": "string",
+    },
+    "property": {"property_id": "int64", "en_label": "string", "en_description": "string"},
+    "property-alias": {"property_id": "int64", "en_alias": "string"},
+    "skipped-entity": {"qid": "int64", "instances_of": "string"},
+    # task_27p1_parse_wikitext
+    "links": {
+        "source_page_id": "int64",
+        "section_idx": "int64",
+        "paragraph_idx": "int64",
+        "anchor_text": "string",
+        "anchor_start": "int64",
+        "target_page_id": "int64",
+    },
+    "section-names": {"page_id": "int64", "section_idx": "int64", "section_name": "string"},
+    "templates": {
+        "page_id": "int64",
+        "good_article": "int64",
+        "featured_article": "int64",
+        "pseudoscience": "int64",
+        "conspiracy_theories": "int64",
+    },
+    "lengths": {"page_id": "int64", "len_article_chars": "int64", "len_intro_chars": "int64"},
+}
+
+
+def check_table_format(table_format: str) -> None:
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f"table_format must be one of {TABLE_FORMATS}, got {table_format}")
+
+
+def get_table_format(file_path: str) -> str:
+    table_format = os.path.splitext(file_path)[1].lstrip(".")
+    check_table_format(table_format)
+    return table_format
+
+
+def write_table(df: pd.DataFrame, file_path: str, index: bool = False) -> None:
+    """Write a DataFrame in the format given by the extension of `file_path`.
+
+    If `index` is True the index is written as the first column(s) like
+    `DataFrame.to_csv` does so that every format reads back the same columns.
+    """
+    table_format = get_table_format(file_path)
+    if table_format == "csv":
+        df.to_csv(file_path, index=index)
+        return
+    df = df.reset_index(drop=not index)
+    if table_format == "parquet":
+        df.to_parquet(file_path, index=False, compression=COMPRESSION)
+    else:
+        df.to_feather(file_path, compression=COMPRESSION)
+
+
+def read_table(
+    file_path: str, columns: Optional[Sequence[str]] = None, **read_csv_kwargs: Any
+) -> pd.DataFrame:
+    """Read a table written by `write_table` or `gather_tables`.
+
+    Args:
+        file_path: path of the table. the extension gives the format.
+        columns: optional subset of the columns to read
+        read_csv_kwargs: passed to `pd.read_csv` for CSV tables (e.g.
+            keep_default_na). columnar tables already have typed columns and
+            keep empty strings as empty strings.
+    """
+    table_format = get_table_format(file_path)
+    if table_format == "csv":
+        return pd.read_csv(file_path, usecols=columns, **read_csv_kwargs)
+    elif table_format == "parquet":
+        return pd.read_parquet(file_path, columns=columns)
+    else:
+        return pd.read_feather(file_path, columns=columns)
+
+
+def read_table_chunks(
+    file_path: str,
+    chunk_rows: int,
+    columns: Optional[Sequence[str]] = None,
+    **read_csv_kwargs: Any,
+) -> Iterator[pd.DataFrame]:
+    """Read a table in DataFrames of at most `chunk_rows` rows (see `read_table`)."""
+    table_format = get_table_format(file_path)
+    if table_format == "csv":
+        yield from pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows, **read_csv_kwargs)
+    elif table_format == "parquet":
+        from pyarrow import parquet as pq
+
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pyarrow as pa
+
+        with pa.ipc.open_file(file_path) as reader:
+            for ii in range(reader.num_record_batches):
+                batch = reader.get_batch(ii)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(offset, chunk_rows).to_pandas()
+
+
+def _open_columnar_writer(file_path: str, schema: Any) -> Any:
+    import pyarrow as pa
+    from pyarrow import parquet as pq
+
+    if get_table_format(file_path) == "parquet":
+        return pq.ParquetWriter(file_path, schema, compression=COMPRESSION)
+    return pa.ipc.new_file(
+        file_path, schema, options=pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+    )
+
+
+class TableWriter:
+    """Write DataFrames with the same columns one after another into one table.
+
+    Columnar column types are taken from the first DataFrame. Columns that are
+    all missing in the first DataFrame are written as strings.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.table_format = get_table_format(file_path)
+        self.num_rows = 0
+        self._fp: Any = None
+        self._writer: Any = None
+        self._schema: Any = None
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.table_format == "csv":
+            if self._fp is None:
+                self._fp = open(self.file_path, "w")
+                df.to_csv(self._fp, index=False)
+            else:
+                df.to_csv(self._fp, header=False, index=False)
+        else:
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = pa.schema(
+                    [
+                        (field.name, pa.string() if pa.types.is_null(field.type) else field.type)
+                        for field in table.schema
+                    ]
+                )
+                self._writer = _open_columnar_writer(self.file_path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        self.num_rows += len(df)
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _get_schema(column_types: Mapping[str, str], columns: Optional[Sequence[str]]) -> Any:
+    import pyarrow as pa
+
+    names = list(column_types) if columns is None else list(columns)
+    missing = [name for name in names if name not in column_types]
+    if missing:
+        raise ValueError(f"no column types for {missing}")
+    return pa.schema([(name, pa.type_for_alias(column_types[name])) for name in names])
+
+
+def gather_tables(
+    in_file_paths: Sequence[str],
+    out_file_path: str,
+    column_types: Mapping[str, str],
+    columns: Optional[Sequence[str]] = None,
+) -> int:
+    """Concatenate CSV chunk files (in order) into one table.
+
+    CSV tables are gathered with `utils.gather_csv_files`. Columnar tables are
+    converted one block at a time so memory use does not grow with the size of
+    the data.
+
+    Args:
+        in_file_paths: CSV chunk files, all with the same header
+        out_file_path: path of the table. the extension gives the format.
+        column_types: pyarrow type name (e.g. int64, float64, string) of each
+            column of the chunk files, in file order. values that do not
+            convert to their type raise pyarrow.ArrowInvalid.
+        columns: optional subset of the columns to write (all by default)
+
+    Returns:
+        number of lines written for CSV tables, number of rows otherwise
+    """
+    if get_table_format(out_file_path) == "csv":
+        return utils.gather_csv_files(in_file_paths, out_file_path, columns=columns)
+
+    from pyarrow import csv as pa_csv
+
+    schema = _get_schema(column_types, columns)
+    file_paths = utils._get_gather_file_paths(in_file_paths)
+    os.makedirs(os.path.dirname(out_file_path) or os.curdir, exist_ok=True)
+    convert_options = pa_csv.ConvertOptions(
+        column_types={field.name: field.type for field in schema},
+        include_columns=schema.names,
+        strings_can_be_null=False,
+    )
+    num_rows = 0
+    with _open_columnar_writer(out_file_path, schema) as writer:
+        for file_path in file_paths:
+            logger.info(f"collecting from {file_path}")
+            reader = pa_csv.open_csv(
+                file_path,
+                read_options=pa_csv.ReadOptions(block_size=utils.GATHER_BUFFER_SIZE),
+                convert_options=convert_options,
+            )
+            for batch in reader:
+                writer.write_batch(batch)
+                num_rows += batch.num_rows
+    return num_rows
@@ -1,7 +1,7 @@
 # Copyright 2021-present Kensho Technologies, LLC.
 """Download raw wikimedia data."""
 import logging
-from typing import List
+from typing import List, Sequence
 
 from kwnlp_preprocessor import argconfig
 from kwnlp_dump_downloader.downloader import download_jobs
@@ -9,6 +9,15 @@ from kwnlp_dump_downloader.downloader import download_jobs
 
 logger = logging.getLogger(__name__)
 
+INPUTS: List[str] = []
+OUTPUTS = [
+    "wikipedia-raw-{wp_yyyymmdd}/",
+    "wikidata-raw-{wd_yyyymmdd}/",
+]
+
+# jobs that download the same files whatever the wiki
+SHARED_JOBS = frozenset(["pageviewcomplete", "wikidata"])
+
 
 def main(
     wp_yyyymmdd: str,
@@ -17,16 +26,22 @@ def main(
     mirror_url: str = argconfig.DEFAULT_KWNLP_WIKI_MIRROR_URL,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
     jobs_to_download: List[str] = argconfig.DEFAULT_KWNLP_DOWNLOAD_JOBS.split(","),
+    wikis: Sequence[str] = (),
 ) -> None:
 
-    download_jobs(
-        wp_yyyymmdd,
-        wd_yyyymmdd,
-        data_path=data_path,
-        mirror_url=mirror_url,
-        wiki=wiki,
-        jobs_to_download=jobs_to_download,
-    )
+    # shared jobs are only downloaded with the first wiki
+    for ii, wiki in enumerate(list(wikis) or [wiki]):
+        wiki_jobs = [job for job in jobs_to_download if ii == 0 or job not in SHARED_JOBS]
+        if not wiki_jobs:
+            continue
+        download_jobs(
+            wp_yyyymmdd,
+            wd_yyyymmdd,
+            data_path=data_path,
+            mirror_url=mirror_url,
+            wiki=wiki,
+            jobs_to_download=wiki_jobs,
+        )
 
 
 if __name__ == "__main__":
@@ -39,6 +54,7 @@ if __name__ == "__main__":
         "mirror_url",
         "wiki",
         "jobs",
+        "wikis",
         "loglevel",
     ]
     parser = argconfig.get_argparser(description, arg_names)
@@ -56,4 +72,5 @@ if __name__ == "__main__":
         mirror_url=args.mirror_url,
         wiki=args.wiki,
         jobs_to_download=jobs_to_download,
+        wikis=argconfig.list_from_comma_delimited_string(args.wikis) if args.wikis else [],
     )
@@ -2,22 +2,62 @@
 """Filter monthly pageviews file to a single wiki and put in CSV format.
 
 in: pageviews-YYYYMMDD-user.bz2
-out: kwnlp-WIKI-YYYYMMDD-prior-month-pageviews-complete.csv
+out: kwnlp-WIKI-YYYYMMDD-prior-month-pageviews-complete.csv (keyed by page title)
+out: kwnlp-WIKI-YYYYMMDD-prior-month-pageviews-complete-by-page-id.csv
+
+Some records (e.g. from mobile apps) have no page id. In the page id keyed
+output the views of a title on a given day go to the first page id seen for
+that title on that day (and are left out if there is none). The page id
+keyed totals are summed in numpy arrays. Both outputs are written in the
+``table_format`` of the pipeline (.csv above by default).
+
+The views are summed over a window of days,
+
+* prior-month: the calendar month before the dump date (default)
+* last-N-days: the N days before the dump date (e.g. last-90-days)
+* YYYYMMDD-YYYYMMDD: an inclusive range of dates
+
+Counts for each day are cached (see the pageview_cache module) so a day is
+only decompressed and filtered once no matter how many dumps or windows it
+is part of. Days that are not cached yet are counted by pool workers. Days
+are summed in date order (so the output is the same as counting the daily
+files one by one). Daily files are looked for in the raw directory of the
+dump and then in the raw directories of other dumps. The output file name
+says prior-month whatever the window for the sake of downstream tasks.
+
+Several wikis can be counted at once (``wikis``). Each daily file is then
+read once and its lines are bucketed by project code into the cache of
+each wiki.
 """
 import bz2
 from calendar import monthrange
 import collections
 import csv
 import datetime
+import glob
 import logging
+from multiprocessing import get_context
 import os
-import time
+import re
 import typing
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, instrumentation, pageview_cache, table_io
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-raw-{wp_yyyymmdd}/pageviewcomplete/",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete-by-page-id.{table_format}",
+    "pageviews-daily-cache/{wiki}/",
+]
+
 
 def _get_date_obj(yyyymmdd: str) -> datetime.date:
     wp_date = datetime.date(
@@ -33,59 +73,151 @@ def _subtract_one_month(date_obj: datetime.date) -> datetime.date:
     return date_obj_minus_one_month
 
 
-def main(
-    wp_yyyymmdd: str,
-    data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
-    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
-) -> None:
+def _get_window_dates(wp_date: datetime.date, window: str) -> List[datetime.date]:
+    """Return the dates in a pageview window (see module docstring)."""
+    if window == "prior-month":
+        wp_date_minus_one_month = _subtract_one_month(wp_date)
+        year = wp_date_minus_one_month.year
+        month = wp_date_minus_one_month.month
+        _, days_in_month = monthrange(year, month)
+        return [datetime.date(year, month, day) for day in range(1, days_in_month + 1)]
 
-    wp_raw_path = os.path.join(data_path, f"wikipedia-raw-{wp_yyyymmdd}")
-    wp_raw_pageview_path = os.path.join(wp_raw_path, "pageviewcomplete")
-    wp_derived_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
-    filter_code = "{}.wikipedia".format(wiki.replace("wiki", ""))
+    match = re.fullmatch(r"last-(\d+)-days", window)
+    if match:
+        num_days = int(match.group(1))
+        return [wp_date - datetime.timedelta(days=ii) for ii in range(num_days, 0, -1)]
 
-    wp_date = _get_date_obj(wp_yyyymmdd)
-    wp_date_minus_one_month = _subtract_one_month(wp_date)
-    year = wp_date_minus_one_month.year
-    month = wp_date_minus_one_month.month
-    _, days_in_month = monthrange(wp_date_minus_one_month.year, wp_date_minus_one_month.month)
+    match = re.fullmatch(r"(\d{8})-(\d{8})", window)
+    if match:
+        start_date = _get_date_obj(match.group(1))
+        end_date = _get_date_obj(match.group(2))
+        num_days = (end_date - start_date).days + 1
+        if num_days < 1:
+            raise ValueError(f"pageview window {window} ends before it starts")
+        return [start_date + datetime.timedelta(days=ii) for ii in range(num_days)]
 
-    # read in and filter pagecounts
-    # ====================================================================
-    t_start = time.time()
-    pageviews: typing.Counter[str] = collections.Counter()
+    raise ValueError(
+        f"unknown pageview window {window}. expected prior-month, last-N-days or "
+        "YYYYMMDD-YYYYMMDD"
+    )
+
+
+def _find_day_file_path(data_path: str, wp_yyyymmdd: str, date_obj: datetime.date) -> str:
+    in_file_name = f"pageviews-{date_obj:%Y%m%d}-user.bz2"
+    in_file_path = os.path.join(
+        data_path, f"wikipedia-raw-{wp_yyyymmdd}", "pageviewcomplete", in_file_name
+    )
+    if os.path.exists(in_file_path):
+        return in_file_path
+    other_file_paths = sorted(
+        glob.glob(os.path.join(data_path, "wikipedia-raw-*", "pageviewcomplete", in_file_name))
+    )
+    if not other_file_paths:
+        raise FileNotFoundError(f"{in_file_name} is not cached or downloaded in {data_path}")
+    return other_file_paths[-1]
 
-    # loop over days and accumulate into pageviews counter
-    for day in range(1, days_in_month + 1):
 
-        in_file_name = "pageviews-{}{:0>2d}{:0>2d}-user.bz2".format(year, month, day)
-        in_file_path = os.path.join(wp_raw_pageview_path, in_file_name)
-        logger.info(f"reading and filtering {in_file_path}")
+def _get_filter_code(wiki: str) -> str:
+    return "{}.wikipedia".format(wiki.replace("wiki", ""))
 
-        with bz2.open(in_file_path, "rb") as fp:
+
+def count_day_pageviews(args: Dict) -> Dict[str, Any]:
+    """Sum the daily views of each page title in one daily pageviews file and cache them.
+
+    Lines are bucketed by project code, one cache file per wiki in
+    ``args["cache_file_paths"]`` (keyed by project code, e.g. en.wikipedia).
+    """
+    filter_codes = list(args["cache_file_paths"])
+    filter_code_bytes = tuple(filter_code.encode("utf-8") for filter_code in filter_codes)
+    code_pageviews: Dict[str, typing.Counter[str]] = {
+        filter_code: collections.Counter() for filter_code in filter_codes
+    }
+    code_title_page_ids: Dict[str, Dict[str, int]] = {
+        filter_code: {} for filter_code in filter_codes
+    }
+    logger.info("reading and filtering {}".format(args["in_file_path"]))
+    with instrumentation.measure_worker(args["in_file_path"]) as metrics:
+        with bz2.open(args["in_file_path"], "rb") as fp:
             for line in fp:
+                metrics["rows"] += 1
+                # skip other wikis before paying for decode and split
+                if not line.startswith(filter_code_bytes):
+                    continue
                 pieces = line.decode("utf-8", errors="ignore").split()
                 if len(pieces) != 6:
                     continue
-                if not pieces[0].startswith(filter_code):
+                for filter_code in filter_codes:
+                    if pieces[0].startswith(filter_code):
+                        break
+                else:
                     continue
                 project_name, page_title, page_id, platform, daily_views, hourly_views = pieces
+                pageviews = code_pageviews[filter_code]
+                title_page_ids = code_title_page_ids[filter_code]
 
                 # to capture views for the same page from different sources
                 # e.g.
                 # ['en.wikipedia', 'Anarchism', '12', 'desktop', '1614', 'A69B77C73D72E59F46G52H67I37J44K50L44M58N56O90P103Q78R79S94T60U68V80W88X70']
                 # ['en.wikipedia', 'Anarchism', '12', 'mobile-web', '1972', 'A94B100C120D86E124F91G65H83I57J63K60L64M58N68O81P86Q84R80S99T67U80V90W79X93']
                 pageviews[page_title] += int(daily_views)
-                if page_title == "Anarchism":
-                    print(pieces)
+                if page_title not in title_page_ids and page_id.isdigit():
+                    title_page_ids[page_title] = int(page_id)
+        for filter_code, cache_file_path in args["cache_file_paths"].items():
+            pageviews = code_pageviews[filter_code]
+            title_page_ids = code_title_page_ids[filter_code]
+            pageview_cache.write_day(
+                cache_file_path,
+                list(pageviews.keys()),
+                list(pageviews.values()),
+                [title_page_ids.get(page_title, -1) for page_title in pageviews],
+            )
+    return metrics
+
+
+def _add_views_by_page_id(
+    page_ids: np.ndarray, views: np.ndarray, day_page_ids: np.ndarray, day_views: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Add the views of one day to sorted page id and total views arrays."""
+    is_known = day_page_ids >= 0
+    all_page_ids = np.concatenate([page_ids, day_page_ids[is_known].astype(np.int64)])
+    all_views = np.concatenate([views, day_views[is_known].astype(np.int64)])
+    page_ids, inverse = np.unique(all_page_ids, return_inverse=True)
+    views = np.zeros(len(page_ids), dtype=np.int64)
+    np.add.at(views, inverse, all_views)
+    return page_ids, views
+
+
+def _write_pagecounts(
+    wp_yyyymmdd: str,
+    data_path: str,
+    wiki: str,
+    window_dates: List[datetime.date],
+    table_format: str,
+) -> None:
+    """Sum the cached days of one wiki and write its pagecounts."""
+    wp_derived_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
+    cache_dir = pageview_cache.get_cache_dir(data_path, wiki)
+
+    # sum cached days in date order so pages are in order of first view
+    # ====================================================================
+    pageviews: typing.Counter[str] = collections.Counter()
+    page_ids = np.zeros(0, dtype=np.int64)
+    page_id_views = np.zeros(0, dtype=np.int64)
+    for date_obj in window_dates:
+        titles, views, day_page_ids = pageview_cache.read_day(
+            pageview_cache.get_day_path(cache_dir, date_obj)
+        )
+        pageviews.update(dict(zip(titles, views.tolist())))
+        page_ids, page_id_views = _add_views_by_page_id(
+            page_ids, page_id_views, day_page_ids, views
+        )
 
     rows = [(page_title, views) for page_title, views in pageviews.items()]
-    t_end = time.time()
-    logger.info("time elapsed: {:.2f}s".format(t_end - t_start))
+    instrumentation.add_count("pages", len(rows))
 
     # write out filtered pagecounts
     # ====================================================================
-    out_file_name = f"kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete.csv"
+    out_file_name = f"kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete.{table_format}"
     out_file_path = os.path.join(
         wp_derived_path,
         "kwnlp-sql",
@@ -93,22 +225,91 @@ def main(
     )
     os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
     logger.info(f"writing {out_file_path}")
-    t_start = time.time()
-    with open(out_file_path, "w") as ofp:
-        csv_writer = csv.writer(ofp)
-        csv_writer.writerow(["page_title", "views"])
-        csv_writer.writerows(rows)
-    t_end = time.time()
+    if table_format == "csv":
+        with open(out_file_path, "w") as ofp:
+            csv_writer = csv.writer(ofp)
+            csv_writer.writerow(["page_title", "views"])
+            csv_writer.writerows(rows)
+    else:
+        table_io.write_table(pd.DataFrame(rows, columns=["page_title", "views"]), out_file_path)
+
+    out_file_path = os.path.join(
+        wp_derived_path,
+        "kwnlp-sql",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete-by-page-id.{table_format}",
+    )
+    logger.info(f"writing {out_file_path}")
+    table_io.write_table(pd.DataFrame({"page_id": page_ids, "views": page_id_views}), out_file_path)
+
+
+def main(
+    wp_yyyymmdd: str,
+    data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
+    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
+    pageview_window: str = argconfig.DEFAULT_KWNLP_PAGEVIEW_WINDOW,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    wikis: Sequence[str] = (),
+) -> None:
+
+    wikis = list(wikis) or [wiki]
+    window_dates = _get_window_dates(_get_date_obj(wp_yyyymmdd), pageview_window)
+    logger.info(f"summing pageviews of {wikis} from {window_dates[0]} to {window_dates[-1]}")
+
+    # count days that are not cached yet (for all wikis in one pass)
+    # ====================================================================
+    mp_args = []
+    for date_obj in window_dates:
+        cache_file_paths = {}
+        for wiki in wikis:
+            cache_dir = pageview_cache.get_cache_dir(data_path, wiki)
+            cache_file_path = pageview_cache.get_day_path(cache_dir, date_obj)
+            if not os.path.exists(cache_file_path):
+                cache_file_paths[_get_filter_code(wiki)] = cache_file_path
+        if not cache_file_paths:
+            continue
+        mp_args.append(
+            {
+                "in_file_path": _find_day_file_path(data_path, wp_yyyymmdd, date_obj),
+                "cache_file_paths": cache_file_paths,
+            }
+        )
+    logger.info("counting {} of {} days".format(len(mp_args), len(window_dates)))
+    instrumentation.add_count("days_cached", len(window_dates) - len(mp_args))
+    if mp_args:
+        with get_context("spawn").Pool(min(max(workers, 1), len(mp_args))) as p:
+            worker_metrics = p.map(count_day_pageviews, mp_args)
+        instrumentation.record_workers(worker_metrics, "pageview_lines")
+
+    for wiki in wikis:
+        _write_pagecounts(wp_yyyymmdd, data_path, wiki, window_dates, table_format)
 
 
 if __name__ == "__main__":
 
     description = "create kwnlp pageviews-complete"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = [
+        "wp_yyyymmdd",
+        "data_path",
+        "wiki",
+        "workers",
+        "pageview_window",
+        "table_format",
+        "wikis",
+        "loglevel",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        workers=args.workers,
+        pageview_window=args.pageview_window,
+        table_format=args.table_format,
+        wikis=argconfig.list_from_comma_delimited_string(args.wikis) if args.wikis else [],
+    )
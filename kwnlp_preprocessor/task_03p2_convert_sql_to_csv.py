@@ -1,13 +1,45 @@
 # Copyright 2021-present Kensho Technologies, LLC.
-"""Convert raw SQL dumps into CSVs."""
+"""Convert raw SQL dumps into CSVs.
+
+The page_props, redirect and page tables are independent so with more than
+one worker they are converted concurrently, each in its own process.
+
+Tables named in ``sql_split_tables`` (e.g. page) are also split at INSERT
+statement boundaries. The table process decompresses the dump and hands
+batches of INSERT statements to a pool of parser processes, writing the
+parsed rows in dump order. At most MAX_PENDING_BATCHES_PER_WORKER batches per
+parser are in flight so the reader waits for the pool instead of holding the
+decompressed dump in memory. These tables get the workers that are not busy
+converting the other tables. The CSVs are the same either way.
+
+With a columnar ``table_format`` each table is converted to a temporary CSV
+first and then streamed into the columnar file.
+"""
+from collections import deque
+import csv
 import logging
+from multiprocessing import get_context
+from multiprocessing.pool import AsyncResult
 import os
+import re
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from kwnlp_sql_parser.wp_sql_dump import WikipediaSqlDump
+from kwnlp_sql_parser.wp_sql_dump import WikipediaSqlCsvDialect, WikipediaSqlDump
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, table_io
 
 logger = logging.getLogger(__name__)
+
+INPUTS = [
+    "wikipedia-raw-{wp_yyyymmdd}/pagepropstable/{wiki}-{wp_yyyymmdd}-page_props.sql.gz",
+    "wikipedia-raw-{wp_yyyymmdd}/redirecttable/{wiki}-{wp_yyyymmdd}-redirect.sql.gz",
+    "wikipedia-raw-{wp_yyyymmdd}/pagetable/{wiki}-{wp_yyyymmdd}-page.sql.gz",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-redirect.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page.{table_format}",
+]
 ARTICLE_NAMESPACE = ("0",)
 
 
@@ -29,75 +61,240 @@ def _get_out_table_path(
     table: str,
     wiki: str,
     wp_yyyymmdd: str,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> str:
     name = table.replace("_", "-")
     return os.path.join(
         prefix,
-        f"{wiki}-{wp_yyyymmdd}-{name}.csv",
+        f"{wiki}-{wp_yyyymmdd}-{name}.{table_format}",
     )
 
 
+TABLES = ["page_props", "redirect", "page"]
+INSERT_BATCH_LINES = 4
+MAX_PENDING_BATCHES_PER_WORKER = 4
+
+# the columns we keep from each table and their pyarrow type names
+TABLE_COLUMN_TYPES: Dict[str, Dict[str, str]] = {
+    "page_props": {"pp_page": "int64", "pp_propname": "string", "pp_value": "string"},
+    "redirect": {"rd_from": "int64", "rd_title": "string"},
+    "page": {
+        "page_id": "int64",
+        "page_namespace": "int64",
+        "page_title": "string",
+        "page_is_redirect": "int64",
+        "page_is_new": "int64",
+        "page_touched": "int64",
+        "page_links_updated": "int64",
+        "page_latest": "int64",
+        "page_len": "int64",
+    },
+}
+
+
+def _get_sql_dump(table: str, in_file_path: str) -> WikipediaSqlDump:
+    if table == "page_props":
+        return WikipediaSqlDump(
+            in_file_path,
+            allowlists={"pp_propname": argconfig.KWNLP_PAGE_PROPNAMES},
+            keep_column_names=tuple(TABLE_COLUMN_TYPES[table]),
+        )
+    elif table == "redirect":
+        return WikipediaSqlDump(
+            in_file_path,
+            allowlists={"rd_namespace": ARTICLE_NAMESPACE},
+            keep_column_names=tuple(TABLE_COLUMN_TYPES[table]),
+        )
+    elif table == "page":
+        return WikipediaSqlDump(
+            in_file_path,
+            allowlists={"page_namespace": ARTICLE_NAMESPACE},
+            keep_column_names=tuple(TABLE_COLUMN_TYPES[table]),
+        )
+    else:
+        raise ValueError(f"unknown table {table}")
+
+
+def _iter_insert_batches(sql_dump: WikipediaSqlDump) -> Iterator[List[str]]:
+    batch = []
+    for line in sql_dump.iter_lines():
+        if not line.startswith("INSERT INTO"):
+            continue
+        batch.append(line)
+        if len(batch) >= INSERT_BATCH_LINES:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_worker_sql_dump: Optional[WikipediaSqlDump] = None
+
+
+def _init_parse_worker(table: str, in_file_path: str) -> None:
+    global _worker_sql_dump
+    _worker_sql_dump = _get_sql_dump(table, in_file_path)
+
+
+def _parse_lines(sql_dump: WikipediaSqlDump, lines: List[str]) -> Tuple[int, List[Tuple[str, ...]]]:
+    """Return the number of rows matched in `lines` and the CSV rows kept.
+
+    WikipediaSqlDump has no public way to parse part of a dump. This does what
+    its to_csv does for each line, using its compiled_row_pattern and sqlrow
+    attributes as of kwnlp_sql_parser 0.0.2.
+    """
+    matches = [
+        match for line in lines for match in re.finditer(sql_dump.compiled_row_pattern, line)
+    ]
+    return len(matches), sql_dump.sqlrow.csv_rows_from_matches(matches)
+
+
+def _parse_insert_batch(lines: List[str]) -> Tuple[int, List[Tuple[str, ...]]]:
+    assert _worker_sql_dump is not None
+    return _parse_lines(_worker_sql_dump, lines)
+
+
+def _write_ready(csv_writer: Any, pending: Deque[AsyncResult], max_pending: int) -> int:
+    """Write parsed batches in order until at most `max_pending` remain.
+
+    Returns:
+        number of rows matched in the written batches
+    """
+    num_matches = 0
+    while len(pending) > max_pending:
+        batch_matches, rows = pending.popleft().get()
+        num_matches += batch_matches
+        csv_writer.writerows(rows)
+    return num_matches
+
+
+def _split_to_csv(
+    sql_dump: WikipediaSqlDump, table: str, in_file_path: str, out_file_path: str, workers: int
+) -> None:
+    """Same output as `WikipediaSqlDump.to_csv` with parsing spread over a pool."""
+    logger.info(f"writing CSV to {out_file_path} with {workers} parser processes")
+    count_row_matches = 0
+    with open(out_file_path, "w") as fp:
+        csv_writer = csv.writer(fp, dialect=WikipediaSqlCsvDialect())
+        csv_writer.writerow(sql_dump.get_csv_header())
+        max_pending = MAX_PENDING_BATCHES_PER_WORKER * workers
+        pending: Deque[AsyncResult] = deque()
+        with get_context("spawn").Pool(
+            workers, initializer=_init_parse_worker, initargs=(table, in_file_path)
+        ) as p:
+            for lines in _iter_insert_batches(sql_dump):
+                pending.append(p.apply_async(_parse_insert_batch, (lines,)))
+                count_row_matches += _write_ready(csv_writer, pending, max_pending)
+            count_row_matches += _write_ready(csv_writer, pending, 0)
+    if count_row_matches == 0:
+        raise RuntimeError("No matches found, check row regular expression.")
+
+
+def convert_table(table: str, in_file_path: str, out_file_path: str, workers: int = 1) -> None:
+    """Convert one SQL table dump, splitting the parsing over `workers` if > 1.
+
+    The format of the output is given by the extension of `out_file_path`.
+    """
+    os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
+    if table_io.get_table_format(out_file_path) == "csv":
+        csv_file_path = out_file_path
+    else:
+        csv_file_path = os.path.splitext(out_file_path)[0] + ".tmp.csv"
+    sql_dump = _get_sql_dump(table, in_file_path)
+    if workers > 1:
+        _split_to_csv(sql_dump, table, in_file_path, csv_file_path, workers)
+    else:
+        sql_dump.to_csv(outfile=csv_file_path)
+    if csv_file_path != out_file_path:
+        table_io.gather_tables([csv_file_path], out_file_path, TABLE_COLUMN_TYPES[table])
+        os.remove(csv_file_path)
+
+
+def _run_table_processes(table_args: Sequence[Dict], max_processes: int) -> None:
+    ctx = get_context("spawn")
+    for ii in range(0, len(table_args), max_processes):
+        processes = [
+            ctx.Process(target=convert_table, kwargs=kwargs)
+            for kwargs in table_args[ii : ii + max_processes]
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        for process, kwargs in zip(processes, table_args[ii : ii + max_processes]):
+            if process.exitcode != 0:
+                raise RuntimeError(
+                    "converting {} failed with exit code {}".format(
+                        kwargs["in_file_path"], process.exitcode
+                    )
+                )
+
+
 def main(
     wp_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
+    sql_split_tables: Sequence[str] = (),
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> None:
 
+    table_io.check_table_format(table_format)
     wp_in_path = os.path.join(data_path, f"wikipedia-raw-{wp_yyyymmdd}")
     wp_out_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "kwnlp-sql")
 
-    table = "page_props"
-    in_file_path = _get_in_table_path(wp_in_path, table, wiki, wp_yyyymmdd)
-    out_file_path = _get_out_table_path(wp_out_path, table, wiki, wp_yyyymmdd)
-    os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
-    page_props_sql_dump = WikipediaSqlDump(
-        in_file_path,
-        allowlists={"pp_propname": ("wikibase_item", "wikibase-shortdesc")},
-        keep_column_names=("pp_page", "pp_propname", "pp_value"),
-    )
-    page_props_sql_dump.to_csv(outfile=out_file_path)
-
-    table = "redirect"
-    in_file_path = _get_in_table_path(wp_in_path, table, wiki, wp_yyyymmdd)
-    out_file_path = _get_out_table_path(wp_out_path, table, wiki, wp_yyyymmdd)
-    os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
-    redirect_sql_dump = WikipediaSqlDump(
-        in_file_path,
-        allowlists={"rd_namespace": ARTICLE_NAMESPACE},
-        keep_column_names=("rd_from", "rd_title"),
-    )
-    redirect_sql_dump.to_csv(outfile=out_file_path)
+    # workers not used for converting the other tables parse the split tables
+    workers = max(workers, 1)
+    split_workers = max(workers - (len(TABLES) - 1), 1)
+    table_args: List[Dict[str, Any]] = [
+        {
+            "table": table,
+            "in_file_path": _get_in_table_path(wp_in_path, table, wiki, wp_yyyymmdd),
+            "out_file_path": _get_out_table_path(
+                wp_out_path, table, wiki, wp_yyyymmdd, table_format
+            ),
+            "workers": split_workers if table in sql_split_tables else 1,
+        }
+        for table in TABLES
+    ]
+    # start the tables with parser pools first
+    table_args = sorted(table_args, key=lambda kwargs: -kwargs["workers"])
 
-    table = "page"
-    in_file_path = _get_in_table_path(wp_in_path, table, wiki, wp_yyyymmdd)
-    out_file_path = _get_out_table_path(wp_out_path, table, wiki, wp_yyyymmdd)
-    os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
-    page_sql_dump = WikipediaSqlDump(
-        in_file_path,
-        allowlists={"page_namespace": ARTICLE_NAMESPACE},
-        keep_column_names=(
-            "page_id",
-            "page_namespace",
-            "page_title",
-            "page_is_redirect",
-            "page_is_new",
-            "page_touched",
-            "page_links_updated",
-            "page_latest",
-            "page_len",
-        ),
-    )
-    page_sql_dump.to_csv(outfile=out_file_path)
+    if workers == 1:
+        for kwargs in table_args:
+            convert_table(**kwargs)
+    else:
+        _run_table_processes(table_args, workers)
 
 
 if __name__ == "__main__":
 
     description = "convert SQL dumps to CSVs"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = [
+        "wp_yyyymmdd",
+        "data_path",
+        "wiki",
+        "workers",
+        "sql_split_tables",
+        "table_format",
+        "loglevel",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
+    sql_split_tables = (
+        argconfig.list_from_comma_delimited_string(args.sql_split_tables)
+        if args.sql_split_tables
+        else []
+    )
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        workers=args.workers,
+        sql_split_tables=sql_split_tables,
+        table_format=args.table_format,
+    )
@@ -1,75 +1,130 @@
 # Copyright 2021-present Kensho Technologies, LLC.
-"""Update page_props format."""
+"""Update page_props format.
+
+The page_props table has one row per page and property. Here it is pivoted to
+one row per page with a column for each of the properties kept by task 03p2
+(argconfig.KWNLP_PAGE_PROPNAMES).
+
+The table is read and pivoted in chunks of PIVOT_CHUNK_ROWS rows so memory use
+does not depend on the size of the table or the number of properties. This
+relies on the rows of each page being next to each other with page ids
+increasing, which is the (primary key) order of the SQL dump. The rows of the
+last page in a chunk are carried over to the next chunk.
+"""
 import logging
 import os
+from typing import Iterable, Iterator, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, instrumentation, table_io
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
+]
+
+
+PIVOT_CHUNK_ROWS = 1_000_000
+
+
+def _pivot_page_props(df_pp: pd.DataFrame, propnames: Sequence[str]) -> pd.DataFrame:
+    df = df_pp.pivot(index="pp_page", columns="pp_propname", values="pp_value")
+    df = df.reindex(columns=list(propnames)).astype(object)
+    df.columns.name = None
+    df.index.name = "page_id"
+    return df.reset_index()
+
+
+def pivot_page_props(
+    df_chunks: Iterable[pd.DataFrame], propnames: Sequence[str]
+) -> Iterator[pd.DataFrame]:
+    """Pivot chunks of page_props rows (ordered by page id) to one row per page.
+
+    Args:
+        df_chunks: DataFrames with pp_page, pp_propname and pp_value columns
+        propnames: properties to make columns of (in this order). other
+            properties are dropped.
+
+    Yields:
+        DataFrames with a page_id column and one column per property. values
+        are missing if a page does not have a property.
+    """
+    df_carry: Optional[pd.DataFrame] = None
+    for df_pp in df_chunks:
+        if df_carry is not None:
+            df_pp = pd.concat([df_carry, df_pp], ignore_index=True)
+        if len(df_pp) == 0:
+            continue
+        page_ids = df_pp["pp_page"].values
+        if (np.diff(page_ids) < 0).any():
+            raise ValueError("page_props rows must be ordered by page id")
+        is_last_page = page_ids == page_ids[-1]
+        df_carry = df_pp[is_last_page]
+        yield _pivot_page_props(df_pp[~is_last_page], propnames)
+    if df_carry is not None:
+        yield _pivot_page_props(df_carry, propnames)
+
 
 def main(
     wp_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> None:
 
     wp_derived_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
 
-    # read page_props CSV
+    # read page_props in chunks
     # ====================================================================
-    file_path = os.path.join(
+    in_file_path = os.path.join(
         wp_derived_path,
         "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-page-props.csv",
+        f"{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
     )
-    logger.info(f"reading {file_path}")
-    df_pp = pd.read_csv(
-        file_path,
+    logger.info(f"reading {in_file_path}")
+    df_chunks = table_io.read_table_chunks(
+        in_file_path,
+        PIVOT_CHUNK_ROWS,
         keep_default_na=False,
+        dtype={"pp_value": str},
     )
 
-    # reform
-    # ====================================================================
-    page_ids = df_pp["pp_page"].unique()
-    df = pd.DataFrame({"page_id": page_ids})
-
-    for propname in df_pp["pp_propname"].unique():
-
-        df = (
-            pd.merge(
-                df,
-                df_pp.loc[df_pp["pp_propname"] == propname, ["pp_page", "pp_value"]],
-                left_on="page_id",
-                right_on="pp_page",
-                how="left",
-            )
-            .rename(columns={"pp_value": propname})
-            .drop(columns=["pp_page"])
-        )
-
-    # write output
+    # reform and write output
     # ====================================================================
-    file_path = os.path.join(
+    out_file_path = os.path.join(
         wp_derived_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-page-props.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
     )
-    logger.info(f"writing {file_path}")
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    df.to_csv(file_path, index=False)
+    logger.info(f"writing {out_file_path}")
+    os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
+    # rows are ordered by property name within each page so sorting the names
+    # gives the columns in order of first appearance
+    with table_io.TableWriter(out_file_path) as writer:
+        for df in pivot_page_props(df_chunks, sorted(argconfig.KWNLP_PAGE_PROPNAMES)):
+            writer.write(df)
+    instrumentation.add_count("rows", writer.num_rows)
 
 
 if __name__ == "__main__":
 
     description = "convert KWNLP page_props CSV"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "table_format", "loglevel"]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        table_format=args.table_format,
+    )
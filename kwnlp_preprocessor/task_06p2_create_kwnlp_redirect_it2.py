@@ -1,96 +1,213 @@
 # Copyright 2021-present Kensho Technologies, LLC.
-"""Add source page titles and target page ids to redirect CSV."""
+"""Add source page titles and target page ids to redirect CSV.
+
+Titles are looked up in a title dictionary of the page table (see the
+title_dictionary module) which is also written for later tasks.
+
+If the tables of a previous dump are given (see the incremental module) only
+redirects whose row, source page or target title changed are recomputed and
+change logs of the page table and of redirect-it2 are written.
+"""
 import logging
 import os
 
+import numpy as np
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, incremental, instrumentation, table_io, title_dictionary
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-redirect.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page.{table_format}",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-redirect-it2.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-redirect-it2-changes.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page-changes.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-dictionary.npz",
+]
 
-def main(
-    wp_yyyymmdd: str,
-    data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
-    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
-) -> None:
 
-    wp_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
-
-    # read redirect CSV
-    # ====================================================================
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-redirect.csv",
-    )
+def _read_redirect(file_path: str) -> pd.DataFrame:
     logger.info(f"reading {file_path}")
-    df_redirect = pd.read_csv(
+    df_redirect = table_io.read_table(
         file_path,
         keep_default_na=False,
     )
-    df_redirect = df_redirect.rename(columns={"rd_from": "source_id", "rd_title": "target_title"})
+    return df_redirect.rename(columns={"rd_from": "source_id", "rd_title": "target_title"})
 
-    # read page CSV
-    # ====================================================================
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-page.csv",
-    )
+
+def _read_page(file_path: str) -> pd.DataFrame:
     logger.info(f"reading {file_path}")
-    df_page = pd.read_csv(
+    return table_io.read_table(
         file_path,
         keep_default_na=False,
-        usecols=["page_id", "page_title"],
+        columns=["page_id", "page_title"],
     )
 
-    # merge to add source titles
+
+def _create_redirect_it2(
+    df_redirect: pd.DataFrame, titles: title_dictionary.TitleDictionary
+) -> pd.DataFrame:
+
+    # encode source ids and target titles to add source titles and target ids
     # ====================================================================
-    logger.info("merging to add source titles")
-    df = pd.merge(
-        df_redirect,
-        df_page,
-        left_on="source_id",
-        right_on="page_id",
+    logger.info("encoding source ids and target titles")
+    source_codes = titles.encode_page_ids(df_redirect["source_id"].values)
+    target_codes = titles.encode(df_redirect["target_title"].values)
+    is_resolved = (source_codes != -1) & (target_codes != -1)
+    return pd.DataFrame(
+        {
+            "source_id": df_redirect["source_id"].values[is_resolved],
+            "source_title": titles.decode(source_codes[is_resolved]),
+            "target_id": titles.page_ids[target_codes[is_resolved]],
+            "target_title": df_redirect["target_title"].values[is_resolved],
+        }
     )
-    df = df.drop(columns=["page_id"])
-    df = df.rename(columns={"page_title": "source_title"})
 
-    # merge to add target ids
+
+def _get_affected_source_ids(
+    df_redirect: pd.DataFrame,
+    df_prev_it2: pd.DataFrame,
+    df_page_changes: pd.DataFrame,
+    df_redirect_changes: pd.DataFrame,
+    changed_titles: np.ndarray,
+) -> np.ndarray:
+    """Return redirects whose row, source page or target page changed."""
+    changed_page_ids = df_page_changes["page_id"].values
+    is_affected = df_redirect["source_id"].isin(changed_page_ids) | df_redirect[
+        "target_title"
+    ].isin(changed_titles)
+    is_prev_affected = (
+        df_prev_it2["source_id"].isin(changed_page_ids)
+        | df_prev_it2["target_id"].isin(changed_page_ids)
+        | df_prev_it2["target_title"].isin(changed_titles)
+    )
+    return np.unique(
+        np.concatenate(
+            [
+                df_redirect_changes["source_id"].values,
+                df_redirect.loc[is_affected, "source_id"].values,
+                df_prev_it2.loc[is_prev_affected, "source_id"].values,
+            ]
+        )
+    )
+
+
+def main(
+    wp_yyyymmdd: str,
+    data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
+    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    previous_wp_yyyymmdd: str = "",
+) -> None:
+
+    sql_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "kwnlp-sql")
+    prev_sql_path = os.path.join(
+        data_path, f"wikipedia-derived-{previous_wp_yyyymmdd}", "kwnlp-sql"
+    )
+    redirect_file_path = os.path.join(sql_path, f"{wiki}-{wp_yyyymmdd}-redirect.{table_format}")
+    page_file_path = os.path.join(sql_path, f"{wiki}-{wp_yyyymmdd}-page.{table_format}")
+    file_path = os.path.join(sql_path, f"{wiki}-{wp_yyyymmdd}-redirect-it2.{table_format}")
+    titles_file_path = os.path.join(sql_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-title-dictionary.npz")
+    prev_file_paths = [
+        os.path.join(prev_sql_path, f"{wiki}-{previous_wp_yyyymmdd}-{name}.{table_format}")
+        for name in ["redirect", "page", "redirect-it2"]
+    ]
+
+    # read redirect and page tables
+    # ====================================================================
+    df_redirect = _read_redirect(redirect_file_path)
+    df_page = _read_page(page_file_path)
+
+    # write title dictionary
     # ====================================================================
-    logger.info("merging to add target ids")
-    df = pd.merge(
-        df,
-        df_page,
-        left_on="target_title",
-        right_on="page_title",
+    logger.info(f"writing {titles_file_path}")
+    title_dictionary.write_title_dictionary(
+        titles_file_path, df_page["page_title"].values, df_page["page_id"].values
     )
-    df = df.drop(columns=["page_title"])
-    df = df.rename(columns={"page_id": "target_id"})
-    df = df[["source_id", "source_title", "target_id", "target_title"]]
+    titles = title_dictionary.TitleDictionary(
+        df_page["page_title"].values, df_page["page_id"].values
+    )
+
+    if not previous_wp_yyyymmdd or not incremental.has_previous(prev_file_paths):
+        df = _create_redirect_it2(df_redirect, titles)
+        incremental.remove_changes(file_path)
+        incremental.remove_changes(page_file_path)
+
+    else:
+        # diff against the previous dump
+        # ====================================================================
+        df_prev_redirect = _read_redirect(prev_file_paths[0])
+        df_prev_page = _read_page(prev_file_paths[1])
+        logger.info(f"reading {prev_file_paths[2]}")
+        df_prev_it2 = table_io.read_table(prev_file_paths[2], keep_default_na=False)
+
+        df_page_changes = incremental.get_changes(df_prev_page, df_page, "page_id")
+        df_redirect_changes = incremental.get_changes(df_prev_redirect, df_redirect, "source_id")
+        changed_page_ids = df_page_changes["page_id"].values
+        changed_titles = np.concatenate(
+            [
+                df_prev_page.loc[df_prev_page["page_id"].isin(changed_page_ids), "page_title"],
+                df_page.loc[df_page["page_id"].isin(changed_page_ids), "page_title"],
+            ]
+        )
+        source_ids = _get_affected_source_ids(
+            df_redirect, df_prev_it2, df_page_changes, df_redirect_changes, changed_titles
+        )
+        logger.info(f"recomputing {len(source_ids)} redirects")
+
+        # recompute affected redirects and replace them
+        # ====================================================================
+        df_affected = _create_redirect_it2(
+            df_redirect[df_redirect["source_id"].isin(source_ids)], titles
+        )
+        df = incremental.update_rows(
+            df_prev_it2,
+            df_affected,
+            "source_id",
+            source_ids,
+            order=pd.Index(df_redirect["source_id"]),
+        )
+        incremental.write_changes(df_page_changes, page_file_path)
+        incremental.write_changes(
+            incremental.get_changes(
+                df_prev_it2[df_prev_it2["source_id"].isin(source_ids)], df_affected, "source_id"
+            ),
+            file_path,
+        )
 
     # write output
     # ====================================================================
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-redirect-it2.csv",
-    )
     logger.info(f"writing {file_path}")
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    df.to_csv(file_path, index=False)
+    instrumentation.add_count("rows", len(df))
+    table_io.write_table(df, file_path)
 
 
 if __name__ == "__main__":
 
     description = "add source title and target id to raw redirect data"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = [
+        "wp_yyyymmdd",
+        "data_path",
+        "wiki",
+        "table_format",
+        "previous_wp_yyyymmdd",
+        "loglevel",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        table_format=args.table_format,
+        previous_wp_yyyymmdd=args.previous_wp_yyyymmdd,
+    )
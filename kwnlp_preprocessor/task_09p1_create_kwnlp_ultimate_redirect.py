@@ -8,104 +8,227 @@ becomes
 A->C and B->C
 
 In the process we remove cycles (self redirects, circular pairs, ...)
+
+If the tables of a previous dump are given (see the incremental module) only
+chains that pass through a changed redirect are resolved again.
 """
 import logging
 import os
+from typing import Tuple
 
+import numpy as np
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, incremental, instrumentation, table_io
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-redirect-it2.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-redirect-it2-changes.{table_format}",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect-changes.{table_format}",
+]
+
+
+def get_ultimate_rows(source_ids: np.ndarray, target_ids: np.ndarray) -> np.ndarray:
+    """Find the last redirect in the chain that starts at each redirect.
+
+    Row i is the redirect source_ids[i] -> target_ids[i]. For each row we return
+    the index of the row at the end of its chain (the first row in the chain
+    whose target is not itself a redirect source) or -1 if the chain runs into
+    a cycle. Rows whose target is not a redirect source point to themselves.
+
+    Chains are resolved with pointer jumping. In every pass each unresolved row
+    either picks up the answer of the row it points to or jumps its pointer to
+    the pointer of that row, so the number of (vectorized) passes grows with
+    the log of the longest chain. A pass that resolves no rows means all
+    remaining rows lead into cycles.
+    """
+    num_rows = len(source_ids)
+    row_ids = np.arange(num_rows)
+    ultimate_rows = np.full(num_rows, -1, dtype=np.int64)
+    if num_rows == 0:
+        return ultimate_rows
+
+    # row index of the redirect whose source is each row's target (or -1)
+    order = np.argsort(source_ids, kind="stable")
+    sorted_source_ids = source_ids[order]
+    idxs = np.searchsorted(sorted_source_ids, target_ids)
+    idxs[idxs == num_rows] = 0
+    is_multi_hop = sorted_source_ids[idxs] == target_ids
+    next_rows = np.where(is_multi_hop, order[idxs], -1)
+
+    ultimate_rows[~is_multi_hop] = row_ids[~is_multi_hop]
+    unresolved = row_ids[is_multi_hop]
+    while len(unresolved) > 0:
+        answers = ultimate_rows[next_rows[unresolved]]
+        is_resolved = answers != -1
+        if not is_resolved.any():
+            break
+        ultimate_rows[unresolved[is_resolved]] = answers[is_resolved]
+        unresolved = unresolved[~is_resolved]
+        next_rows[unresolved] = next_rows[next_rows[unresolved]]
+
+    return ultimate_rows
+
+
+def resolve_redirects(df_redirect: pd.DataFrame) -> pd.DataFrame:
+    """Replace the target of each redirect with the end of its chain.
+
+    Redirects that lead into cycles are dropped.
+    """
+    # calculate ultimate redirects
+    # e.g. if A->B and B->C then we update such that
+    # A->C and B->C
+    # the target title of the last redirect in a chain is the title of the
+    # ultimate target page so we do not need to look it up in the page CSV.
+    # ====================================================================
+    ultimate_rows = get_ultimate_rows(
+        df_redirect["source_id"].values, df_redirect["target_id"].values
+    )
+    num_multi_hop = (ultimate_rows != np.arange(len(df_redirect))).sum()
+    logger.info("resolving {} multi-hop redirects".format(num_multi_hop))
+
+    is_cycle = ultimate_rows == -1
+    if is_cycle.any():
+        logger.info(
+            "dropping {} redirects that lead into cycles: {}".format(
+                is_cycle.sum(), df_redirect.loc[is_cycle, "source_id"].tolist()
+            )
+        )
+    ultimate_rows = ultimate_rows[~is_cycle]
+    target_ids = df_redirect["target_id"].values[ultimate_rows]
+    target_titles = df_redirect["target_title"].values[ultimate_rows]
+    df_redirect = df_redirect[~is_cycle].copy()
+    df_redirect["target_id"] = target_ids
+    df_redirect["target_title"] = target_titles
+    return df_redirect
+
+
+def get_upstream_source_ids(df_redirect: pd.DataFrame, source_ids: np.ndarray) -> np.ndarray:
+    """Return `source_ids` and the sources of every chain that passes through them."""
+    upstream = set(source_ids.tolist())
+    frontier = source_ids
+    while len(frontier) > 0:
+        sources = df_redirect.loc[df_redirect["target_id"].isin(frontier), "source_id"].values
+        frontier = np.array([source_id for source_id in sources if source_id not in upstream])
+        upstream.update(frontier.tolist())
+    return np.array(sorted(upstream), dtype=np.int64)
+
+
+def update_redirects(
+    df_redirect: pd.DataFrame, df_prev: pd.DataFrame, changed_source_ids: np.ndarray
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Resolve only the chains that pass through a changed redirect.
+
+    Args:
+        df_redirect: redirect-it2 table of this dump
+        df_prev: ultimate redirect table of the previous dump (source_id column
+            not index)
+        changed_source_ids: sources of redirect-it2 rows that changed
+
+    Returns:
+        resolved rows of the affected sources (affected sources that lead into
+        cycles have no row) and the affected sources
+    """
+    source_ids = get_upstream_source_ids(df_redirect, changed_source_ids)
+    df_affected = df_redirect[df_redirect["source_id"].isin(source_ids)]
+
+    # chains leave the affected rows at redirects that did not change. stand
+    # in for each with one row to its previous ultimate target (or to itself
+    # if it was part of a cycle).
+    # ====================================================================
+    exits = np.setdiff1d(df_affected["target_id"].values, source_ids)
+    exits = exits[np.isin(exits, df_redirect["source_id"].values)]
+    df_exits = df_prev[df_prev["source_id"].isin(exits)]
+    cycle_ids = np.setdiff1d(exits, df_exits["source_id"].values)
+    df_cycles = df_redirect[df_redirect["source_id"].isin(cycle_ids)].assign(
+        target_id=lambda df: df["source_id"]
+    )
+    df = pd.concat([df_affected, df_exits, df_cycles], ignore_index=True)
+    logger.info(f"resolving {len(source_ids)} affected redirects")
+    df = resolve_redirects(df[df_redirect.columns])
+    return df[df["source_id"].isin(source_ids)], source_ids
+
 
 def main(
     wp_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    previous_wp_yyyymmdd: str = "",
 ) -> None:
 
-    wp_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
-
-    # read page CSV
-    # ====================================================================
+    sql_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "kwnlp-sql")
+    redirect_file_path = os.path.join(sql_path, f"{wiki}-{wp_yyyymmdd}-redirect-it2.{table_format}")
     file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-page.csv",
+        sql_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect.{table_format}"
     )
-    logger.info(f"reading {file_path}")
-    df_page = pd.read_csv(
-        file_path,
-        keep_default_na=False,
-        usecols=["page_id", "page_title"],
-    ).set_index("page_id")
-
-    # read redirect-it2 CSV
-    # ====================================================================
-    file_path = os.path.join(
-        wp_dump_path,
+    prev_file_path = os.path.join(
+        data_path,
+        f"wikipedia-derived-{previous_wp_yyyymmdd}",
         "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-redirect-it2.csv",
+        f"kwnlp-{wiki}-{previous_wp_yyyymmdd}-ultimate-redirect.{table_format}",
     )
-    logger.info(f"reading {file_path}")
-    df_redirect = pd.read_csv(file_path, keep_default_na=False).set_index("source_id")
 
-    # mask to identify multi-hop redirects
-    # ====================================================================
-    mask = df_redirect["target_id"].isin(df_redirect.index)
-    logger.info("resolving {} multi-hop redirects".format(mask.sum()))
-
-    # calculate ultimate redirects
-    # e.g. if A->B and B->C then we update such that
-    # A->C and B->C
+    # read redirect-it2 CSV
     # ====================================================================
-    new_target_ids = []
-    new_target_titles = []
-    for irow, target_id in enumerate(df_redirect.loc[mask, "target_id"].values):
-        target_chain = [target_id]
-
-        # while the target id exists in the source id index, follow the chain
-        while target_id in df_redirect.index:
-
-            target_id = df_redirect.loc[target_id, "target_id"]
-            target_title = df_page.loc[target_id, "page_title"]
-            if target_id in target_chain:
-                logger.info("cycle detected: {}".format(target_chain))
-                target_id = -1
-                target_title = ""
-                break
-            else:
-                target_chain.append(target_id)
-
-        new_target_ids.append(target_id)
-        new_target_titles.append(target_title)
-
-    df_redirect.loc[mask, "target_id"] = new_target_ids
-    df_redirect.loc[mask, "target_title"] = new_target_titles
-    df_redirect = df_redirect[df_redirect["target_id"] != -1]
+    logger.info(f"reading {redirect_file_path}")
+    df_redirect = table_io.read_table(redirect_file_path, keep_default_na=False)
+
+    if not previous_wp_yyyymmdd or not incremental.has_previous(
+        [prev_file_path, incremental.get_changes_path(redirect_file_path)]
+    ):
+        df_redirect = resolve_redirects(df_redirect)
+        incremental.remove_changes(file_path)
+
+    else:
+        logger.info(f"reading {prev_file_path}")
+        df_prev = table_io.read_table(prev_file_path, keep_default_na=False)
+        changed_source_ids = incremental.read_changed_keys(redirect_file_path, "source_id")
+        df_affected, source_ids = update_redirects(df_redirect, df_prev, changed_source_ids)
+        df_redirect = incremental.update_rows(df_prev, df_affected, "source_id", source_ids)
+        incremental.write_changes(
+            incremental.get_changes(
+                df_prev[df_prev["source_id"].isin(source_ids)], df_affected, "source_id"
+            ),
+            file_path,
+        )
 
     # sort and write output
     # ====================================================================
+    df_redirect = df_redirect.set_index("source_id")
     df_redirect = df_redirect.sort_values("source_id")
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect.csv",
-    )
     logger.info(f"writing {file_path}")
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    df_redirect.to_csv(file_path)
+    instrumentation.add_count("rows", len(df_redirect))
+    table_io.write_table(df_redirect, file_path, index=True)
 
 
 if __name__ == "__main__":
 
     description = "create ultimate redirect data"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = [
+        "wp_yyyymmdd",
+        "data_path",
+        "wiki",
+        "table_format",
+        "previous_wp_yyyymmdd",
+        "loglevel",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        table_format=args.table_format,
+        previous_wp_yyyymmdd=args.previous_wp_yyyymmdd,
+    )
@@ -5,48 +5,37 @@ This is meant to be used on links in the full text of wikipedia.
 
 For article titles it will map to the page id
 For redirect titles it will map to the ultimate redirect article page id.
+
+The same mapping is also written as a memory mapped title index (see the
+title_index module) for fast lookups from many processes.
+
+If the tables of a previous dump are given (see the incremental module) only
+pages that changed or whose ultimate redirect changed are mapped again.
 """
 import logging
 import os
 
+import numpy as np
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, incremental, instrumentation, table_io, title_index
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/{wiki}-{wp_yyyymmdd}-page-changes.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect-changes.{table_format}",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper-changes.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-index/",
+]
 
-def main(
-    wp_yyyymmdd: str,
-    data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
-    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
-) -> None:
-
-    wp_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
-
-    # read page CSV
-    # ====================================================================
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"{wiki}-{wp_yyyymmdd}-page.csv",
-    )
-    logger.info(f"reading {file_path}")
-    df_page = pd.read_csv(
-        file_path,
-        keep_default_na=False,
-        usecols=["page_id", "page_title"],
-    )
 
-    # read ultimate-redirect CSV
-    # ====================================================================
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect.csv",
-    )
-    logger.info(f"reading {file_path}")
-    df_redirect = pd.read_csv(file_path, keep_default_na=False)
+def _create_title_mapper(df_page: pd.DataFrame, df_redirect: pd.DataFrame) -> pd.DataFrame:
 
     # left join page and redirect
     # ====================================================================
@@ -64,29 +53,112 @@ def main(
     df.loc[mask, "target_id"] = df.loc[mask, "page_id"]
     df["target_id"] = df["target_id"].astype(int)
     df.loc[mask, "target_title"] = df.loc[mask, "page_title"]
-    df = df.rename(columns={"page_id": "source_id", "page_title": "source_title"})
+    return df.rename(columns={"page_id": "source_id", "page_title": "source_title"})
+
+
+def main(
+    wp_yyyymmdd: str,
+    data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
+    wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    previous_wp_yyyymmdd: str = "",
+) -> None:
+
+    sql_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "kwnlp-sql")
+    page_file_path = os.path.join(sql_path, f"{wiki}-{wp_yyyymmdd}-page.{table_format}")
+    redirect_file_path = os.path.join(
+        sql_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-ultimate-redirect.{table_format}"
+    )
+    file_path = os.path.join(sql_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.{table_format}")
+    prev_file_path = os.path.join(
+        data_path,
+        f"wikipedia-derived-{previous_wp_yyyymmdd}",
+        "kwnlp-sql",
+        f"kwnlp-{wiki}-{previous_wp_yyyymmdd}-title-mapper.{table_format}",
+    )
+
+    # read page CSV
+    # ====================================================================
+    logger.info(f"reading {page_file_path}")
+    df_page = table_io.read_table(
+        page_file_path,
+        keep_default_na=False,
+        columns=["page_id", "page_title"],
+    )
+
+    # read ultimate-redirect CSV
+    # ====================================================================
+    logger.info(f"reading {redirect_file_path}")
+    df_redirect = table_io.read_table(redirect_file_path, keep_default_na=False)
+
+    if not previous_wp_yyyymmdd or not incremental.has_previous(
+        [
+            prev_file_path,
+            incremental.get_changes_path(page_file_path),
+            incremental.get_changes_path(redirect_file_path),
+        ]
+    ):
+        df = _create_title_mapper(df_page, df_redirect)
+        incremental.remove_changes(file_path)
+
+    else:
+        # map changed pages and pages whose ultimate redirect changed
+        # ====================================================================
+        logger.info(f"reading {prev_file_path}")
+        df_prev = table_io.read_table(prev_file_path, keep_default_na=False)
+        source_ids = np.union1d(
+            incremental.read_changed_keys(page_file_path, "page_id"),
+            incremental.read_changed_keys(redirect_file_path, "source_id"),
+        )
+        logger.info(f"mapping {len(source_ids)} affected pages")
+        df_affected = _create_title_mapper(
+            df_page[df_page["page_id"].isin(source_ids)],
+            df_redirect[df_redirect["source_id"].isin(source_ids)],
+        )
+        df = incremental.update_rows(df_prev, df_affected, "source_id", source_ids)
+        incremental.write_changes(
+            incremental.get_changes(
+                df_prev[df_prev["source_id"].isin(source_ids)], df_affected, "source_id"
+            ),
+            file_path,
+        )
 
     # sort and write output
     # ====================================================================
     df = df.sort_values("source_id")
-    file_path = os.path.join(
-        wp_dump_path,
-        "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.csv",
-    )
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     logger.info(f"writing {file_path}")
-    df.to_csv(file_path, index=False)
+    instrumentation.add_count("rows", len(df))
+    table_io.write_table(df, file_path)
+
+    # write title index
+    # ====================================================================
+    dir_path = os.path.join(sql_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-title-index")
+    logger.info(f"writing {dir_path}")
+    title_index.write_title_index(dir_path, df["source_title"].values, df["target_id"].values)
 
 
 if __name__ == "__main__":
 
     description = "create title mapper data"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = [
+        "wp_yyyymmdd",
+        "data_path",
+        "wiki",
+        "table_format",
+        "previous_wp_yyyymmdd",
+        "loglevel",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        table_format=args.table_format,
+        previous_wp_yyyymmdd=args.previous_wp_yyyymmdd,
+    )
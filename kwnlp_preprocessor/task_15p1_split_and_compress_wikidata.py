@@ -2,34 +2,111 @@
 """Split Wikidata dump into many chunks.
 
 Split single compressed wikidata dump file into many compressed chunks.
-Chunks contain a fixed number of lines (i.e. wikidata entities).
-Splitting is handled in the main thread and re-compression is handled by
-multiple subprocesses.
+Chunks contain about CHUNK_BYTES of uncompressed lines (i.e. wikidata
+entities) each. Entity sizes vary a lot (from small scholarly articles to
+items with thousands of claims) so chunks of a fixed size in bytes take task
+18p1 about the same time to filter while chunks of a fixed number of lines
+do not.
+Splitting is handled in the main process and re-compression is handled by a
+pool of `workers` processes.
+
+Lines are streamed into blocks of at most BLOCK_BYTES and each block is
+compressed as its own stream with `wikidata_codec` (bz2 by default, see the
+chunk_codecs module). A chunk file is its streams concatenated which readers
+(and e.g. bzip2 -d) read as one file. At most MAX_PENDING_PER_WORKER
+blocks per worker are in flight so the splitter waits for the pool instead of
+holding a whole chunk (or the whole dump) in memory.
+
+With wikidata_split="blocks" the dump is not split at all. Instead the bz2
+blocks of the dump are indexed (see the bz2_blocks module) and task 18p1
+reads ranges of blocks of the original dump in parallel.
+
+The number of chunks depends on CHUNK_BYTES and on wikidata_split, so the
+output directory is cleared before writing. Task 18p1 reads every chunk in it.
 """
+from collections import deque
 import logging
+from multiprocessing import get_context
+from multiprocessing.pool import AsyncResult, Pool
 import os
-import subprocess
-from typing import Iterable
+import shutil
+from typing import BinaryIO, Deque, List, Optional, Tuple
 
-import funcy
 from qwikidata.json_dump import WikidataJsonDump
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, bz2_blocks, chunk_codecs
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikidata-raw-{wd_yyyymmdd}/wikidata-{wd_yyyymmdd}-all.json.bz2",
+]
+OUTPUTS = [
+    "wikidata-raw-chunks-{wd_yyyymmdd}/",
+]
 
-CHUNK_SIZE = 500_000
 
+CHUNK_BYTES = 4 * 1024 * 1024 * 1024
+BLOCK_BYTES = 8 * 1024 * 1024
+MAX_PENDING_PER_WORKER = 2
+BLOCK_RANGE_BYTES = 256 * 1024 * 1024
 
-def _count_unfinished_bzip_jobs(bzip_jobs: Iterable[subprocess.Popen]) -> int:
-    return sum([1 if bzip_job.poll() is None else 0 for bzip_job in bzip_jobs])
+
+def _compress_block(block: bytes, codec: chunk_codecs.Codec) -> bytes:
+    return chunk_codecs.compress(block, codec)
+
+
+class _ChunkFile:
+    """A chunk being written. It is renamed to its final path once closed."""
+
+    def __init__(self, out_file_path: str):
+        self.out_file_path = out_file_path
+        dir_name, file_name = os.path.split(out_file_path)
+        self.tmp_file_path = os.path.join(dir_name, f"tmp-{file_name}")
+        self.fp: BinaryIO = open(self.tmp_file_path, "wb")
+
+    def close(self) -> None:
+        self.fp.close()
+        os.replace(self.tmp_file_path, self.out_file_path)
+
+
+# blocks waiting to be written in order (a result of None closes the chunk)
+Pending = Deque[Tuple[_ChunkFile, Optional[AsyncResult]]]
+
+
+def _write_ready(pending: Pending, max_pending: int) -> None:
+    """Write compressed blocks in order until at most `max_pending` remain."""
+    while pending and (len(pending) > max_pending or pending[0][1] is None):
+        chunk_file, result = pending.popleft()
+        if result is None:
+            logger.info(f"finished {chunk_file.out_file_path}")
+            chunk_file.close()
+        else:
+            chunk_file.fp.write(result.get())
+
+
+def _submit_block(
+    pool: Pool,
+    pending: Pending,
+    chunk_file: _ChunkFile,
+    block: List[bytes],
+    codec: chunk_codecs.Codec,
+    max_pending: int,
+) -> None:
+    """Queue a block for compression, waiting while too many blocks are in flight."""
+    if block:
+        result = pool.apply_async(_compress_block, (b"".join(block), codec))
+        pending.append((chunk_file, result))
+        _write_ready(pending, max_pending)
 
 
 def main(
     wd_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     max_entities: int = argconfig.DEFAULT_KWNLP_MAX_ENTITIES,
+    workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
+    wikidata_split: str = argconfig.DEFAULT_KWNLP_WIKIDATA_SPLIT,
+    wikidata_codec: str = argconfig.DEFAULT_KWNLP_WIKIDATA_CODEC,
 ) -> None:
 
     in_dump_path = os.path.join(
@@ -44,51 +121,95 @@ def main(
     )
 
     logger.info(f"in_dump_path: {in_dump_path}")
-    os.makedirs(out_dump_dir, exist_ok=True)
+    # chunks of a previous run are not necessarily overwritten by this one
+    if os.path.exists(out_dump_dir):
+        shutil.rmtree(out_dump_dir)
+    os.makedirs(out_dump_dir)
     logger.info(f"out_dump_dir: {out_dump_dir}")
 
-    bzip_jobs = []
+    if wikidata_split == "blocks":
+        index_file_path = os.path.join(out_dump_dir, f"wikidata-{wd_yyyymmdd}-block-index.npz")
+        logger.info(f"writing {index_file_path}")
+        index = bz2_blocks.build_block_index(in_dump_path, BLOCK_RANGE_BYTES)
+        bz2_blocks.write_block_index(index_file_path, index)
+        return
+
+    codec = chunk_codecs.parse_codec(wikidata_codec)
+    workers = max(workers, 1)
+    max_pending = MAX_PENDING_PER_WORKER * workers
+    pending: Pending = deque()
     wjd = WikidataJsonDump(in_dump_path)
     num_lines_written = 0
-    for ii_chunk, line_buffer in enumerate(funcy.chunks(CHUNK_SIZE, wjd.iter_lines())):
-
-        line_buffer = [line.rstrip(",\n") for line in line_buffer]
-        if line_buffer[0] == "[":
-            line_buffer = line_buffer[1:]
-        if line_buffer[-1] == "]":
-            line_buffer = line_buffer[:-1]
-
-        out_file_path = os.path.join(
-            out_dump_dir, f"wikidata-{wd_yyyymmdd}-chunk-{ii_chunk:0>4d}.jsonl"
-        )
-        logger.info(f"writing chunk {ii_chunk} to {out_file_path}")
-        with open(out_file_path, "w") as fp:
-            fp.write("".join(["{}\n".format(ll) for ll in line_buffer]))
-        bzip_jobs.append(subprocess.Popen(["bzip2", out_file_path]))
-        logger.info(
-            "currently running bzip2 on {} files".format(_count_unfinished_bzip_jobs(bzip_jobs))
-        )
-
-        num_lines_written += len(line_buffer)
-        if num_lines_written >= max_entities:
-            logger.info(f"wrote {num_lines_written}. stopping b/c max_entities={max_entities}")
-            break
-
-    logger.info(
-        "waiting for {} bzip2 jobs to finish".format(_count_unfinished_bzip_jobs(bzip_jobs))
-    )
-    for bzip_job in bzip_jobs:
-        bzip_job.wait()
+    with get_context("spawn").Pool(workers) as p:
+        chunk_file: Optional[_ChunkFile] = None
+        ii_chunk = -1
+        chunk_bytes = 0
+        block: List[bytes] = []
+        block_bytes = 0
+        for line in wjd.iter_lines():
+
+            line = line.rstrip(",\n")
+            if line in ("[", "]"):
+                continue
+            encoded = f"{line}\n".encode("utf-8")
+
+            if chunk_file is None or chunk_bytes >= CHUNK_BYTES:
+                if chunk_file is not None:
+                    _submit_block(p, pending, chunk_file, block, codec, max_pending)
+                    pending.append((chunk_file, None))
+                    chunk_file, block, block_bytes = None, [], 0
+                    if num_lines_written >= max_entities:
+                        logger.info(
+                            f"wrote {num_lines_written}. stopping b/c max_entities={max_entities}"
+                        )
+                        break
+                ii_chunk += 1
+                chunk_bytes = 0
+                out_file_path = os.path.join(
+                    out_dump_dir,
+                    f"wikidata-{wd_yyyymmdd}-chunk-{ii_chunk:0>4d}.jsonl{codec.extension}",
+                )
+                logger.info(f"writing chunk {ii_chunk} to {out_file_path}")
+                chunk_file = _ChunkFile(out_file_path)
+
+            block.append(encoded)
+            block_bytes += len(encoded)
+            chunk_bytes += len(encoded)
+            num_lines_written += 1
+            if block_bytes >= BLOCK_BYTES:
+                _submit_block(p, pending, chunk_file, block, codec, max_pending)
+                block, block_bytes = [], 0
+
+        if chunk_file is not None:
+            _submit_block(p, pending, chunk_file, block, codec, max_pending)
+            pending.append((chunk_file, None))
+        logger.info("waiting for {} blocks to be compressed".format(len(pending)))
+        _write_ready(pending, 0)
 
 
 if __name__ == "__main__":
 
     description = "split JSON wikidata dump"
-    arg_names = ["wd_yyyymmdd", "data_path", "max_entities", "loglevel"]
+    arg_names = [
+        "wd_yyyymmdd",
+        "data_path",
+        "max_entities",
+        "workers",
+        "wikidata_split",
+        "wikidata_codec",
+        "loglevel",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wd_yyyymmdd, data_path=args.data_path, max_entities=args.max_entities)
+    main(
+        args.wd_yyyymmdd,
+        data_path=args.data_path,
+        max_entities=args.max_entities,
+        workers=args.workers,
+        wikidata_split=args.wikidata_split,
+        wikidata_codec=args.wikidata_codec,
+    )
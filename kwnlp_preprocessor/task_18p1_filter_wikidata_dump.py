@@ -1,5 +1,4 @@
 # Copyright 2021-present Kensho Technologies, LLC.
-import bz2
 from contextlib import ExitStack
 import csv
 import json
@@ -7,14 +6,37 @@ import logging
 from multiprocessing import Pool
 import os
 import re
-from typing import Dict
-
-from qwikidata.entity import WikidataItem, WikidataProperty
-
-from kwnlp_preprocessor import argconfig, utils
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from kwnlp_preprocessor import (
+    argconfig,
+    bz2_blocks,
+    chunk_codecs,
+    instrumentation,
+    table_io,
+    utils,
+    wikidata_extraction,
+)
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikidata-raw-chunks-{wd_yyyymmdd}/",
+]
+OUTPUTS = [
+    "wikidata-derived-{wd_yyyymmdd}/{wiki}-article-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/p31-claim-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/p279-claim-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/qpq-claim-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/item-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/item-alias-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/property-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/property-alias-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/skipped-entity-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/item-statements-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/filter-wikidata-checkpoints/",
+]
+
 
 SKIP_INSTANCES_OF_NQID = frozenset(
     [
@@ -25,303 +47,445 @@ SKIP_INSTANCES_OF_NQID = frozenset(
 RANK_TO_INT = {"deprecated": 2, "normal": 1, "preferred": 0}
 
 
-def parse_file(args: Dict) -> None:
+CHUNK_SAMPLES = [
+    "p279-claim",
+    "p31-claim",
+    "qpq-claim",
+    "item",
+    "item-alias",
+    "item-statements",
+    "property",
+    "property-alias",
+    "skipped-entity",
+]
 
-    logger.info("input: {}".format(args["wikidata_file_path"]))
-
-    # get file pointers, csv writers, and write headers
-    # ============================================================
-    with ExitStack() as exit_stack:
-        wkd_fp = exit_stack.enter_context(bz2.open(args["wikidata_file_path"], "r"))
 
-        article_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "{}-article-chunks".format(args["wiki"]),
-            "kwnlp-{}-{}-article.jsonl".format(args["out_file_base"], args["wiki"]),
-        )
-        os.makedirs(os.path.dirname(article_file_path), exist_ok=True)
-        article_fp = exit_stack.enter_context(open(article_file_path, "w"))
-
-        p279_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "p279-claim-chunks",
-            "kwnlp-{}-p279-claim.csv".format(args["out_file_base"]),
-        )
-        os.makedirs(os.path.dirname(p279_file_path), exist_ok=True)
-        p279_fp = exit_stack.enter_context(open(p279_file_path, "w"))
-        fieldnames = ["source_id", "target_id", "rnk"]
-        p279_writer = csv.DictWriter(p279_fp, fieldnames=fieldnames)
-        p279_writer.writeheader()
-
-        p31_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "p31-claim-chunks",
-            "kwnlp-{}-p31-claim.csv".format(args["out_file_base"]),
+def _get_out_file_paths(args: Dict) -> Dict[str, str]:
+    """Return output file paths for one chunk keyed by sample name."""
+    wd_derived_path = os.path.join(
+        args["data_path"], "wikidata-derived-{}".format(args["wd_yyyymmdd"])
+    )
+    out_file_paths = {
+        f"{wiki}-article": os.path.join(
+            wd_derived_path,
+            f"{wiki}-article-chunks",
+            "kwnlp-{}-{}-article.jsonl".format(args["out_file_base"], wiki),
         )
-        os.makedirs(os.path.dirname(p31_file_path), exist_ok=True)
-        p31_fp = exit_stack.enter_context(open(p31_file_path, "w"))
-        fieldnames = ["source_id", "target_id", "rnk"]
-        p31_writer = csv.DictWriter(p31_fp, fieldnames=fieldnames)
-        p31_writer.writeheader()
-
-        qpq_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "qpq-claim-chunks",
-            "kwnlp-{}-qpq-claim.csv".format(args["out_file_base"]),
+        for wiki in args["wikis"]
+    }
+    for sample in CHUNK_SAMPLES:
+        if sample == "item-statements" and not args["include_item_statements"]:
+            continue
+        out_file_paths[sample] = os.path.join(
+            wd_derived_path,
+            f"{sample}-chunks",
+            "kwnlp-{}-{}.csv".format(args["out_file_base"], sample),
         )
-        os.makedirs(os.path.dirname(qpq_file_path), exist_ok=True)
-        qpq_fp = exit_stack.enter_context(open(qpq_file_path, "w"))
-        fieldnames = ["source_id", "property_id", "target_id", "rnk"]
-        qpq_writer = csv.DictWriter(qpq_fp, fieldnames=fieldnames)
-        qpq_writer.writeheader()
-
-        item_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "item-chunks",
-            "kwnlp-{}-item.csv".format(args["out_file_base"]),
+    for table in _get_spec_tables(args):
+        out_file_paths[table.sample] = os.path.join(
+            wd_derived_path,
+            f"{table.sample}-chunks",
+            "kwnlp-{}-{}.csv".format(args["out_file_base"], table.sample),
         )
-        os.makedirs(os.path.dirname(item_file_path), exist_ok=True)
-        item_fp = exit_stack.enter_context(open(item_file_path, "w"))
-        fieldnames = ["item_id", "en_label", "en_description"]
-        item_writer = csv.DictWriter(item_fp, fieldnames=fieldnames)
-        item_writer.writeheader()
-
-        item_alias_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "item-alias-chunks",
-            "kwnlp-{}-item-alias.csv".format(args["out_file_base"]),
+    return out_file_paths
+
+
+def _get_spec_tables(args: Dict) -> List[wikidata_extraction.TableSpec]:
+    return [wikidata_extraction.TableSpec(**table) for table in args["extraction_spec"]]
+
+
+def _get_checkpoint_file_path(args: Dict) -> str:
+    return os.path.join(
+        args["data_path"],
+        "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
+        "filter-wikidata-checkpoints",
+        "kwnlp-{}.done".format(args["out_file_base"]),
+    )
+
+
+_CHUNK_OUTPUT_RE = re.compile(r"kwnlp-(wikidata-\d{8}-chunk-\d{4})[-.]")
+
+
+def _remove_stale_chunks(wd_derived_path: str, out_file_bases: Set[str]) -> int:
+    """Remove chunk outputs and checkpoints of chunks that are not in `out_file_bases`.
+
+    The number of chunks changes with the chunk size of task 15p1 and with
+    wikidata_split, and task 21p1 gathers every chunk file it finds, so outputs
+    of a previous run with more chunks would otherwise be gathered twice.
+    """
+    if not os.path.isdir(wd_derived_path):
+        return 0
+    num_removed = 0
+    for dir_name in sorted(os.listdir(wd_derived_path)):
+        dir_path = os.path.join(wd_derived_path, dir_name)
+        if not os.path.isdir(dir_path) or not (
+            dir_name.endswith("-chunks") or dir_name == "filter-wikidata-checkpoints"
+        ):
+            continue
+        for file_name in sorted(os.listdir(dir_path)):
+            match = _CHUNK_OUTPUT_RE.match(file_name)
+            if match is None or match.group(1) in out_file_bases:
+                continue
+            logger.info(f"removing stale chunk output {dir_name}/{file_name}")
+            os.remove(os.path.join(dir_path, file_name))
+            num_removed += 1
+    return num_removed
+
+
+def _open_csv_writer(
+    exit_stack: ExitStack,
+    out_file_paths: Dict[str, str],
+    sample: str,
+    column_types: Optional[Dict[str, str]] = None,
+) -> Any:
+    """Open the chunk file of `sample` and write its header.
+
+    The columns are those of table_io.CHUNK_COLUMN_TYPES unless given.
+    """
+    file_path = out_file_paths[sample]
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    fp = exit_stack.enter_context(open(file_path, "w"))
+    writer = csv.writer(fp, lineterminator="\n")
+    writer.writerow(list(column_types or table_io.CHUNK_COLUMN_TYPES[sample]))
+    return writer
+
+
+def _get_json_loads() -> Callable[[bytes], Any]:
+    """Return orjson.loads if orjson is installed (pip install kwnlp_preprocessor[fast])."""
+    try:
+        import orjson
+    except ImportError:
+        return json.loads
+
+    def orjson_loads(line: bytes) -> Any:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # e.g. integers that do not fit in 64 bits
+            return json.loads(line)
+
+    return orjson_loads
+
+
+_json_loads = _get_json_loads()
+
+
+def _iter_entity_lines(args: Dict) -> Iterator[bytes]:
+    """Yield the entity lines of a chunk file or of a range of blocks of the dump."""
+    if "block_range" not in args:
+        with chunk_codecs.open_chunk(args["wikidata_file_path"], "rb") as fp:
+            yield from fp
+        return
+    index = bz2_blocks.read_block_index(args["block_index_path"])
+    first, last = args["block_range"]
+    for line in bz2_blocks.iter_range_lines(args["wikidata_file_path"], index, first, last):
+        line = line.rstrip(b",")
+        if line not in (b"[", b"]"):
+            yield line
+
+
+# entity fields
+# ====================================================================
+# these read the fields we use straight from the entity dict and return the
+# same values as the qwikidata WikidataItem and WikidataProperty accessors.
+# entities without labels, claims, etc. have an empty list instead of a dict.
+
+
+def _get_text(entity_dict: Dict, key: str, lang: str) -> str:
+    """Return the label or description (`key`) of an entity in `lang` or ""."""
+    texts = entity_dict[key]
+    if isinstance(texts, dict) and lang in texts:
+        return texts[lang]["value"]
+    return ""
+
+
+def _get_aliases(entity_dict: Dict, lang: str) -> List[str]:
+    aliases = entity_dict["aliases"]
+    if isinstance(aliases, dict) and lang in aliases:
+        return [alias["value"] for alias in aliases[lang]]
+    return []
+
+
+def _get_claim_groups(entity_dict: Dict) -> Dict[str, List[Dict]]:
+    claims = entity_dict["claims"]
+    return claims if isinstance(claims, dict) else {}
+
+
+def _get_truthy_claims(claims: List[Dict]) -> List[Dict]:
+    """Return the preferred claims of a claim group or else the non deprecated ones."""
+    truthy_claims = [claim for claim in claims if claim["rank"].lower() == "preferred"]
+    if not truthy_claims:
+        truthy_claims = [claim for claim in claims if claim["rank"].lower() != "deprecated"]
+    return truthy_claims
+
+
+def _is_value_claim(claim: Dict) -> bool:
+    return claim["mainsnak"]["snaktype"] == "value" and claim["rank"] != "deprecated"
+
+
+def _get_target_rows(source_id: str, claims: List[Dict]) -> List[Tuple[str, int, int]]:
+    """Return (source_id, target_id, rnk) of the value claims of an item valued property."""
+    return [
+        (
+            source_id,
+            claim["mainsnak"]["datavalue"]["value"]["numeric-id"],
+            RANK_TO_INT[claim["rank"]],
         )
-        os.makedirs(os.path.dirname(item_alias_file_path), exist_ok=True)
-        item_alias_fp = exit_stack.enter_context(open(item_alias_file_path, "w"))
-        fieldnames = ["item_id", "en_alias"]
-        item_alias_writer = csv.DictWriter(item_alias_fp, fieldnames=fieldnames)
-        item_alias_writer.writeheader()
+        for claim in claims
+        if _is_value_claim(claim)
+    ]
 
-        if args["include_item_statements"]:
-            item_statements_file_path = os.path.join(
-                args["data_path"],
-                "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-                "item-statements-chunks",
-                "kwnlp-{}-item-statements.csv".format(args["out_file_base"]),
-            )
-            os.makedirs(os.path.dirname(item_statements_file_path), exist_ok=True)
-            item_statements_fp = exit_stack.enter_context(open(item_statements_file_path, "w"))
-            fieldnames = [
-                "statement_id",
-                "mainsnak_datatype",
-                "datavalue_datatype",
-                "source_item_id",
-                "edge_property_id",
-                "target_datavalue",
+
+# raw line pre-filter
+# ====================================================================
+# skipped items (mostly scholarly articles) are a large share of the dump and
+# have long labels and claims that we never use. lines that mention a skipped
+# id are screened first and only their P31 claims are decoded to confirm the
+# skip. anything that can not be confirmed this way is decoded in full.
+
+_SKIP_MARKER_RE = re.compile(
+    rb'"numeric-id":\s*(?:'
+    + b"|".join(str(nqid).encode() for nqid in sorted(SKIP_INSTANCES_OF_NQID))
+    + rb")\b"
+)
+_ITEM_PREFIX_RE = re.compile(r'\{"type":\s*"item",\s*"id":\s*"Q(\d+)"')
+_P31_KEY_RE = re.compile(r'"P31":\s*\[')
+_json_decoder = json.JSONDecoder()
+
+
+def _get_skip_intersection(p31_rows: List[Tuple[str, int, int]]) -> Set[int]:
+    return set([row[1] for row in p31_rows]) & SKIP_INSTANCES_OF_NQID
+
+
+def _prescreen_skipped_item(line: bytes) -> Optional[Tuple[str, Set[int]]]:
+    """Return (source_id, skip_intersection) if `line` is an item we skip.
+
+    Returns None if the item is kept or if that can not be decided without
+    decoding the whole line.
+    """
+    if _SKIP_MARKER_RE.search(line) is None:
+        return None
+    text = line.decode("utf-8")
+    match = _ITEM_PREFIX_RE.match(text)
+    if match is None:
+        return None
+    # "P31" is also a key in qualifiers and references but only claims have a mainsnak
+    for key_match in _P31_KEY_RE.finditer(text, match.end()):
+        try:
+            claims, _ = _json_decoder.raw_decode(text, key_match.end() - 1)
+        except ValueError:
+            return None
+        if claims and all(isinstance(claim, dict) and "mainsnak" in claim for claim in claims):
+            source_id = match.group(1)
+            skip_intersection = _get_skip_intersection(_get_target_rows(source_id, claims))
+            return (source_id, skip_intersection) if skip_intersection else None
+    return None
+
+
+def _get_spec_rows(table: wikidata_extraction.TableSpec, entity_dict: Dict) -> Iterator[Tuple]:
+    """Generate the rows of an extraction spec table for one entity."""
+    entity_id = entity_dict["id"][1:]
+    if table.kind == "labels":
+        for lang in table.languages:
+            label = _get_text(entity_dict, "labels", lang)
+            description = _get_text(entity_dict, "descriptions", lang)
+            if label or description:
+                yield (entity_id, lang, label, description)
+    elif table.kind == "aliases":
+        for lang in table.languages:
+            for alias in _get_aliases(entity_dict, lang):
+                yield (entity_id, lang, alias)
+    elif table.kind == "claims":
+        claim_groups = _get_claim_groups(entity_dict)
+        for property_id in table.properties:
+            claims = claim_groups.get(property_id, [])
+            if table.truthy:
+                claims = _get_truthy_claims(claims)
+            item_claims = [
+                claim for claim in claims if claim["mainsnak"].get("datatype") == "wikibase-item"
             ]
-            item_statements_writer = csv.DictWriter(item_statements_fp, fieldnames=fieldnames)
-            item_statements_writer.writeheader()
-
-        property_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "property-chunks",
-            "kwnlp-{}-property.csv".format(args["out_file_base"]),
-        )
-        os.makedirs(os.path.dirname(property_file_path), exist_ok=True)
-        property_fp = exit_stack.enter_context(open(property_file_path, "w"))
-        fieldnames = ["property_id", "en_label", "en_description"]
-        property_writer = csv.DictWriter(property_fp, fieldnames=fieldnames)
-        property_writer.writeheader()
-
-        property_alias_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "property-alias-chunks",
-            "kwnlp-{}-property-alias.csv".format(args["out_file_base"]),
-        )
-        os.makedirs(os.path.dirname(property_alias_file_path), exist_ok=True)
-        property_alias_fp = exit_stack.enter_context(open(property_alias_file_path, "w"))
-        fieldnames = ["property_id", "en_alias"]
-        property_alias_writer = csv.DictWriter(property_alias_fp, fieldnames=fieldnames)
-        property_alias_writer.writeheader()
-
-        skipped_file_path = os.path.join(
-            args["data_path"],
-            "wikidata-derived-{}".format(args["wd_yyyymmdd"]),
-            "skipped-entity-chunks",
-            "kwnlp-{}-skipped-entity.csv".format(args["out_file_base"]),
+            for _, target_id, rnk in _get_target_rows(entity_id, item_claims):
+                yield (entity_id, property_id[1:], target_id, rnk)
+    elif table.kind == "sitelinks":
+        sitelinks = entity_dict.get("sitelinks")
+        if isinstance(sitelinks, dict):
+            for wiki in table.wikis:
+                if wiki in sitelinks:
+                    yield (entity_id, wiki, sitelinks[wiki]["title"])
+
+
+def parse_file(args: Dict) -> Dict[str, Any]:
+
+    logger.info("input: {}".format(args["wikidata_file_path"]))
+    out_file_paths = _get_out_file_paths(args)
+
+    # get file pointers, csv writers, and write headers
+    # ============================================================
+    with ExitStack() as exit_stack:
+        metrics = exit_stack.enter_context(
+            instrumentation.measure_worker(args["wikidata_file_path"])
         )
-        os.makedirs(os.path.dirname(skipped_file_path), exist_ok=True)
-        skipped_fp = exit_stack.enter_context(open(skipped_file_path, "w"))
-        fieldnames = ["qid", "instances_of"]
-        skipped_writer = csv.DictWriter(skipped_fp, fieldnames=fieldnames)
-        skipped_writer.writeheader()
+        wkd_lines = _iter_entity_lines(args)
+
+        article_fps = {}
+        for wiki in args["wikis"]:
+            os.makedirs(os.path.dirname(out_file_paths[f"{wiki}-article"]), exist_ok=True)
+            article_fps[wiki] = exit_stack.enter_context(
+                open(out_file_paths[f"{wiki}-article"], "wb")
+            )
+
+        p279_writer = _open_csv_writer(exit_stack, out_file_paths, "p279-claim")
+        p31_writer = _open_csv_writer(exit_stack, out_file_paths, "p31-claim")
+        qpq_writer = _open_csv_writer(exit_stack, out_file_paths, "qpq-claim")
+        item_writer = _open_csv_writer(exit_stack, out_file_paths, "item")
+        item_alias_writer = _open_csv_writer(exit_stack, out_file_paths, "item-alias")
+        if args["include_item_statements"]:
+            item_statements_writer = _open_csv_writer(exit_stack, out_file_paths, "item-statements")
+        property_writer = _open_csv_writer(exit_stack, out_file_paths, "property")
+        property_alias_writer = _open_csv_writer(exit_stack, out_file_paths, "property-alias")
+        skipped_writer = _open_csv_writer(exit_stack, out_file_paths, "skipped-entity")
+        spec_writers = [
+            (table, _open_csv_writer(exit_stack, out_file_paths, table.sample, table.column_types))
+            for table in _get_spec_tables(args)
+        ]
 
         # parse file
         # ============================================================
         entities_parsed = 0
 
-        for line in wkd_fp:
+        metrics["prescreened"] = 0
+
+        for line in wkd_lines:
             entities_parsed += 1
-            entity_dict = json.loads(line)
+            metrics["rows"] += 1
+
+            prescreened = _prescreen_skipped_item(line)
+            if prescreened is not None:
+                source_id, skip_intersection = prescreened
+                instances_of = "|".join([str(el) for el in skip_intersection])
+                skipped_writer.writerow((source_id, instances_of))
+                metrics["prescreened"] += 1
+                continue
+
+            entity_dict = _json_loads(line)
 
             if entity_dict["type"] == "property":
-                wd_entity = WikidataProperty(entity_dict)
-                source_id = wd_entity.entity_id[1:]
+                source_id = entity_dict["id"][1:]
 
-                # write label and description
+                # write label, description and aliases
                 # ---------------------------------------------------------
                 property_writer.writerow(
-                    {
-                        "property_id": source_id,
-                        "en_label": wd_entity.get_label(lang="en"),
-                        "en_description": wd_entity.get_description(lang="en"),
-                    }
+                    (
+                        source_id,
+                        _get_text(entity_dict, "labels", "en"),
+                        _get_text(entity_dict, "descriptions", "en"),
+                    )
                 )
-
-                # write aliases
-                # ---------------------------------------------------------
                 property_alias_writer.writerows(
-                    [
-                        {
-                            "property_id": source_id,
-                            "en_alias": alias,
-                        }
-                        for alias in wd_entity.get_aliases(lang="en")
-                    ]
+                    (source_id, alias) for alias in _get_aliases(entity_dict, "en")
                 )
 
             elif entity_dict["type"] == "item":
 
-                wd_entity = WikidataItem(entity_dict)
-                source_id = wd_entity.entity_id[1:]
+                entity_id = entity_dict["id"]
+                source_id = entity_id[1:]
+                claim_groups = _get_claim_groups(entity_dict)
 
                 # get P31 (instance of) claims
                 # ---------------------------------------------------------
-                p31_rows = [
-                    {
-                        "source_id": source_id,
-                        "target_id": claim.mainsnak.datavalue.value["numeric-id"],
-                        "rnk": RANK_TO_INT[claim.rank],
-                    }
-                    for claim in wd_entity.get_claim_group("P31")
-                    if claim.mainsnak.snaktype == "value" and claim.rank != "deprecated"
-                ]
+                p31_rows = _get_target_rows(source_id, claim_groups.get("P31", []))
 
                 # check if we want to skip this item
                 # ---------------------------------------------------------
-                p31_nqids = set([row["target_id"] for row in p31_rows])
-                skip_intersection = p31_nqids & SKIP_INSTANCES_OF_NQID  # intersection
+                skip_intersection = _get_skip_intersection(p31_rows)
                 if len(skip_intersection) > 0:
-                    row = {
-                        "qid": source_id,
-                        "instances_of": "|".join([str(el) for el in skip_intersection]),
-                    }
-                    skipped_writer.writerow(row)
+                    instances_of = "|".join([str(el) for el in skip_intersection])
+                    skipped_writer.writerow((source_id, instances_of))
                     continue
 
                 # start writing if we're keeping
                 # ---------------------------------------------------------
-                for row in p31_rows:
-                    p31_writer.writerow(row)
+                p31_writer.writerows(p31_rows)
 
                 # get P279 (subclass of) claims
                 # ---------------------------------------------------------
-                p279_rows = [
-                    {
-                        "source_id": source_id,
-                        "target_id": claim.mainsnak.datavalue.value["numeric-id"],
-                        "rnk": RANK_TO_INT[claim.rank],
-                    }
-                    for claim in wd_entity.get_claim_group("P279")
-                    if claim.mainsnak.snaktype == "value" and claim.rank != "deprecated"
-                ]
-                for row in p279_rows:
-                    p279_writer.writerow(row)
+                p279_writer.writerows(_get_target_rows(source_id, claim_groups.get("P279", [])))
 
                 # qpq operations
                 # ---------------------------------------------------------
-                try:
-                    for (
-                        claim_id_str,
-                        claim_group,
-                    ) in wd_entity.get_truthy_claim_groups().items():
-                        qpq_rows = [
-                            {
-                                "source_id": source_id,
-                                "property_id": claim_id_str[1:],
-                                "target_id": claim.mainsnak.datavalue.value["numeric-id"],
-                                "rnk": RANK_TO_INT[claim.rank],
-                            }
-                            for claim in claim_group
-                            if (
-                                    claim.mainsnak.snaktype == "value"
-                                    and claim.rank != "deprecated"
-                                    and claim.mainsnak.snak_datatype == "wikibase-item"
-                            )
-                        ]
-                        for row in qpq_rows:
-                            qpq_writer.writerow(row)
-                except ValueError as e:
-                    logger.info("ValueError for entity %s", wd_entity)
-                    logger.exception(e)
-
-                # write label and description
+                truthy_claim_groups = {
+                    property_id: _get_truthy_claims(claims)
+                    for property_id, claims in claim_groups.items()
+                }
+                for property_id, claims in truthy_claim_groups.items():
+                    item_claims = [
+                        claim
+                        for claim in claims
+                        if claim["mainsnak"].get("datatype") == "wikibase-item"
+                    ]
+                    qpq_writer.writerows(
+                        (source_id, property_id[1:], target_id, rnk)
+                        for _, target_id, rnk in _get_target_rows(source_id, item_claims)
+                    )
+
+                # write label, description and aliases
                 # ---------------------------------------------------------
                 item_writer.writerow(
-                    {
-                        "item_id": source_id,
-                        "en_label": wd_entity.get_label(lang="en"),
-                        "en_description": wd_entity.get_description(lang="en"),
-                    }
+                    (
+                        source_id,
+                        _get_text(entity_dict, "labels", "en"),
+                        _get_text(entity_dict, "descriptions", "en"),
+                    )
                 )
-
-                # write aliases
-                # ---------------------------------------------------------
                 item_alias_writer.writerows(
-                    [
-                        {
-                            "item_id": source_id,
-                            "en_alias": alias,
-                        }
-                        for alias in wd_entity.get_aliases(lang="en")
-                    ]
+                    (source_id, alias) for alias in _get_aliases(entity_dict, "en")
                 )
 
                 # write statements
                 # ---------------------------------------------------------
                 if args["include_item_statements"]:
-                    for (
-                        claim_id_str,
-                        claim_group,
-                    ) in wd_entity.get_truthy_claim_groups().items():
-                        statement_rows = [
-                            {
-                                "statement_id": f"{wd_entity.entity_id}-{claim_id_str}-{i}",
-                                "mainsnak_datatype": claim.mainsnak.snak_datatype,
-                                "datavalue_datatype": claim.mainsnak.value_datatype,
-                                "source_item_id": wd_entity.entity_id[1:],
-                                "edge_property_id": claim_id_str[1:],
-                                # we must access private variable to faithfully replicate this field
-                                "target_datavalue": json.dumps(
-                                    claim.mainsnak.datavalue._datavalue_dict
-                                ),
-                            }
-                            for i, claim in enumerate(claim_group)
-                            if (claim.mainsnak.snaktype == "value" and claim.rank != "deprecated")
-                        ]
-                        for row in statement_rows:
-                            item_statements_writer.writerow(row)
-
-                # filter articles from chosen wiki
+                    for property_id, claims in truthy_claim_groups.items():
+                        for i, claim in enumerate(claims):
+                            if not _is_value_claim(claim):
+                                continue
+                            mainsnak = claim["mainsnak"]
+                            item_statements_writer.writerow(
+                                (
+                                    f"{entity_id}-{property_id}-{i}",
+                                    mainsnak["datatype"],
+                                    str(mainsnak["datavalue"]["type"]),
+                                    source_id,
+                                    property_id[1:],
+                                    json.dumps(mainsnak["datavalue"]),
+                                )
+                            )
+
+                # filter articles from chosen wikis (written as they are in the dump)
                 # ---------------------------------------------------------
-                if args["wiki"] in wd_entity.get_sitelinks():
-                    article_fp.write("{}\n".format(json.dumps(entity_dict)))
+                sitelinks = entity_dict.get("sitelinks")
+                if isinstance(sitelinks, dict):
+                    for wiki, article_fp in article_fps.items():
+                        if wiki in sitelinks:
+                            article_fp.write(line if line.endswith(b"\n") else line + b"\n")
+
+            # write extraction spec tables
+            # ---------------------------------------------------------
+            for table, writer in spec_writers:
+                if table.entity_type == entity_dict["type"]:
+                    writer.writerows(_get_spec_rows(table, entity_dict))
 
             if entities_parsed >= args["max_entities"]:
-                return
+                break
+
+    # mark chunk as complete once all outputs are closed
+    # ============================================================
+    utils.write_chunk_marker(
+        _get_checkpoint_file_path(args),
+        args,
+        [args["wikidata_file_path"]],
+        list(out_file_paths.values()),
+    )
+    return metrics
 
 
 def main(
@@ -331,8 +495,13 @@ def main(
     workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
     max_entities: int = argconfig.DEFAULT_KWNLP_MAX_ENTITIES,
     include_item_statements: bool = False,
+    wikidata_split: str = argconfig.DEFAULT_KWNLP_WIKIDATA_SPLIT,
+    extraction_spec: str = "",
+    wikis: Sequence[str] = (),
 ) -> None:
 
+    # articles of several wikis are filtered in the same pass
+    wikis = list(wikis) or [wiki]
     in_dump_paths = {
         "wikidata": os.path.join(
             data_path,
@@ -343,30 +512,98 @@ def main(
     for name, path in in_dump_paths.items():
         logger.info(f"{name} path: {path}")
 
-    pattern = re.compile(r"wikidata-\d{8}-chunk-(\d{4}).json")
-    all_wikidata_file_names = [
-        match.string
-        for match in utils._get_ordered_files_from_path(in_dump_paths["wikidata"], pattern)
+    spec_tables = [
+        dict(table._asdict()) for table in wikidata_extraction.read_spec(extraction_spec)
     ]
+    logger.info("extraction spec tables: {}".format([table["name"] for table in spec_tables]))
 
-    mp_args = []
-    for wikidata_file_name in all_wikidata_file_names:
-        wikidata_file_path = os.path.join(in_dump_paths["wikidata"], wikidata_file_name)
-        out_file_base = wikidata_file_name.replace(".jsonl.bz2", "")
-        mp_args.append(
-            {
-                "wiki": wiki,
-                "data_path": data_path,
-                "wd_yyyymmdd": wd_yyyymmdd,
-                "wikidata_file_path": wikidata_file_path,
-                "out_file_base": out_file_base,
-                "max_entities": max_entities,
-                "include_item_statements": include_item_statements,
-            }
+    mp_args: List[Dict[str, Any]] = []
+    input_bytes = []
+    if wikidata_split == "blocks":
+        # read ranges of blocks of the raw dump indexed by task 15p1
+        # ============================================================
+        wikidata_file_path = os.path.join(
+            data_path, f"wikidata-raw-{wd_yyyymmdd}", f"wikidata-{wd_yyyymmdd}-all.json.bz2"
+        )
+        block_index_path = os.path.join(
+            in_dump_paths["wikidata"], f"wikidata-{wd_yyyymmdd}-block-index.npz"
         )
+        index = bz2_blocks.read_block_index(block_index_path)
+        bit_offsets = index.markers.tolist() + [os.path.getsize(wikidata_file_path) * 8]
+        for ii, (first, last) in enumerate(index.get_ranges()):
+            input_bytes.append((bit_offsets[last] - bit_offsets[first]) // 8)
+            mp_args.append(
+                {
+                    "wikis": wikis,
+                    "data_path": data_path,
+                    "wd_yyyymmdd": wd_yyyymmdd,
+                    "wikidata_file_path": wikidata_file_path,
+                    "block_index_path": block_index_path,
+                    "block_range": [first, last],
+                    "out_file_base": f"wikidata-{wd_yyyymmdd}-chunk-{ii:0>4d}",
+                    "max_entities": max_entities,
+                    "include_item_statements": include_item_statements,
+                    "extraction_spec": spec_tables,
+                }
+            )
+    else:
+        pattern = re.compile(r"wikidata-\d{8}-chunk-(\d{4}).json")
+        all_wikidata_file_names = [
+            match.string
+            for match in utils._get_ordered_files_from_path(in_dump_paths["wikidata"], pattern)
+        ]
+        for wikidata_file_name in all_wikidata_file_names:
+            wikidata_file_path = os.path.join(in_dump_paths["wikidata"], wikidata_file_name)
+            out_file_base = chunk_codecs.strip_extension(wikidata_file_name)
+            out_file_base = out_file_base.replace(".jsonl", "")
+            input_bytes.append(os.path.getsize(wikidata_file_path))
+            mp_args.append(
+                {
+                    "wikis": wikis,
+                    "data_path": data_path,
+                    "wd_yyyymmdd": wd_yyyymmdd,
+                    "wikidata_file_path": wikidata_file_path,
+                    "out_file_base": out_file_base,
+                    "max_entities": max_entities,
+                    "include_item_statements": include_item_statements,
+                    "extraction_spec": spec_tables,
+                }
+            )
+    num_chunks = len(mp_args)
+
+    # remove outputs of chunks produced by a previous run but not by this one
+    # ============================================================
+    num_removed = _remove_stale_chunks(
+        os.path.join(data_path, f"wikidata-derived-{wd_yyyymmdd}"),
+        {args["out_file_base"] for args in mp_args},
+    )
+    instrumentation.add_count("stale_chunk_files_removed", num_removed)
+
+    # start the largest chunks first so no worker is left with a big one at the end
+    # ============================================================
+    mp_args = [args for _, args in sorted(zip(input_bytes, mp_args), key=lambda x: -x[0])]
+
+    # skip chunks completed by a previous (interrupted) run
+    # ============================================================
+    mp_args = [
+        args
+        for args in mp_args
+        if not utils.is_chunk_complete(
+            _get_checkpoint_file_path(args),
+            args,
+            [args["wikidata_file_path"]],
+            list(_get_out_file_paths(args).values()),
+        )
+    ]
+    logger.info("parsing {} of {} chunks".format(len(mp_args), num_chunks))
+    instrumentation.add_count("chunks_skipped", num_chunks - len(mp_args))
 
     with Pool(workers) as p:
-        p.map(parse_file, mp_args)
+        worker_metrics = p.map(parse_file, mp_args, chunksize=1)
+    instrumentation.record_workers(worker_metrics, "entities")
+    instrumentation.add_count(
+        "entities_prescreened", sum(metrics["prescreened"] for metrics in worker_metrics)
+    )
 
 
 if __name__ == "__main__":
@@ -380,6 +617,9 @@ if __name__ == "__main__":
         "max_entities",
         "loglevel",
         "include_item_statements",
+        "wikidata_split",
+        "extraction_spec",
+        "wikis",
     ]
     parser = argconfig.get_argparser(description, arg_names)
 
@@ -394,4 +634,7 @@ if __name__ == "__main__":
         workers=args.workers,
         max_entities=args.max_entities,
         include_item_statements=args.include_item_statements,
+        wikidata_split=args.wikidata_split,
+        extraction_spec=args.extraction_spec,
+        wikis=argconfig.list_from_comma_delimited_string(args.wikis) if args.wikis else [],
     )
@@ -3,17 +3,40 @@ import logging
 import os
 import re
 
-import pandas as pd
-
-from kwnlp_preprocessor import argconfig, utils
+from kwnlp_preprocessor import argconfig, instrumentation, table_io, utils, wikidata_extraction
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikidata-derived-{wd_yyyymmdd}/p31-claim-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/p279-claim-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/qpq-claim-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/item-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/item-alias-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/property-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/property-alias-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/skipped-entity-chunks/",
+    "wikidata-derived-{wd_yyyymmdd}/item-statements-chunks/",
+]
+OUTPUTS = [
+    "wikidata-derived-{wd_yyyymmdd}/p31-claim/",
+    "wikidata-derived-{wd_yyyymmdd}/p279-claim/",
+    "wikidata-derived-{wd_yyyymmdd}/qpq-claim/",
+    "wikidata-derived-{wd_yyyymmdd}/item/",
+    "wikidata-derived-{wd_yyyymmdd}/item-alias/",
+    "wikidata-derived-{wd_yyyymmdd}/property/",
+    "wikidata-derived-{wd_yyyymmdd}/property-alias/",
+    "wikidata-derived-{wd_yyyymmdd}/skipped-entity/",
+    "wikidata-derived-{wd_yyyymmdd}/item-statements/",
+]
+
 
 def main(
     wd_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     include_item_statements: bool = False,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
+    extraction_spec: str = "",
 ) -> None:
 
     files_to_include = [
@@ -28,6 +51,10 @@ def main(
     ]
     if include_item_statements:
         files_to_include.append("item-statements")
+    column_types = {sample: table_io.CHUNK_COLUMN_TYPES[sample] for sample in files_to_include}
+    for table in wikidata_extraction.read_spec(extraction_spec):
+        files_to_include.append(table.sample)
+        column_types[table.sample] = table.column_types
 
     for sample in files_to_include:
 
@@ -45,32 +72,41 @@ def main(
         )
         out_dump_file = os.path.join(
             out_dump_path,
-            f"kwnlp-wikidata-{wd_yyyymmdd}-{sample}.csv",
+            f"kwnlp-wikidata-{wd_yyyymmdd}-{sample}.{table_format}",
         )
         logger.info(f"out_dump_path: {out_dump_path}")
         os.makedirs(out_dump_path, exist_ok=True)
 
         pattern = re.compile(r"kwnlp-wikidata-\d{8}-chunk-(\d{4})-" + sample + ".csv")
-        all_file_names = [
-            match.string for match in utils._get_ordered_files_from_path(in_dump_path, pattern)
+        all_file_paths = [
+            os.path.join(in_dump_path, match.string)
+            for match in utils._get_ordered_files_from_path(in_dump_path, pattern)
         ]
-
-        df = pd.DataFrame()
-        for file_name in all_file_names:
-            file_path = os.path.join(in_dump_path, file_name)
-            df1 = pd.read_csv(file_path)
-            df = pd.concat([df, df1])
-        df.to_csv(out_dump_file, index=False)
+        num_lines = table_io.gather_tables(all_file_paths, out_dump_file, column_types[sample])
+        instrumentation.add_count(sample, num_lines)
 
 
 if __name__ == "__main__":
 
     description = "gather wikidata chunks"
-    arg_names = ["wd_yyyymmdd", "data_path", "loglevel", "include_item_statements"]
+    arg_names = [
+        "wd_yyyymmdd",
+        "data_path",
+        "loglevel",
+        "include_item_statements",
+        "table_format",
+        "extraction_spec",
+    ]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wd_yyyymmdd, data_path=args.data_path)
+    main(
+        args.wd_yyyymmdd,
+        data_path=args.data_path,
+        include_item_statements=args.include_item_statements,
+        table_format=args.table_format,
+        extraction_spec=args.extraction_spec,
+    )
@@ -1,15 +1,31 @@
 # Copyright 2021-present Kensho Technologies, LLC.
-"""Create a CSV that contains pre-wikitext parsing article metadata."""
+"""Create a CSV that contains pre-wikitext parsing article metadata.
+
+Page titles are carried as title dictionary codes (see the title_dictionary
+module) and decoded when the output is written.
+"""
 import logging
 import os
 
 import networkx as nx
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, instrumentation, table_io, title_dictionary
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-dictionary.npz",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
+    "wikidata-derived-{wd_yyyymmdd}/p279-claim/kwnlp-wikidata-{wd_yyyymmdd}-p279-claim.{table_format}",
+    "wikidata-derived-{wd_yyyymmdd}/p31-claim/kwnlp-wikidata-{wd_yyyymmdd}-p31-claim.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete-by-page-id.{table_format}",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-article-pre.{table_format}",
+]
+
 
 # TODO: centralize this in argconfig
 # have to change in task 39p1 create article too
@@ -29,6 +45,7 @@ def main(
     wd_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> None:
 
     wp_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
@@ -39,30 +56,30 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df = pd.read_csv(
+    df = table_io.read_table(
         file_path,
         keep_default_na=False,
-        usecols=["source_id", "source_title", "is_redirect"],
+        columns=["source_id", "is_redirect"],
     )
 
     # get base information from title mapper
     # ====================================================================
     df = df[~df["is_redirect"]]
-    df = df[["source_id", "source_title"]]
-    df = df.rename(columns={"source_id": "page_id", "source_title": "page_title"})
+    df = df[["source_id"]]
+    df = df.rename(columns={"source_id": "page_id"})
 
     # read item id from page props CSV
     # ====================================================================
     file_path = os.path.join(
         wp_dump_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-page-props.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-page-props.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_pp = pd.read_csv(file_path, usecols=["page_id", "wikibase_item"])
+    df_pp = table_io.read_table(file_path, columns=["page_id", "wikibase_item"])
 
     # add wikidata item id
     # ====================================================================
@@ -77,10 +94,10 @@ def main(
     file_path = os.path.join(
         wd_dump_path,
         "p279-claim",
-        f"kwnlp-wikidata-{wd_yyyymmdd}-p279-claim.csv",
+        f"kwnlp-wikidata-{wd_yyyymmdd}-p279-claim.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_p279 = pd.read_csv(file_path, usecols=["source_id", "target_id"])
+    df_p279 = table_io.read_table(file_path, columns=["source_id", "target_id"])
     logger.info("building p279 graph")
     g_p279 = nx.DiGraph()
     g_p279.add_edges_from(df_p279.values)
@@ -90,10 +107,10 @@ def main(
     file_path = os.path.join(
         wd_dump_path,
         "p31-claim",
-        f"kwnlp-wikidata-{wd_yyyymmdd}-p31-claim.csv",
+        f"kwnlp-wikidata-{wd_yyyymmdd}-p31-claim.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_p31 = pd.read_csv(file_path, usecols=["source_id", "target_id"])
+    df_p31 = table_io.read_table(file_path, columns=["source_id", "target_id"])
 
     # add root qid tags
     # ====================================================================
@@ -116,16 +133,27 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-prior-month-pageviews-complete-by-page-id.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_views = pd.read_csv(file_path, keep_default_na=False)
+    df_views = table_io.read_table(file_path)
 
     # add views
     # ====================================================================
-    df = pd.merge(df, df_views, on="page_title", how="left")
+    df = pd.merge(df, df_views, on="page_id", how="left")
     df["views"] = df["views"].fillna(0).astype("int")
 
+    # decode page titles
+    # ====================================================================
+    file_path = os.path.join(
+        wp_dump_path,
+        "kwnlp-sql",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-title-dictionary.npz",
+    )
+    logger.info(f"reading {file_path}")
+    titles = title_dictionary.read_title_dictionary(file_path)
+    df["page_title"] = titles.decode(titles.encode_page_ids(df["page_id"].values))
+
     # sort and write output
     # ====================================================================
     df = df[["page_id", "item_id", "page_title", "views"] + [f"isa_Q{nqid}" for nqid in ROOT_NQIDS]]
@@ -133,18 +161,19 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-article-pre.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-article-pre.{table_format}",
     )
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     logger.info(f"writing {file_path}")
-    df.to_csv(file_path, index=False)
+    instrumentation.add_count("rows", len(df))
+    table_io.write_table(df, file_path)
     return df
 
 
 if __name__ == "__main__":
 
     description = "create kwnlp article pre"
-    arg_names = ["wp_yyyymmdd", "wd_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = ["wp_yyyymmdd", "wd_yyyymmdd", "data_path", "wiki", "table_format", "loglevel"]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
@@ -156,4 +185,5 @@ if __name__ == "__main__":
         args.wd_yyyymmdd,
         data_path=args.data_path,
         wiki=args.wiki,
+        table_format=args.table_format,
     )
@@ -1,7 +1,21 @@
 # Copyright 2021-present Kensho Technologies, LLC.
 """Parse chunked XML article dump into plaintext and links.
 
-Can do all chunks at once with a machine with 64 cores and 256G RAM
+Link targets are looked up in the memory mapped title index written by
+task_12p1 so workers share one copy of it and need little memory each.
+
+By default each pool worker parses one XML file from start to end, so the
+number of busy cpus is limited by the number of files and the largest file
+sets the wall time. With ``pipeline_readers`` > 0 the work is split into a
+pipeline instead,
+
+* reader processes decompress the XML files and put pages on a bounded queue
+* ``workers`` transform processes turn each page into output rows
+* the stage process puts the rows of each file back in page order, writes
+  them and marks the chunk as complete
+
+Both modes write identical outputs. Output chunks are compressed with
+``chunk_codec`` (see the chunk_codecs module).
 """
 import bz2
 from contextlib import ExitStack
@@ -11,16 +25,31 @@ import logging
 from multiprocessing import get_context
 import os
 import re
-from typing import Dict, Pattern
+import traceback
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Pattern
 
 import mwtext
 import mwxml
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig, utils
+from kwnlp_preprocessor import argconfig, chunk_codecs, instrumentation, title_index, utils
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-raw-{wp_yyyymmdd}/articlesdump/",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-index/",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/link-annotated-text-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/links-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/paragraphs-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/section-names-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/templates-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/lengths-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/parse-wikitext-checkpoints/",
+]
+
 
 FORBIDDEN_WIKILINK_PREFIXES = frozenset(
     [
@@ -38,15 +67,47 @@ TEMPLATE_PATTERNS = {
 }
 
 
+class PageText(NamedTuple):
+    """The parts of an article page we use (picklable unlike mwxml pages)."""
+
+    page_id: int
+    page_title: str
+    revision_id: int
+    text: str
+
+
+def _iter_page_texts(wikitext_file_path: str, max_entities: int) -> Iterator[PageText]:
+    """Yield the article pages with text in an XML dump file."""
+    with bz2.open(wikitext_file_path) as fp:
+        dump = mwxml.Dump.from_file(fp)
+        pages_read = 0
+        for page in dump:
+
+            if page.namespace != 0 or page.redirect:
+                continue
+
+            revisions = list(page)
+            assert len(revisions) == 1
+            revision = revisions[0]
+            if not isinstance(revision.text, str):
+                continue
+
+            yield PageText(page.id, page.title, revision.id, revision.text)
+            pages_read += 1
+            if pages_read >= max_entities:
+                break
+
+
 def _get_link_annotated_text_from_page(
-    page: mwxml.Page, revision: mwxml.Revision, transformer: mwtext.Wikitext2Structured
+    page_text: PageText, transformer: mwtext.Wikitext2Structured
 ) -> Dict:
 
-    structured = transformer.transform(revision.text)
+    structured = transformer.transform(page_text.text)
+    title = page_text.page_title
     link_annotated_text = {
-        "page_id": page.id,
-        "revision_id": revision.id,
-        "page_title": page.title[0].upper() + page.title[1:].replace(" ", "_"),
+        "page_id": page_text.page_id,
+        "revision_id": page_text.revision_id,
+        "page_title": title[0].upper() + title[1:].replace(" ", "_"),
         "paragraphs": structured["paragraphs"],
         "categories": structured["categories"],
     }
@@ -108,17 +169,29 @@ def _get_section_names_from_link_annotated_text(link_annotated_text: Dict) -> pd
     return df.drop_duplicates()
 
 
-def _create_compressed_link_annotated_text(link_annotated_text: Dict, title_id_map: Dict) -> Dict:
+def _create_compressed_link_annotated_text(
+    link_annotated_text: Dict, title_id_index: title_index.TitleIndex
+) -> Dict:
     compressed_link_annotated_text = copy.deepcopy(link_annotated_text)
+
+    # look up the targets of all links on the page at once
+    all_target_page_ids = title_id_index.get_many(
+        [
+            wikilink[0]
+            for paragraph in compressed_link_annotated_text["paragraphs"]
+            for wikilink in paragraph["wikilinks"]
+        ]
+    ).tolist()
+
+    ii_link = 0
     for paragraph in compressed_link_annotated_text["paragraphs"]:
         target_page_ids = []
         anchor_spans = []
         for wikilink in paragraph["wikilinks"]:
-            target_page_title = wikilink[0]
-            wikilink[1]
             anchor_offset_start = wikilink[2]
             anchor_offset_end = wikilink[3]
-            target_page_id = int(title_id_map.get(target_page_title, -1))
+            target_page_id = all_target_page_ids[ii_link]
+            ii_link += 1
             if target_page_id == -1:
                 pass  # no match in title map
             else:
@@ -131,23 +204,21 @@ def _create_compressed_link_annotated_text(link_annotated_text: Dict, title_id_m
 
 
 def _get_templates_from_page(
-    page: mwxml.Page, revision: mwxml.Revision, template_patterns: Dict[str, Pattern]
+    page_text: PageText, template_patterns: Dict[str, Pattern]
 ) -> pd.DataFrame:
 
     res = pd.DataFrame(
         {
-            name: [int(re.search(pattern, revision.text) is not None)]
+            name: [int(re.search(pattern, page_text.text) is not None)]
             for name, pattern in template_patterns.items()
         }
     )
-    res["page_id"] = page.id
+    res["page_id"] = page_text.page_id
     res = res[["page_id"] + list(template_patterns.keys())]
     return res
 
 
-def _get_lengths_from_link_annotated_text(
-    page: mwxml.Page, link_annotated_text: Dict
-) -> pd.DataFrame:
+def _get_lengths_from_link_annotated_text(link_annotated_text: Dict) -> pd.DataFrame:
 
     paragraph_lengths = [
         len(paragraph["plaintext"]) for paragraph in link_annotated_text["paragraphs"]
@@ -156,7 +227,7 @@ def _get_lengths_from_link_annotated_text(
     len_intro = paragraph_lengths[0] if paragraph_lengths else 0
     res = pd.DataFrame(
         {
-            "page_id": [page.id],
+            "page_id": [link_annotated_text["page_id"]],
             "len_article_chars": [len_article],
             "len_intro_chars": [len_intro],
         }
@@ -164,70 +235,243 @@ def _get_lengths_from_link_annotated_text(
     return res
 
 
-def parse_file(args: Dict) -> None:
+OUT_FILE_KEYS = [
+    "lat_file_path",
+    "lnk_file_path",
+    "par_file_path",
+    "sct_file_path",
+    "tmp_file_path",
+    "len_file_path",
+]
 
-    logger.info("parsing {}".format(args["wikitext_file_path"]))
-    df_title_mapper = pd.read_csv(
-        args["title_mapper_file_path"], usecols=["source_title", "target_id"]
+
+def _get_in_file_paths(args: Dict) -> List[str]:
+    return [
+        args["wikitext_file_path"],
+        os.path.join(args["title_index_path"], title_index.HASHES_FILE_NAME),
+        os.path.join(args["title_index_path"], title_index.TARGET_IDS_FILE_NAME),
+        os.path.join(args["title_index_path"], title_index.COLLISIONS_FILE_NAME),
+    ]
+
+
+def _get_out_file_paths(args: Dict) -> List[str]:
+    return [args[key] for key in OUT_FILE_KEYS]
+
+
+def _open_out_files(args: Dict, exit_stack: ExitStack) -> List[IO]:
+    level = chunk_codecs.parse_codec(args["chunk_codec"]).level
+    return [
+        exit_stack.enter_context(chunk_codecs.open_chunk(path, "w", level))
+        for path in _get_out_file_paths(args)
+    ]
+
+
+def _parse_page(
+    page_text: PageText,
+    transformer: mwtext.Wikitext2Structured,
+    title_id_index: title_index.TitleIndex,
+    write_header: bool,
+) -> List[str]:
+    """Return the text to append to each output file (in OUT_FILE_KEYS order)."""
+    templates = _get_templates_from_page(page_text, TEMPLATE_PATTERNS)
+    link_annotated_text = _get_link_annotated_text_from_page(page_text, transformer)
+    compressed_link_annotated_text = _create_compressed_link_annotated_text(
+        link_annotated_text, title_id_index
     )
-    title_id_map = {
-        title: tid
-        for title, tid in zip(
-            df_title_mapper["source_title"].values,
-            df_title_mapper["target_id"].values,
-        )
-    }
-    del df_title_mapper
+    links = _get_links_from_link_annotated_text(compressed_link_annotated_text)
+    paragraphs = _get_paragraphs_from_link_annotated_text(link_annotated_text)
+    section_names = _get_section_names_from_link_annotated_text(link_annotated_text)
+    lengths = _get_lengths_from_link_annotated_text(link_annotated_text)
+
+    return [
+        "{}\n".format(json.dumps(compressed_link_annotated_text)),
+        links.to_csv(header=write_header, index=False),
+        paragraphs.to_csv(header=write_header, index=False),
+        section_names.to_csv(header=write_header, index=False),
+        templates.to_csv(header=write_header, index=False),
+        lengths.to_csv(header=write_header, index=False),
+    ]
+
 
-    transformer = mwtext.Wikitext2Structured(
+def _get_transformer() -> mwtext.Wikitext2Structured:
+    return mwtext.Wikitext2Structured(
         forbidden_wikilink_prefixes=FORBIDDEN_WIKILINK_PREFIXES,
     )
-    dump = mwxml.Dump.from_file(bz2.open(args["wikitext_file_path"]))
-    pages_written = 0
-    with ExitStack() as exit_stack:
-        lat_fp = exit_stack.enter_context(open(args["lat_file_path"], "w"))
-        lnk_fp = exit_stack.enter_context(open(args["lnk_file_path"], "w"))
-        par_fp = exit_stack.enter_context(open(args["par_file_path"], "w"))
-        sct_fp = exit_stack.enter_context(open(args["sct_file_path"], "w"))
-        tmp_fp = exit_stack.enter_context(open(args["tmp_file_path"], "w"))
-        len_fp = exit_stack.enter_context(open(args["len_file_path"], "w"))
 
-        write_header = True
-        for page_idx, page in enumerate(dump):
 
-            if page.namespace != 0 or page.redirect:
-                continue
+def _write_chunk_marker(args: Dict) -> None:
+    """Mark chunk as complete once all outputs are closed."""
+    utils.write_chunk_marker(
+        args["checkpoint_file_path"],
+        args,
+        _get_in_file_paths(args),
+        _get_out_file_paths(args),
+    )
+    logger.info("finished {}".format(args["wikitext_file_path"]))
 
-            revisions = list(page)
-            assert len(revisions) == 1
-            revision = revisions[0]
-            if not isinstance(revision.text, str):
-                continue
 
-            templates = _get_templates_from_page(page, revision, TEMPLATE_PATTERNS)
-            link_annotated_text = _get_link_annotated_text_from_page(page, revision, transformer)
-            compressed_link_annotated_text = _create_compressed_link_annotated_text(
-                link_annotated_text, title_id_map
-            )
-            links = _get_links_from_link_annotated_text(compressed_link_annotated_text)
-            paragraphs = _get_paragraphs_from_link_annotated_text(link_annotated_text)
-            section_names = _get_section_names_from_link_annotated_text(link_annotated_text)
-            lengths = _get_lengths_from_link_annotated_text(page, link_annotated_text)
-
-            lat_fp.write("{}\n".format(json.dumps(compressed_link_annotated_text)))
-            links.to_csv(lnk_fp, mode="a", header=write_header, index=False)
-            paragraphs.to_csv(par_fp, mode="a", header=write_header, index=False)
-            section_names.to_csv(sct_fp, mode="a", header=write_header, index=False)
-            templates.to_csv(tmp_fp, mode="a", header=write_header, index=False)
-            lengths.to_csv(len_fp, mode="a", header=write_header, index=False)
-            if write_header:
-                write_header = False
-
-            pages_written += 1
-            if pages_written >= args["max_entities"]:
-                return
+def parse_file(args: Dict) -> Dict[str, Any]:
 
-    logger.info("finished {}".format(args["wikitext_file_path"]))
+    logger.info("parsing {}".format(args["wikitext_file_path"]))
+    title_id_index = title_index.TitleIndex(args["title_index_path"])
+    transformer = _get_transformer()
+    with ExitStack() as exit_stack:
+        metrics = exit_stack.enter_context(
+            instrumentation.measure_worker(args["wikitext_file_path"])
+        )
+        out_fps = _open_out_files(args, exit_stack)
+        page_texts = _iter_page_texts(args["wikitext_file_path"], args["max_entities"])
+        for page_idx, page_text in enumerate(page_texts):
+            outputs = _parse_page(page_text, transformer, title_id_index, page_idx == 0)
+            for out_fp, output in zip(out_fps, outputs):
+                out_fp.write(output)
+            metrics["rows"] += 1
+
+    _write_chunk_marker(args)
+    return metrics
+
+
+# pipeline mode
+# ====================================================================
+# messages on the result queue are tuples whose first element is one of
+PAGE_MESSAGE = "page"  # (PAGE_MESSAGE, chunk_idx, page_idx, outputs)
+CHUNK_MESSAGE = "chunk"  # (CHUNK_MESSAGE, chunk_idx, number of pages)
+WORKER_MESSAGE = "worker"  # (WORKER_MESSAGE, metrics)
+ERROR_MESSAGE = "error"  # (ERROR_MESSAGE, formatted traceback)
+
+PAGE_QUEUE_SIZE_PER_WORKER = 8
+
+
+def _read_pages(mp_args: List[Dict], chunk_queue: Any, page_queue: Any, result_queue: Any) -> None:
+    """Pipeline reader process. Puts the pages of each chunk on the page queue."""
+    try:
+        while True:
+            chunk_idx = chunk_queue.get()
+            if chunk_idx is None:
+                break
+            args = mp_args[chunk_idx]
+            logger.info("reading {}".format(args["wikitext_file_path"]))
+            num_pages = 0
+            for page_text in _iter_page_texts(args["wikitext_file_path"], args["max_entities"]):
+                page_queue.put((chunk_idx, num_pages, page_text))
+                num_pages += 1
+            result_queue.put((CHUNK_MESSAGE, chunk_idx, num_pages))
+    except Exception:
+        result_queue.put((ERROR_MESSAGE, traceback.format_exc()))
+
+
+def _transform_pages(title_index_path: str, page_queue: Any, result_queue: Any) -> None:
+    """Pipeline transform process. Turns pages into output text."""
+    try:
+        title_id_index = title_index.TitleIndex(title_index_path)
+        transformer = _get_transformer()
+        with instrumentation.measure_worker(f"transform-{os.getpid()}") as metrics:
+            while True:
+                item = page_queue.get()
+                if item is None:
+                    break
+                chunk_idx, page_idx, page_text = item
+                outputs = _parse_page(page_text, transformer, title_id_index, page_idx == 0)
+                result_queue.put((PAGE_MESSAGE, chunk_idx, page_idx, outputs))
+                metrics["rows"] += 1
+        result_queue.put((WORKER_MESSAGE, metrics))
+    except Exception:
+        result_queue.put((ERROR_MESSAGE, traceback.format_exc()))
+
+
+class _ChunkWriter:
+    """Write the pages of one chunk in page order as they arrive."""
+
+    def __init__(self, args: Dict):
+        self.args = args
+        self.exit_stack = ExitStack()
+        self.out_fps = _open_out_files(args, self.exit_stack)
+        self.pending: Dict[int, List[str]] = {}
+        self.next_page_idx = 0
+        self.num_pages = -1
+
+    def add_page(self, page_idx: int, outputs: List[str]) -> None:
+        self.pending[page_idx] = outputs
+        while self.next_page_idx in self.pending:
+            for out_fp, output in zip(self.out_fps, self.pending.pop(self.next_page_idx)):
+                out_fp.write(output)
+            self.next_page_idx += 1
+
+    def is_complete(self) -> bool:
+        return self.next_page_idx == self.num_pages
+
+    def close(self) -> None:
+        self.exit_stack.close()
+        _write_chunk_marker(self.args)
+
+
+def parse_files_pipeline(mp_args: List[Dict], workers: int, readers: int) -> None:
+    """Parse chunks with a reader -> transform -> writer pipeline (see module docstring)."""
+    if not mp_args:
+        return
+    readers = min(readers, len(mp_args))
+    workers = max(workers, 1)
+    ctx = get_context("spawn")
+    chunk_queue = ctx.Queue()
+    page_queue = ctx.Queue(maxsize=PAGE_QUEUE_SIZE_PER_WORKER * workers)
+    result_queue = ctx.Queue(maxsize=PAGE_QUEUE_SIZE_PER_WORKER * workers)
+    for chunk_idx in range(len(mp_args)):
+        chunk_queue.put(chunk_idx)
+    for _ in range(readers):
+        chunk_queue.put(None)
+
+    processes = [
+        ctx.Process(target=_read_pages, args=(mp_args, chunk_queue, page_queue, result_queue))
+        for _ in range(readers)
+    ] + [
+        ctx.Process(
+            target=_transform_pages,
+            args=(mp_args[0]["title_index_path"], page_queue, result_queue),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    chunk_writers: Dict[int, _ChunkWriter] = {}
+    chunks_done = 0
+    worker_metrics: List[Dict[str, Any]] = []
+    try:
+        while len(worker_metrics) < workers:
+            message = result_queue.get()
+            if message[0] == ERROR_MESSAGE:
+                raise RuntimeError(f"wikitext pipeline process failed\n{message[1]}")
+            if message[0] == WORKER_MESSAGE:
+                worker_metrics.append(message[1])
+                continue
+
+            chunk_idx = message[1]
+            if chunk_idx not in chunk_writers:
+                chunk_writers[chunk_idx] = _ChunkWriter(mp_args[chunk_idx])
+            chunk_writer = chunk_writers[chunk_idx]
+            if message[0] == PAGE_MESSAGE:
+                chunk_writer.add_page(message[2], message[3])
+            else:
+                chunk_writer.num_pages = message[2]
+            if chunk_writer.is_complete():
+                chunk_writer.close()
+                del chunk_writers[chunk_idx]
+                chunks_done += 1
+                if chunks_done == len(mp_args):
+                    # all pages are written, let the transform processes finish
+                    for _ in range(workers):
+                        page_queue.put(None)
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        for chunk_writer in chunk_writers.values():
+            chunk_writer.exit_stack.close()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+
+    instrumentation.record_workers(worker_metrics, "pages")
 
 
 def main(
@@ -236,15 +480,19 @@ def main(
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
     workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
     max_entities: int = argconfig.DEFAULT_KWNLP_MAX_ENTITIES,
+    pipeline_readers: int = argconfig.DEFAULT_KWNLP_PIPELINE_READERS,
+    chunk_codec: str = argconfig.DEFAULT_KWNLP_CHUNK_CODEC,
 ) -> None:
 
+    extension = chunk_codecs.parse_codec(chunk_codec).extension
+
     in_dump_paths: Dict[str, str] = {
         "wikitext": os.path.join(data_path, f"wikipedia-raw-{wp_yyyymmdd}", "articlesdump"),
-        "title-mapper": os.path.join(
+        "title-index": os.path.join(
             data_path,
             f"wikipedia-derived-{wp_yyyymmdd}",
             "kwnlp-sql",
-            f"kwnlp-{wiki}-{wp_yyyymmdd}-title-mapper.csv",
+            f"kwnlp-{wiki}-{wp_yyyymmdd}-title-index",
         ),
     }
 
@@ -269,6 +517,11 @@ def main(
             f"wikipedia-derived-{wp_yyyymmdd}",
             "lengths-chunks",
         ),
+        "checkpoint": os.path.join(
+            data_path,
+            f"wikipedia-derived-{wp_yyyymmdd}",
+            "parse-wikitext-checkpoints",
+        ),
     }
 
     for name, path in in_dump_paths.items():
@@ -284,45 +537,76 @@ def main(
         for match in utils._get_ordered_files_from_path(in_dump_paths["wikitext"], pattern)
     ]
 
-    mp_args = []
+    mp_args: List[Dict[str, Any]] = []
     for wikitext_file_name in wikitext_file_names:
         wikitext_file_path = os.path.join(in_dump_paths["wikitext"], wikitext_file_name)
         out_file_base = "kwnlp-" + wikitext_file_name.replace(".xml", "").replace(".bz2", "")
 
-        lat_file_name = out_file_base.replace("pages-articles", "link-annotated-text") + ".jsonl"
+        lat_file_name = (
+            out_file_base.replace("pages-articles", "link-annotated-text") + f".jsonl{extension}"
+        )
         lat_file_path = os.path.join(out_dump_paths["lat"], lat_file_name)
 
-        lnk_file_name = out_file_base.replace("pages-articles", "links") + ".csv"
+        lnk_file_name = out_file_base.replace("pages-articles", "links") + f".csv{extension}"
         lnk_file_path = os.path.join(out_dump_paths["lnk"], lnk_file_name)
 
-        par_file_name = out_file_base.replace("pages-articles", "paragraphs") + ".csv"
+        par_file_name = out_file_base.replace("pages-articles", "paragraphs") + f".csv{extension}"
         par_file_path = os.path.join(out_dump_paths["par"], par_file_name)
 
-        sct_file_name = out_file_base.replace("pages-articles", "section-names") + ".csv"
+        sct_file_name = (
+            out_file_base.replace("pages-articles", "section-names") + f".csv{extension}"
+        )
         sct_file_path = os.path.join(out_dump_paths["sct"], sct_file_name)
 
-        tmp_file_name = out_file_base.replace("pages-articles", "templates") + ".csv"
+        tmp_file_name = out_file_base.replace("pages-articles", "templates") + f".csv{extension}"
         tmp_file_path = os.path.join(out_dump_paths["tmp"], tmp_file_name)
 
-        len_file_name = out_file_base.replace("pages-articles", "lengths") + ".csv"
+        len_file_name = out_file_base.replace("pages-articles", "lengths") + f".csv{extension}"
         len_file_path = os.path.join(out_dump_paths["len"], len_file_name)
 
+        checkpoint_file_path = os.path.join(out_dump_paths["checkpoint"], out_file_base + ".done")
+
         mp_args.append(
             {
                 "wikitext_file_path": wikitext_file_path,
-                "title_mapper_file_path": in_dump_paths["title-mapper"],
+                "title_index_path": in_dump_paths["title-index"],
                 "lat_file_path": lat_file_path,
                 "lnk_file_path": lnk_file_path,
                 "par_file_path": par_file_path,
                 "sct_file_path": sct_file_path,
                 "tmp_file_path": tmp_file_path,
                 "len_file_path": len_file_path,
+                "checkpoint_file_path": checkpoint_file_path,
                 "max_entities": max_entities,
+                "chunk_codec": chunk_codec,
             }
         )
 
+    # skip chunks completed by a previous (interrupted) run
+    # ============================================================
+    mp_args = [
+        args
+        for args in mp_args
+        if not utils.is_chunk_complete(
+            args["checkpoint_file_path"],
+            args,
+            _get_in_file_paths(args),
+            _get_out_file_paths(args),
+        )
+    ]
+    logger.info("parsing {} of {} chunks".format(len(mp_args), len(wikitext_file_names)))
+    instrumentation.add_count("chunks_skipped", len(wikitext_file_names) - len(mp_args))
+    for args in mp_args:
+        for out_file_path in _get_out_file_paths(args):
+            chunk_codecs.remove_stale(out_file_path)
+
+    if pipeline_readers > 0:
+        parse_files_pipeline(mp_args, workers, pipeline_readers)
+        return
+
     with get_context("spawn").Pool(workers) as p:
-        p.map(parse_file, mp_args)
+        worker_metrics = p.map(parse_file, mp_args)
+    instrumentation.record_workers(worker_metrics, "pages")
 
 
 if __name__ == "__main__":
@@ -334,6 +618,8 @@ if __name__ == "__main__":
         "wiki",
         "workers",
         "max_entities",
+        "pipeline_readers",
+        "chunk_codec",
         "loglevel",
     ]
     parser = argconfig.get_argparser(description, arg_names)
@@ -348,4 +634,6 @@ if __name__ == "__main__":
         wiki=args.wiki,
         workers=args.workers,
         max_entities=args.max_entities,
+        pipeline_readers=args.pipeline_readers,
+        chunk_codec=args.chunk_codec,
     )
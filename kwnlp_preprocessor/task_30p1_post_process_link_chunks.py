@@ -8,19 +8,26 @@ import typing
 
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig, utils
+from kwnlp_preprocessor import argconfig, chunk_codecs, utils
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/links-chunks/",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/anchor-target-counts-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/in-out-counts-chunks/",
+]
+
 
 def parse_file(args: dict) -> None:
 
     # read links
     logger.info("parsing {}".format(args["link_file_path"]))
-    df_links = pd.read_csv(
-        args["link_file_path"],
-        usecols=["anchor_text", "source_page_id", "target_page_id"],
-    )
+    with chunk_codecs.open_chunk(args["link_file_path"], "rb") as fp:
+        df_links = pd.read_csv(fp, usecols=["anchor_text", "source_page_id", "target_page_id"])
+    level = chunk_codecs.parse_codec(args["chunk_codec"]).level
 
     # calculate anchor target counts
     atc: typing.Counter[typing.Tuple[str, int]] = Counter(
@@ -30,7 +37,8 @@ def parse_file(args: dict) -> None:
         [(el[0][0], el[0][1], el[1]) for el in atc.most_common()],
         columns=["anchor_text", "target_page_id", "count"],
     )
-    df_atc.to_csv(args["atc_file_path"], index=False)
+    with chunk_codecs.open_chunk(args["atc_file_path"], "w", level) as fp:
+        df_atc.to_csv(fp, index=False)
 
     # calculate in/out link counts
     df_in = pd.DataFrame(
@@ -45,7 +53,8 @@ def parse_file(args: dict) -> None:
 
     df_inout = pd.merge(df_in, df_out, on="page_id", how="outer").fillna(0).astype(int)
     df_inout = df_inout.sort_values("page_id")
-    df_inout.to_csv(args["ioc_file_path"], index=False)
+    with chunk_codecs.open_chunk(args["ioc_file_path"], "w", level) as fp:
+        df_inout.to_csv(fp, index=False)
 
 
 def main(
@@ -53,8 +62,11 @@ def main(
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
     workers: int = argconfig.DEFAULT_KWNLP_WORKERS,
+    chunk_codec: str = argconfig.DEFAULT_KWNLP_CHUNK_CODEC,
 ) -> None:
 
+    extension = chunk_codecs.parse_codec(chunk_codec).extension
+
     in_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "links-chunks")
 
     out_dump_paths = {
@@ -78,18 +90,22 @@ def main(
     mp_args = []
     for link_file_name in all_links_file_names:
         link_file_path = os.path.join(in_dump_path, link_file_name)
+        out_file_base = chunk_codecs.strip_extension(link_file_name)
 
-        atc_file_name = link_file_name.replace("links", "anchor-target-counts")
+        atc_file_name = out_file_base.replace("links", "anchor-target-counts") + extension
         atc_file_path = os.path.join(out_dump_paths["atc"], atc_file_name)
+        chunk_codecs.remove_stale(atc_file_path)
 
-        ioc_file_name = link_file_name.replace("links", "in-out-counts")
+        ioc_file_name = out_file_base.replace("links", "in-out-counts") + extension
         ioc_file_path = os.path.join(out_dump_paths["ioc"], ioc_file_name)
+        chunk_codecs.remove_stale(ioc_file_path)
 
         mp_args.append(
             {
                 "link_file_path": link_file_path,
                 "atc_file_path": atc_file_path,
                 "ioc_file_path": ioc_file_path,
+                "chunk_codec": chunk_codec,
             }
         )
 
@@ -100,7 +116,7 @@ def main(
 if __name__ == "__main__":
 
     description = "post process link chunks"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "workers", "loglevel"]
+    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "workers", "chunk_codec", "loglevel"]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
@@ -112,4 +128,5 @@ if __name__ == "__main__":
         data_path=args.data_path,
         wiki=args.wiki,
         workers=args.workers,
+        chunk_codec=args.chunk_codec,
     )
@@ -7,53 +7,71 @@ import typing
 
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
-from kwnlp_preprocessor import utils
-
+from kwnlp_preprocessor import argconfig, chunk_codecs, instrumentation, table_io, utils
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/links-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/anchor-target-counts-chunks/",
+    "wikipedia-derived-{wp_yyyymmdd}/in-out-counts-chunks/",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/links/",
+    "wikipedia-derived-{wp_yyyymmdd}/links-edges-plus/",
+    "wikipedia-derived-{wp_yyyymmdd}/links-edges/",
+    "wikipedia-derived-{wp_yyyymmdd}/anchor-target-counts/",
+    "wikipedia-derived-{wp_yyyymmdd}/in-out-counts/",
+]
+
 
-def gather_link_edge_list(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
+def gather_link_edge_list(wp_yyyymmdd: str, data_path: str, wiki: str, table_format: str) -> None:
 
     in_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "links-chunks")
     logger.info(f"in dump path: {in_dump_path}")
 
     pattern = re.compile("kwnlp-" + wiki + r"-\d{8}-links(\d{1,2})-p(\d+)p(\d+)\.csv")
-    all_file_names = [
-        match.string for match in utils._get_ordered_files_from_path(in_dump_path, pattern)
+    all_file_paths = [
+        os.path.join(in_dump_path, match.string)
+        for match in utils._get_ordered_files_from_path(in_dump_path, pattern)
     ]
 
-    df = pd.DataFrame()
-    for file_name in all_file_names:
-        file_path = os.path.join(in_dump_path, file_name)
-        logger.info(f"collecting from {file_path}")
-
-        df1 = pd.read_csv(file_path)
-        df = pd.concat([df, df1])
-
     out_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "links")
     os.makedirs(out_dump_path, exist_ok=True)
     logger.info(f"out dump path: {out_dump_path}")
-    out_file_path = os.path.join(out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-links.csv")
-    df.to_csv(out_file_path, index=False)
+    links_file_path = os.path.join(
+        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-links.{table_format}"
+    )
+    column_types = table_io.CHUNK_COLUMN_TYPES["links"]
+    num_lines = table_io.gather_tables(all_file_paths, links_file_path, column_types)
+    instrumentation.add_count("links", num_lines)
 
+    # the edge lists are column subsets of the links chunks
     out_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "links-edges-plus")
     os.makedirs(out_dump_path, exist_ok=True)
     logger.info(f"out dump path: {out_dump_path}")
-    out_file_path = os.path.join(out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-links-edges-plus.csv")
-    df[["source_page_id", "section_idx", "paragraph_idx", "target_page_id"]].to_csv(
-        out_file_path, index=False
+    out_file_path = os.path.join(
+        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-links-edges-plus.{table_format}"
+    )
+    table_io.gather_tables(
+        all_file_paths,
+        out_file_path,
+        column_types,
+        columns=["source_page_id", "section_idx", "paragraph_idx", "target_page_id"],
     )
 
     out_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "links-edges")
     os.makedirs(out_dump_path, exist_ok=True)
     logger.info(f"out dump path: {out_dump_path}")
-    out_file_path = os.path.join(out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-links-edges.csv")
-    df[["source_page_id", "target_page_id"]].to_csv(out_file_path, index=False)
+    out_file_path = os.path.join(
+        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-links-edges.{table_format}"
+    )
+    table_io.gather_tables(
+        all_file_paths, out_file_path, column_types, columns=["source_page_id", "target_page_id"]
+    )
 
 
-def gather_anchor_counts(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
+def gather_anchor_counts(wp_yyyymmdd: str, data_path: str, wiki: str, table_format: str) -> None:
 
     in_dump_path = os.path.join(
         data_path, f"wikipedia-derived-{wp_yyyymmdd}", "anchor-target-counts-chunks"
@@ -79,7 +97,8 @@ def gather_anchor_counts(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
         atc_file_path = os.path.join(in_dump_path, atc_file_name)
         logger.info(f"collecting from {atc_file_path}")
 
-        df = pd.read_csv(atc_file_path)
+        with chunk_codecs.open_chunk(atc_file_path, "rb") as fp:
+            df = pd.read_csv(fp)
         atc1 = Counter(
             {(a, t): c for a, t, c in zip(df["anchor_text"], df["target_page_id"], df["count"])}
         )
@@ -92,12 +111,12 @@ def gather_anchor_counts(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
     )
 
     out_file_path = os.path.join(
-        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-anchor-target-counts.csv"
+        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-anchor-target-counts.{table_format}"
     )
-    df_atc.to_csv(out_file_path, index=False)
+    table_io.write_table(df_atc, out_file_path)
 
 
-def gather_inout_counts(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
+def gather_inout_counts(wp_yyyymmdd: str, data_path: str, wiki: str, table_format: str) -> None:
 
     in_dump_path = os.path.join(
         data_path, f"wikipedia-derived-{wp_yyyymmdd}", "in-out-counts-chunks"
@@ -120,7 +139,8 @@ def gather_inout_counts(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
         ioc_file_path = os.path.join(in_dump_path, ioc_file_name)
         logger.info(f"collecting from {ioc_file_path}")
 
-        df = pd.read_csv(ioc_file_path)
+        with chunk_codecs.open_chunk(ioc_file_path, "rb") as fp:
+            df = pd.read_csv(fp)
         in_c1 = Counter({p: c for p, c in zip(df["page_id"], df["in_count"])})
         out_c1 = Counter({p: c for p, c in zip(df["page_id"], df["out_count"])})
         del df
@@ -132,29 +152,37 @@ def gather_inout_counts(wp_yyyymmdd: str, data_path: str, wiki: str) -> None:
     df_inout = pd.merge(df_in, df_out, on="page_id", how="outer").fillna(0).astype(int)
     df_inout = df_inout.sort_values("page_id")
 
-    out_file_path = os.path.join(out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-in-out-counts.csv")
-    df_inout.to_csv(out_file_path, index=False)
+    out_file_path = os.path.join(
+        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-in-out-counts.{table_format}"
+    )
+    table_io.write_table(df_inout, out_file_path)
 
 
 def main(
     wp_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> None:
 
-    gather_link_edge_list(wp_yyyymmdd, data_path, wiki)
-    gather_inout_counts(wp_yyyymmdd, data_path, wiki)
-    gather_anchor_counts(wp_yyyymmdd, data_path, wiki)
+    gather_link_edge_list(wp_yyyymmdd, data_path, wiki, table_format)
+    gather_inout_counts(wp_yyyymmdd, data_path, wiki, table_format)
+    gather_anchor_counts(wp_yyyymmdd, data_path, wiki, table_format)
 
 
 if __name__ == "__main__":
 
     description = "collect post processed link data"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "table_format", "loglevel"]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        table_format=args.table_format,
+    )
@@ -1,20 +1,25 @@
 # Copyright 2021-present Kensho Technologies, LLC.
 import logging
 import os
-import pandas as pd
 import re
 
-from kwnlp_preprocessor import argconfig
-from kwnlp_preprocessor import utils
-
+from kwnlp_preprocessor import argconfig, instrumentation, table_io, utils
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/lengths-chunks/",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/lengths/",
+]
+
 
 def main(
     wp_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> None:
 
     in_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "lengths-chunks")
@@ -25,30 +30,33 @@ def main(
     logger.info(f"out dump path: {out_dump_path}")
 
     pattern = re.compile("kwnlp-" + wiki + r"-\d{8}-lengths(\d{1,2})-p(\d+)p(\d+)\.csv")
-    all_file_names = [
-        match.string for match in utils._get_ordered_files_from_path(in_dump_path, pattern)
+    all_file_paths = [
+        os.path.join(in_dump_path, match.string)
+        for match in utils._get_ordered_files_from_path(in_dump_path, pattern)
     ]
 
-    df = pd.DataFrame()
-    for file_name in all_file_names:
-        file_path = os.path.join(in_dump_path, file_name)
-        logger.info(f"collecting from {file_path}")
-
-        df1 = pd.read_csv(file_path)
-        df = pd.concat([df, df1])
-
-    out_file_path = os.path.join(out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-lengths.csv")
-    df.to_csv(out_file_path, index=False)
+    out_file_path = os.path.join(
+        out_dump_path, f"kwnlp-{wiki}-{wp_yyyymmdd}-lengths.{table_format}"
+    )
+    num_lines = table_io.gather_tables(
+        all_file_paths, out_file_path, table_io.CHUNK_COLUMN_TYPES["lengths"]
+    )
+    instrumentation.add_count("rows", num_lines)
 
 
 if __name__ == "__main__":
 
     description = "collect lengths"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "table_format", "loglevel"]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     logger.info(f"args={args}")
 
-    main(args.wp_yyyymmdd, data_path=args.data_path, wiki=args.wiki)
+    main(
+        args.wp_yyyymmdd,
+        data_path=args.data_path,
+        wiki=args.wiki,
+        table_format=args.table_format,
+    )
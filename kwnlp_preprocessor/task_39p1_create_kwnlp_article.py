@@ -1,14 +1,29 @@
 # Copyright 2021-present Kensho Technologies, LLC.
-"""Combine pre-wikitext parsing article CSV with post-wikitext parsing CSV."""
+"""Combine pre-wikitext parsing article CSV with post-wikitext parsing CSV.
+
+Page titles are not read from the article-pre CSV. They are decoded from the
+title dictionary (see the title_dictionary module) when the output is written.
+"""
 import logging
 import os
 
 import pandas as pd
 
-from kwnlp_preprocessor import argconfig
+from kwnlp_preprocessor import argconfig, instrumentation, table_io, title_dictionary
 
 logger = logging.getLogger(__name__)
 
+INPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-article-pre.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-title-dictionary.npz",
+    "wikipedia-derived-{wp_yyyymmdd}/in-out-counts/kwnlp-{wiki}-{wp_yyyymmdd}-in-out-counts.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/lengths/kwnlp-{wiki}-{wp_yyyymmdd}-lengths.{table_format}",
+    "wikipedia-derived-{wp_yyyymmdd}/templates/kwnlp-{wiki}-{wp_yyyymmdd}-templates.{table_format}",
+]
+OUTPUTS = [
+    "wikipedia-derived-{wp_yyyymmdd}/kwnlp-sql/kwnlp-{wiki}-{wp_yyyymmdd}-article.{table_format}",
+]
+
 
 # TODO: centralize this in argconfig
 # have to change in task 24p1 create article_pre too
@@ -27,6 +42,7 @@ def main(
     wp_yyyymmdd: str,
     data_path: str = argconfig.DEFAULT_KWNLP_DATA_PATH,
     wiki: str = argconfig.DEFAULT_KWNLP_WIKI,
+    table_format: str = argconfig.DEFAULT_KWNLP_TABLE_FORMAT,
 ) -> None:
 
     wp_dump_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}")
@@ -36,12 +52,12 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-article-pre.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-article-pre.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df = pd.read_csv(
+    df = table_io.read_table(
         file_path,
-        keep_default_na=False,
+        columns=["page_id", "item_id", "views"] + [f"isa_Q{nqid}" for nqid in ROOT_NQIDS],
     )
 
     # read and merge in-out counts
@@ -49,10 +65,10 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "in-out-counts",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-in-out-counts.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-in-out-counts.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_ioc = pd.read_csv(file_path)
+    df_ioc = table_io.read_table(file_path)
 
     df = pd.merge(df, df_ioc, on="page_id", how="left")
     df[["in_count", "out_count"]] = df[["in_count", "out_count"]].fillna(0).astype("int")
@@ -63,10 +79,10 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "lengths",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-lengths.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-lengths.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_len = pd.read_csv(file_path)
+    df_len = table_io.read_table(file_path)
 
     df = pd.merge(df, df_len, on="page_id", how="left")
     df[["len_article_chars", "len_intro_chars"]] = (
@@ -78,10 +94,10 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "templates",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-templates.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-templates.{table_format}",
     )
     logger.info(f"reading {file_path}")
-    df_tmp = pd.read_csv(file_path)
+    df_tmp = table_io.read_table(file_path)
 
     TEMPLATE_RENAMES = {
         "good_article": "tmpl_good_article",
@@ -94,6 +110,17 @@ def main(
     df = df.rename(columns=TEMPLATE_RENAMES)
     df[tmpl_col_names] = df[tmpl_col_names].fillna(0).astype("int")
 
+    # decode page titles
+    # ====================================================================
+    file_path = os.path.join(
+        wp_dump_path,
+        "kwnlp-sql",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-title-dictionary.npz",
+    )
+    logger.info(f"reading {file_path}")
+    titles = title_dictionary.read_title_dictionary(file_path)
+    df["page_title"] = titles.decode(titles.encode_page_ids(df["page_id"].values))
+
     # sort and write output
     # ====================================================================
     df = df[
@@ -114,17 +141,18 @@ def main(
     file_path = os.path.join(
         wp_dump_path,
         "kwnlp-sql",
-        f"kwnlp-{wiki}-{wp_yyyymmdd}-article.csv",
+        f"kwnlp-{wiki}-{wp_yyyymmdd}-article.{table_format}",
     )
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     logger.info(f"writing {file_path}")
-    df.to_csv(file_path, index=False)
+    instrumentation.add_count("rows", len(df))
+    table_io.write_table(df, file_path)
 
 
 if __name__ == "__main__":
 
     description = "create kwnlp-article"
-    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "loglevel"]
+    arg_names = ["wp_yyyymmdd", "data_path", "wiki", "table_format", "loglevel"]
     parser = argconfig.get_argparser(description, arg_names)
 
     args = parser.parse_args()
@@ -135,4 +163,5 @@ if __name__ == "__main__":
         args.wp_yyyymmdd,
         data_path=args.data_path,
         wiki=args.wiki,
+        table_format=args.table_format,
     )
@@ -0,0 +1,52 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import bz2
+import os
+import random
+from tempfile import TemporaryDirectory
+from typing import List
+import unittest
+
+from kwnlp_preprocessor import bz2_blocks
+
+
+class TestBz2Blocks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "lines.bz2")
+        rng = random.Random(0)
+        self.lines = [
+            '{{"id": "Q{}", "label": "{}"}}'.format(
+                ii, "".join(rng.choice("abcdefghij") for _ in range(rng.randint(0, 200)))
+            ).encode()
+            for ii in range(6000)
+        ]
+        # three streams of several 100k blocks each
+        with open(self.file_path, "wb") as fp:
+            for start in range(0, len(self.lines), 2000):
+                data = b"\n".join(self.lines[start : start + 2000]) + b"\n"
+                fp.write(bz2.compress(data, compresslevel=1))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_ranges_cover_all_lines(self) -> None:
+        index = bz2_blocks.build_block_index(self.file_path, range_bytes=20000)
+        self.assertEqual(int((~index.is_block).sum()), 3)
+        ranges = index.get_ranges()
+        self.assertGreater(len(ranges), 3)
+        lines: List[bytes] = []
+        for first, last in ranges:
+            lines.extend(bz2_blocks.iter_range_lines(self.file_path, index, first, last))
+        self.assertEqual(lines, self.lines)
+
+    def test_round_trip(self) -> None:
+        index = bz2_blocks.build_block_index(self.file_path, range_bytes=20000)
+        index_path = os.path.join(self.tmpdir.name, "index.npz")
+        bz2_blocks.write_block_index(index_path, index)
+        read_index = bz2_blocks.read_block_index(index_path)
+        self.assertEqual(read_index.get_ranges(), index.get_ranges())
+        self.assertEqual(read_index.markers.tolist(), index.markers.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
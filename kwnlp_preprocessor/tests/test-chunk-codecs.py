@@ -0,0 +1,76 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+from typing import List
+import unittest
+
+from kwnlp_preprocessor import chunk_codecs, utils
+
+
+def _get_specs() -> List[str]:
+    specs = ["none", "gzip:1", "bz2"]
+    for name in chunk_codecs.ARROW_CODECS:
+        try:
+            chunk_codecs.parse_codec(name)
+        except ValueError:
+            continue
+        specs.append(name)
+    return specs
+
+
+class TestChunkCodecs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_parse_codec(self) -> None:
+        self.assertEqual(chunk_codecs.parse_codec("gzip:3"), chunk_codecs.Codec("gzip", 3))
+        self.assertEqual(chunk_codecs.parse_codec("bz2").extension, ".bz2")
+        for spec in ["zip", "none:1", "gzip:fast"]:
+            with self.assertRaises(ValueError):
+                chunk_codecs.parse_codec(spec)
+
+    def test_round_trip(self) -> None:
+        text = "".join(f"{ii},Éowyn\n" for ii in range(20000))
+        for spec in _get_specs():
+            codec = chunk_codecs.parse_codec(spec)
+            file_path = os.path.join(self.tmpdir.name, f"chunk.csv{codec.extension}")
+            self.assertEqual(chunk_codecs.get_codec(file_path).name, codec.name)
+            with chunk_codecs.open_chunk(file_path, "w", codec.level) as fp:
+                for ii in range(0, len(text), 1000):
+                    fp.write(text[ii : ii + 1000])
+            with chunk_codecs.open_chunk(file_path, "r") as fp:
+                self.assertEqual(fp.read(), text, spec)
+
+            # streams compressed separately read back as one file
+            with open(file_path, "wb") as fp:
+                fp.write(chunk_codecs.compress(b"a\nb\n", codec))
+                fp.write(chunk_codecs.compress(b"c\n", codec))
+            with chunk_codecs.open_chunk(file_path, "rb") as fp:
+                self.assertEqual(fp.readlines(), [b"a\n", b"b\n", b"c\n"], spec)
+
+    def test_gather_and_remove_stale(self) -> None:
+        file_paths = []
+        for ii, spec in enumerate(_get_specs()):
+            codec = chunk_codecs.parse_codec(spec)
+            file_path = os.path.join(self.tmpdir.name, f"chunk-{ii}.csv{codec.extension}")
+            with chunk_codecs.open_chunk(file_path, "w", codec.level) as fp:
+                fp.write(f"id,name\n{ii},Gandalf\n")
+            file_paths.append(file_path)
+        out_file_path = os.path.join(self.tmpdir.name, "gathered.csv")
+        self.assertEqual(utils.gather_csv_files(file_paths, out_file_path), len(file_paths))
+        with open(out_file_path) as fp:
+            self.assertEqual(fp.readline(), "id,name\n")
+
+        stale_file_path = os.path.join(self.tmpdir.name, "chunk-0.csv.gz")
+        with chunk_codecs.open_chunk(stale_file_path, "w") as fp:
+            fp.write("id,name\n")
+        chunk_codecs.remove_stale(file_paths[0])
+        self.assertTrue(os.path.exists(file_paths[0]))
+        self.assertFalse(os.path.exists(stale_file_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
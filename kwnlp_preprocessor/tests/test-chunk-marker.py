@@ -0,0 +1,40 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from kwnlp_preprocessor import utils
+
+
+class TestChunkMarker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.in_path = os.path.join(self.tmpdir.name, "in.txt")
+        self.out_path = os.path.join(self.tmpdir.name, "out.txt")
+        self.marker_path = os.path.join(self.tmpdir.name, "checkpoints", "chunk.done")
+        self.args = {"max_entities": 10}
+        for path in [self.in_path, self.out_path]:
+            with open(path, "w") as fp:
+                fp.write("data\n")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _is_complete(self) -> bool:
+        return utils.is_chunk_complete(self.marker_path, self.args, [self.in_path], [self.out_path])
+
+    def test_marker(self) -> None:
+        self.assertFalse(self._is_complete())
+        utils.write_chunk_marker(self.marker_path, self.args, [self.in_path], [self.out_path])
+        self.assertTrue(self._is_complete())
+
+    def test_truncated_output(self) -> None:
+        utils.write_chunk_marker(self.marker_path, self.args, [self.in_path], [self.out_path])
+        with open(self.out_path, "w") as fp:
+            fp.write("da")
+        self.assertFalse(self._is_complete())
+
+    def test_changed_args(self) -> None:
+        utils.write_chunk_marker(self.marker_path, self.args, [self.in_path], [self.out_path])
+        self.args = {"max_entities": 20}
+        self.assertFalse(self._is_complete())
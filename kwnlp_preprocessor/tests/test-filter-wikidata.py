@@ -0,0 +1,164 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import bz2
+import json
+import os
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List
+import unittest
+
+from kwnlp_preprocessor import task_18p1_filter_wikidata_dump
+
+WD = "20210705"
+
+
+def _claim(property_id: str, target: int, rank: str = "normal", snaktype: str = "value") -> Dict:
+    mainsnak: Dict[str, Any] = {"snaktype": snaktype, "property": property_id}
+    if snaktype == "value":
+        mainsnak["datatype"] = "wikibase-item"
+        mainsnak["datavalue"] = {
+            "value": {"entity-type": "item", "numeric-id": target, "id": f"Q{target}"},
+            "type": "wikibase-entityid",
+        }
+    return {"mainsnak": mainsnak, "type": "statement", "id": f"Q1${target}", "rank": rank}
+
+
+ENTITIES: List[Dict] = [
+    {
+        "type": "item",
+        "id": "Q1",
+        "labels": {"en": {"language": "en", "value": "Gandalf"}},
+        "descriptions": [],
+        "aliases": {"en": [{"language": "en", "value": "Mithrandir"}]},
+        "claims": {
+            "P31": [_claim("P31", 5), _claim("P31", 6, rank="deprecated")],
+            "P279": [_claim("P279", 7, snaktype="somevalue")],
+            "P40": [_claim("P40", 8), _claim("P40", 9, rank="preferred")],
+            "P1082": [
+                {
+                    "mainsnak": {
+                        "snaktype": "value",
+                        "property": "P1082",
+                        "datatype": "quantity",
+                        "datavalue": {"value": {"amount": "+3", "unit": "1"}, "type": "quantity"},
+                    },
+                    "type": "statement",
+                    "id": "Q1$3",
+                    "rank": "normal",
+                }
+            ],
+        },
+        "sitelinks": {"enwiki": {"site": "enwiki", "title": "Gandalf"}},
+    },
+    {
+        "type": "item",
+        "id": "Q2",
+        "labels": [],
+        "descriptions": [],
+        "aliases": [],
+        "claims": {"P31": [_claim("P31", 13442814)]},
+        "sitelinks": {"enwiki": {"site": "enwiki", "title": "A paper"}},
+    },
+    {
+        "type": "property",
+        "id": "P40",
+        "labels": {"en": {"language": "en", "value": "child"}},
+        "descriptions": {"en": {"language": "en", "value": "a child"}},
+        "aliases": [],
+        "claims": {},
+    },
+    {"type": "lexeme", "id": "L1"},
+]
+
+
+class TestFilterWikidata(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.chunk_path = os.path.join(self.tmpdir.name, "chunk.jsonl.bz2")
+        self.lines = [json.dumps(entity, separators=(",", ":")) for entity in ENTITIES]
+        with bz2.open(self.chunk_path, "wt") as fp:
+            fp.write("".join(f"{line}\n" for line in self.lines))
+        self.args: Dict[str, Any] = {
+            "wikis": ["enwiki"],
+            "data_path": self.tmpdir.name,
+            "wd_yyyymmdd": WD,
+            "wikidata_file_path": self.chunk_path,
+            "out_file_base": f"wikidata-{WD}-chunk-0000",
+            "max_entities": 100,
+            "include_item_statements": True,
+            "extraction_spec": [],
+        }
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _read(self, sample: str) -> List[str]:
+        file_path = task_18p1_filter_wikidata_dump._get_out_file_paths(self.args)[sample]
+        with open(file_path) as fp:
+            return fp.read().splitlines()
+
+    def test_parse_file(self) -> None:
+        metrics = task_18p1_filter_wikidata_dump.parse_file(self.args)
+        self.assertEqual(metrics["rows"], 4)
+        self.assertEqual(metrics["prescreened"], 1)
+        self.assertEqual(self._read("p31-claim"), ["source_id,target_id,rnk", "1,5,1"])
+        self.assertEqual(self._read("p279-claim"), ["source_id,target_id,rnk"])
+        self.assertEqual(
+            self._read("qpq-claim"),
+            ["source_id,property_id,target_id,rnk", "1,31,5,1", "1,40,9,0"],
+        )
+        self.assertEqual(self._read("item"), ["item_id,en_label,en_description", "1,Gandalf,"])
+        self.assertEqual(self._read("item-alias"), ["item_id,en_alias", "1,Mithrandir"])
+        self.assertEqual(
+            self._read("property"), ["property_id,en_label,en_description", "40,child,a child"]
+        )
+        self.assertEqual(self._read("skipped-entity"), ["qid,instances_of", "2,13442814"])
+        statement_ids = [row.split(",")[0] for row in self._read("item-statements")[1:]]
+        self.assertEqual(statement_ids, ["Q1-P31-0", "Q1-P40-0", "Q1-P1082-0"])
+        # articles are the lines of the dump as they are
+        self.assertEqual(self._read("enwiki-article"), [self.lines[0]])
+
+    def test_remove_stale_chunks(self) -> None:
+        # a previous run, e.g. with the other wikidata_split, produced two chunks
+        stale_args = dict(self.args, out_file_base=f"wikidata-{WD}-chunk-0001")
+        for args in [self.args, stale_args]:
+            task_18p1_filter_wikidata_dump.parse_file(args)
+        wd_derived_path = os.path.join(self.tmpdir.name, f"wikidata-derived-{WD}")
+        other_path = os.path.join(wd_derived_path, "item-chunks", "notes.txt")
+        open(other_path, "w").close()
+
+        num_removed = task_18p1_filter_wikidata_dump._remove_stale_chunks(
+            wd_derived_path, {self.args["out_file_base"]}
+        )
+        stale_paths = list(task_18p1_filter_wikidata_dump._get_out_file_paths(stale_args).values())
+        stale_paths.append(task_18p1_filter_wikidata_dump._get_checkpoint_file_path(stale_args))
+        self.assertEqual(num_removed, len(stale_paths))
+        for file_path in stale_paths:
+            self.assertFalse(os.path.exists(file_path))
+        for file_path in task_18p1_filter_wikidata_dump._get_out_file_paths(self.args).values():
+            self.assertTrue(os.path.exists(file_path))
+        self.assertTrue(
+            os.path.exists(task_18p1_filter_wikidata_dump._get_checkpoint_file_path(self.args))
+        )
+        self.assertTrue(os.path.exists(other_path))
+
+    def test_prescreen_skipped_item(self) -> None:
+        prescreen = task_18p1_filter_wikidata_dump._prescreen_skipped_item
+        for separators in [(",", ":"), (", ", ": ")]:
+            item: Dict[str, Any] = {
+                "type": "item",
+                "id": "Q2",
+                "claims": {"P31": [_claim("P31", 13442814)]},
+            }
+            line = json.dumps(item, separators=separators).encode()
+            self.assertEqual(prescreen(line), ("2", {13442814}))
+            # deprecated or in a qualifier, these are decoded in full
+            item["claims"]["P31"] = [_claim("P31", 13442814, rank="deprecated")]
+            self.assertIsNone(prescreen(json.dumps(item, separators=separators).encode()))
+            qualified_claim = _claim("P40", 8)
+            qualified_claim["qualifiers"] = {"P31": [_claim("P31", 13442814)["mainsnak"]]}
+            item["claims"] = {"P40": [qualified_claim]}
+            self.assertIsNone(prescreen(json.dumps(item, separators=separators).encode()))
+
+
+if __name__ == "__main__":
+    unittest.main()
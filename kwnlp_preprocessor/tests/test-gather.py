@@ -0,0 +1,52 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+from typing import List
+import unittest
+
+from kwnlp_preprocessor import utils
+
+
+class TestGatherCsvFiles(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.out_path = os.path.join(self.tmpdir.name, "out", "gathered.csv")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _write_chunks(self, contents: List[str]) -> List[str]:
+        paths = []
+        for ii, content in enumerate(contents):
+            path = os.path.join(self.tmpdir.name, f"chunk-{ii}.csv")
+            with open(path, "w") as fp:
+                fp.write(content)
+            paths.append(path)
+        return paths
+
+    def _read_output(self) -> str:
+        with open(self.out_path) as fp:
+            return fp.read()
+
+    def test_gather(self) -> None:
+        paths = self._write_chunks(["a,b,c\n1,x,2\n", "", "a,b,c\n", 'a,b,c\n3,"y,z",4\n5,w,6'])
+        num_lines = utils.gather_csv_files(paths, self.out_path)
+        self.assertEqual(num_lines, 3)
+        self.assertEqual(self._read_output(), 'a,b,c\n1,x,2\n3,"y,z",4\n5,w,6\n')
+
+    def test_gather_columns(self) -> None:
+        paths = self._write_chunks(["a,b,c\n1,x,2\n", 'a,b,c\n3,"y,z",4\n'])
+        num_lines = utils.gather_csv_files(paths, self.out_path, columns=["c", "a"])
+        self.assertEqual(num_lines, 2)
+        self.assertEqual(self._read_output(), "c,a\n2,1\n4,3\n")
+
+    def test_header_mismatch(self) -> None:
+        paths = self._write_chunks(["a,b,c\n1,x,2\n", "a,c\n3,4\n"])
+        with self.assertRaises(ValueError):
+            utils.gather_csv_files(paths, self.out_path)
+        utils.gather_csv_files(paths, self.out_path, check_header=False)
+        self.assertEqual(self._read_output(), "a,b,c\n1,x,2\n3,4\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
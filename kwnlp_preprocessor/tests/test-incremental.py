@@ -0,0 +1,123 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Tuple
+import unittest
+
+import pandas as pd
+
+from kwnlp_preprocessor import (
+    incremental,
+    task_06p2_create_kwnlp_redirect_it2,
+    task_09p1_create_kwnlp_ultimate_redirect,
+    task_12p1_create_kwnlp_title_mapper,
+)
+
+WIKI = "enwiki"
+PREV_WP = "20210601"
+WP = "20210701"
+
+# page id -> title and page id -> redirect target title
+PREV_PAGES = {ii: title for ii, title in enumerate("ABCDEFGHJKLMNOP", start=1)}
+PREV_REDIRECTS = {
+    2: "A",
+    3: "B",
+    4: "C",
+    5: "F",
+    6: "E",
+    7: "H",
+    11: "A",
+    14: "P",
+    15: "O",
+}
+PAGES = {**PREV_PAGES, 3: "C2", 16: "I", 17: "Q", 18: "R"}
+del PAGES[7]
+REDIRECTS = {**PREV_REDIRECTS, 2: "H", 6: "I", 17: "L", 18: "O"}
+del REDIRECTS[7]
+
+TASKS = [
+    task_06p2_create_kwnlp_redirect_it2,
+    task_09p1_create_kwnlp_ultimate_redirect,
+    task_12p1_create_kwnlp_title_mapper,
+]
+OUTPUTS = [
+    f"{WIKI}-{WP}-redirect-it2.csv",
+    f"kwnlp-{WIKI}-{WP}-ultimate-redirect.csv",
+    f"kwnlp-{WIKI}-{WP}-title-mapper.csv",
+]
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _write_sql(
+        self, data_path: str, wp_yyyymmdd: str, pages: Dict[int, str], redirects: Dict[int, str]
+    ) -> str:
+        sql_path = os.path.join(data_path, f"wikipedia-derived-{wp_yyyymmdd}", "kwnlp-sql")
+        os.makedirs(sql_path)
+        pd.DataFrame({"page_id": list(pages), "page_title": list(pages.values())}).to_csv(
+            os.path.join(sql_path, f"{WIKI}-{wp_yyyymmdd}-page.csv"), index=False
+        )
+        pd.DataFrame({"rd_from": list(redirects), "rd_title": list(redirects.values())}).to_csv(
+            os.path.join(sql_path, f"{WIKI}-{wp_yyyymmdd}-redirect.csv"), index=False
+        )
+        return sql_path
+
+    def _run(self, name: str, previous_wp_yyyymmdd: str) -> Tuple[str, List[str]]:
+        data_path = os.path.join(self.tmpdir.name, name)
+        self._write_sql(data_path, PREV_WP, PREV_PAGES, PREV_REDIRECTS)
+        sql_path = self._write_sql(data_path, WP, PAGES, REDIRECTS)
+        for task in TASKS:
+            task.main(PREV_WP, data_path=data_path, wiki=WIKI)
+        for task in TASKS:
+            task.main(WP, data_path=data_path, wiki=WIKI, previous_wp_yyyymmdd=previous_wp_yyyymmdd)
+        contents = []
+        for file_name in OUTPUTS:
+            with open(os.path.join(sql_path, file_name)) as fp:
+                contents.append(fp.read())
+        return sql_path, contents
+
+    def test_same_as_full_build(self) -> None:
+        sql_path, contents = self._run("incremental", PREV_WP)
+        full_sql_path, full_contents = self._run("full", "")
+        self.assertEqual(contents, full_contents)
+        for file_name in OUTPUTS:
+            self.assertTrue(
+                os.path.exists(incremental.get_changes_path(os.path.join(sql_path, file_name)))
+            )
+            self.assertFalse(
+                os.path.exists(incremental.get_changes_path(os.path.join(full_sql_path, file_name)))
+            )
+
+        df = pd.read_csv(
+            incremental.get_changes_path(os.path.join(sql_path, OUTPUTS[1])), index_col="source_id"
+        )
+        self.assertEqual(
+            df["change"].to_dict(),
+            {
+                2: "changed",
+                3: "changed",
+                4: "removed",
+                5: "added",
+                6: "added",
+                7: "removed",
+                17: "added",
+            },
+        )
+
+    def test_missing_previous(self) -> None:
+        data_path = os.path.join(self.tmpdir.name, "missing")
+        self._write_sql(data_path, WP, PAGES, REDIRECTS)
+        for task in TASKS:
+            task.main(WP, data_path=data_path, wiki=WIKI, previous_wp_yyyymmdd=PREV_WP)
+        sql_path = os.path.join(data_path, f"wikipedia-derived-{WP}", "kwnlp-sql")
+        for file_name in OUTPUTS:
+            self.assertTrue(os.path.exists(os.path.join(sql_path, file_name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
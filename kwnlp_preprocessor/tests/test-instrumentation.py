@@ -0,0 +1,34 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+from typing import Any, Dict
+import unittest
+
+from kwnlp_preprocessor import instrumentation
+
+
+def _parse(name: str) -> Dict[str, Any]:
+    with instrumentation.measure_worker(name) as metrics:
+        for _ in range(3):
+            metrics["rows"] += 1
+    return metrics
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_measure_stage(self) -> None:
+        with instrumentation.measure_stage() as metrics:
+            instrumentation.add_count("pages", 2)
+            instrumentation.record_workers([_parse("a"), _parse("b")], "entities")
+        self.assertEqual(metrics["counters"], {"pages": 2, "entities": 6})
+        self.assertEqual([worker["name"] for worker in metrics["workers"]], ["a", "b"])
+        self.assertGreater(metrics["peak_rss_bytes"], 0)
+        self.assertGreaterEqual(metrics["wall_seconds"], 0.0)
+
+    def test_path_sizes(self) -> None:
+        with TemporaryDirectory() as data_path:
+            os.makedirs(os.path.join(data_path, "chunks"))
+            for name in ["a.csv", "b.csv"]:
+                with open(os.path.join(data_path, "chunks", name), "w") as fp:
+                    fp.write("abc\n")
+            sizes = instrumentation.get_path_sizes(data_path, ["chunks/", "missing.csv"])
+        self.assertEqual(sizes, {"bytes": 8, "files": 2})
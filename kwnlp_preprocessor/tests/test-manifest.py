@@ -0,0 +1,128 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from kwnlp_preprocessor import manifest, scheduler
+
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w") as fp:
+        fp.write(text)
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.data_path = self.tmpdir.name
+        os.makedirs(os.path.join(self.data_path, "in"))
+        os.makedirs(os.path.join(self.data_path, "out"))
+        _write(os.path.join(self.data_path, "in", "a.csv"), "a\n1\n")
+        _write(os.path.join(self.data_path, "out", "b.csv"), "b\n1\n")
+        self.stage = scheduler.Stage(
+            "task_x",
+            "task_x",
+            {"wiki": "enwiki", "workers": 3},
+            ["in/"],
+            ["out/b.csv"],
+            1,
+            frozenset(),
+        )
+        self.manifest = manifest.load_manifest(self.data_path)
+        fingerprint = manifest.get_fingerprint(self.stage, self.data_path, self.manifest)
+        manifest.record_stage(self.stage, self.data_path, self.manifest, fingerprint)
+        manifest.save_manifest(self.manifest, self.data_path)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _is_up_to_date(self, stage: scheduler.Stage) -> bool:
+        run_manifest = manifest.load_manifest(self.data_path)
+        fingerprint = manifest.get_fingerprint(stage, self.data_path, run_manifest)
+        return manifest.is_up_to_date(stage, self.data_path, run_manifest, fingerprint)
+
+    def test_unchanged(self) -> None:
+        self.assertTrue(self._is_up_to_date(self.stage))
+
+    def test_rewritten_with_same_content(self) -> None:
+        _write(os.path.join(self.data_path, "in", "a.csv"), "a\n1\n")
+        self.assertTrue(self._is_up_to_date(self.stage))
+
+    def test_workers_not_fingerprinted(self) -> None:
+        stage = self.stage._replace(kwargs={"wiki": "enwiki", "workers": 7})
+        self.assertTrue(self._is_up_to_date(stage))
+
+    def test_pipeline_readers_not_fingerprinted(self) -> None:
+        stage = self.stage._replace(kwargs={"wiki": "enwiki", "workers": 3, "pipeline_readers": 4})
+        self.assertTrue(self._is_up_to_date(stage))
+
+    def test_changed_input(self) -> None:
+        _write(os.path.join(self.data_path, "in", "a.csv"), "a\n2\n")
+        self.assertFalse(self._is_up_to_date(self.stage))
+
+    def test_new_input_file(self) -> None:
+        _write(os.path.join(self.data_path, "in", "c.csv"), "c\n")
+        self.assertFalse(self._is_up_to_date(self.stage))
+
+    def test_changed_param(self) -> None:
+        stage = self.stage._replace(kwargs={"wiki": "dewiki", "workers": 3})
+        self.assertFalse(self._is_up_to_date(stage))
+
+    def test_changed_spec_file(self) -> None:
+        spec_path = os.path.join(self.data_path, "spec.json")
+        _write(spec_path, '{"tables": []}')
+        stage = self.stage._replace(kwargs={"wiki": "enwiki", "extraction_spec": spec_path})
+        run_manifest = manifest.load_manifest(self.data_path)
+        fingerprint = manifest.get_fingerprint(stage, self.data_path, run_manifest)
+        manifest.record_stage(stage, self.data_path, run_manifest, fingerprint)
+        manifest.save_manifest(run_manifest, self.data_path)
+        self.assertTrue(self._is_up_to_date(stage))
+        _write(spec_path, '{"tables": [{"name": "label", "kind": "labels", "languages": ["fr"]}]}')
+        self.assertFalse(self._is_up_to_date(stage))
+
+    def test_relative_spec_file(self) -> None:
+        # the spec is relative to the working directory, not to data_path
+        cwd = os.getcwd()
+        with TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                _write("spec.json", '{"tables": []}')
+                stage = self.stage._replace(
+                    kwargs={"wiki": "enwiki", "extraction_spec": "spec.json"}
+                )
+                run_manifest = manifest.load_manifest(self.data_path)
+                fingerprint = manifest.get_fingerprint(stage, self.data_path, run_manifest)
+                _write("spec.json", '{"tables": [{"name": "label", "kind": "labels"}]}')
+                self.assertNotEqual(
+                    manifest.get_fingerprint(stage, self.data_path, run_manifest), fingerprint
+                )
+            finally:
+                os.chdir(cwd)
+
+    def test_wiki_stage_ignores_other_wikis(self) -> None:
+        _write(os.path.join(self.data_path, "in", "enwiki-a.csv"), "a\n1\n")
+        stage = self.stage._replace(name="task_x_enwiki", wiki="enwiki")
+        run_manifest = manifest.load_manifest(self.data_path)
+        fingerprint = manifest.get_fingerprint(stage, self.data_path, run_manifest)
+        manifest.record_stage(stage, self.data_path, run_manifest, fingerprint)
+        manifest.save_manifest(run_manifest, self.data_path)
+        _write(os.path.join(self.data_path, "in", "kwnlp-dewiki-a.csv"), "a\n2\n")
+        _write(os.path.join(self.data_path, "out", "kwnlp-dewiki-b.csv"), "b\n2\n")
+        self.assertTrue(self._is_up_to_date(stage))
+        _write(os.path.join(self.data_path, "in", "kwnlp-enwiki-b.csv"), "b\n2\n")
+        self.assertFalse(self._is_up_to_date(stage))
+
+    def test_missing_output(self) -> None:
+        os.remove(os.path.join(self.data_path, "out", "b.csv"))
+        self.assertFalse(self._is_up_to_date(self.stage))
+
+    def test_force_cascades(self) -> None:
+        stages = [
+            scheduler.Stage("task_01p1_a", "a", {}, [], [], 1, frozenset()),
+            scheduler.Stage("task_02p1_b", "b", {}, [], [], 1, frozenset(["task_01p1_a"])),
+            scheduler.Stage("task_03p1_c", "c", {}, [], [], 1, frozenset(["task_02p1_b"])),
+            scheduler.Stage("task_03p2_d", "d", {}, [], [], 1, frozenset()),
+        ]
+        self.assertEqual(
+            scheduler.get_downstream(stages, ["task_02p1"]), set(["task_02p1_b", "task_03p1_c"])
+        )
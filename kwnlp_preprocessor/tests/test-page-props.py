@@ -0,0 +1,43 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import unittest
+
+import pandas as pd
+
+from kwnlp_preprocessor import task_06p1_create_kwnlp_page_props
+
+
+class TestPivotPageProps(unittest.TestCase):
+    def setUp(self) -> None:
+        self.df_pp = pd.DataFrame(
+            {
+                "pp_page": [1, 1, 2, 3, 3, 3],
+                "pp_propname": ["a", "b", "b", "a", "b", "c"],
+                "pp_value": ["x1", "y1", "y2", "x3", "y3", "z3"],
+            }
+        )
+
+    def _pivot(self, chunk_rows: int) -> pd.DataFrame:
+        df_chunks = [
+            self.df_pp.iloc[ii : ii + chunk_rows] for ii in range(0, len(self.df_pp), chunk_rows)
+        ]
+        return pd.concat(
+            task_06p1_create_kwnlp_page_props.pivot_page_props(df_chunks, ["a", "b"]),
+            ignore_index=True,
+        )
+
+    def test_pivot(self) -> None:
+        for chunk_rows in [1, 2, 4, 100]:
+            df = self._pivot(chunk_rows)
+            self.assertEqual(list(df.columns), ["page_id", "a", "b"])
+            self.assertEqual(df["page_id"].tolist(), [1, 2, 3])
+            self.assertEqual(df["a"].fillna("").tolist(), ["x1", "", "x3"])
+            self.assertEqual(df["b"].tolist(), ["y1", "y2", "y3"])
+
+    def test_unordered_pages(self) -> None:
+        self.df_pp = self.df_pp.iloc[::-1]
+        with self.assertRaises(ValueError):
+            self._pivot(2)
+
+
+if __name__ == "__main__":
+    unittest.main()
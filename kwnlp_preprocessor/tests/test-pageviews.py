@@ -0,0 +1,112 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import bz2
+import datetime
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+import numpy as np
+
+from kwnlp_preprocessor import pageview_cache
+from kwnlp_preprocessor import task_03p1_create_kwnlp_pagecounts as pagecounts
+
+
+class TestPageviewWindow(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wp_date = datetime.date(2021, 3, 1)
+
+    def test_prior_month(self) -> None:
+        dates = pagecounts._get_window_dates(self.wp_date, "prior-month")
+        self.assertEqual(len(dates), 28)
+        self.assertEqual(dates[0], datetime.date(2021, 2, 1))
+        self.assertEqual(dates[-1], datetime.date(2021, 2, 28))
+
+    def test_last_n_days(self) -> None:
+        dates = pagecounts._get_window_dates(self.wp_date, "last-90-days")
+        self.assertEqual(len(dates), 90)
+        self.assertEqual(dates[0], datetime.date(2020, 12, 1))
+        self.assertEqual(dates[-1], datetime.date(2021, 2, 28))
+
+    def test_range(self) -> None:
+        dates = pagecounts._get_window_dates(self.wp_date, "20201230-20210102")
+        self.assertEqual(
+            dates,
+            [
+                datetime.date(2020, 12, 30),
+                datetime.date(2020, 12, 31),
+                datetime.date(2021, 1, 1),
+                datetime.date(2021, 1, 2),
+            ],
+        )
+
+    def test_bad_window(self) -> None:
+        for window in ["last-month", "20210102-20201230"]:
+            with self.assertRaises(ValueError):
+                pagecounts._get_window_dates(self.wp_date, window)
+
+
+class TestViewsByPageId(unittest.TestCase):
+    def test_add_views_by_page_id(self) -> None:
+        page_ids = np.zeros(0, dtype=np.int64)
+        views = np.zeros(0, dtype=np.int64)
+        days = [([12, -1, 7], [5, 100, 1]), ([7, 3, -1, 12], [2, 4, 100, 1])]
+        for day_page_ids, day_views in days:
+            page_ids, views = pagecounts._add_views_by_page_id(
+                page_ids, views, np.array(day_page_ids, dtype=np.int32), np.array(day_views)
+            )
+        self.assertEqual(page_ids.tolist(), [3, 7, 12])
+        self.assertEqual(views.tolist(), [4, 3, 6])
+
+
+class TestCountDayPageviews(unittest.TestCase):
+    def test_wikis_in_one_pass(self) -> None:
+        lines = [
+            "en.wikipedia Anarchism 12 desktop 3 A3",
+            "de.wikipedia Anarchismus 7 desktop 2 A2",
+            "fr.wikipedia Anarchisme 5 desktop 9 A9",
+            "en.wikipedia Anarchism null mobile-app 1 A1",
+            "de.wikipedia Anarchismus 7 mobile-web 4 A4",
+        ]
+        with TemporaryDirectory() as tmpdir:
+            in_file_path = os.path.join(tmpdir, "pageviews-20210201-user.bz2")
+            with bz2.open(in_file_path, "wt") as fp:
+                fp.write("".join(f"{line}\n" for line in lines))
+            cache_file_paths = {
+                "en.wikipedia": os.path.join(tmpdir, "enwiki.npz"),
+                "de.wikipedia": os.path.join(tmpdir, "dewiki.npz"),
+            }
+            pagecounts.count_day_pageviews(
+                {"in_file_path": in_file_path, "cache_file_paths": cache_file_paths}
+            )
+            titles, views, page_ids = pageview_cache.read_day(cache_file_paths["en.wikipedia"])
+            self.assertEqual(
+                (titles, views.tolist(), page_ids.tolist()), (["Anarchism"], [4], [12])
+            )
+            titles, views, page_ids = pageview_cache.read_day(cache_file_paths["de.wikipedia"])
+            self.assertEqual(
+                (titles, views.tolist(), page_ids.tolist()), (["Anarchismus"], [6], [7])
+            )
+
+
+class TestPageviewCache(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        with TemporaryDirectory() as tmpdir:
+            cache_dir = pageview_cache.get_cache_dir(tmpdir, "enwiki")
+            file_path = pageview_cache.get_day_path(cache_dir, datetime.date(2021, 2, 1))
+            titles = ["Zebra", "Éowyn", "Anarchism"]
+            pageview_cache.write_day(file_path, titles, [3, 1, 2], [7, -1, 12])
+            self.assertEqual(os.listdir(cache_dir), [os.path.basename(file_path)])
+            read_titles, read_views, read_page_ids = pageview_cache.read_day(file_path)
+            self.assertEqual(read_titles, titles)
+            self.assertEqual(read_views.tolist(), [3, 1, 2])
+            self.assertEqual(read_page_ids.tolist(), [7, -1, 12])
+
+            pageview_cache.write_day(file_path, [], [], [])
+            read_titles, read_views, read_page_ids = pageview_cache.read_day(file_path)
+            self.assertEqual(read_titles, [])
+            self.assertEqual(read_views.tolist(), [])
+            self.assertEqual(read_page_ids.tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
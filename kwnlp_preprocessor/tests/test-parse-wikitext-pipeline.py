@@ -0,0 +1,54 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+from typing import Any, Dict
+import unittest
+
+from kwnlp_preprocessor import task_27p1_parse_wikitext, title_index, utils
+
+
+class TestChunkWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.args: Dict[str, Any] = {
+            "wikitext_file_path": os.path.join(self.tmpdir.name, "pages-articles1.xml.bz2"),
+            "title_index_path": os.path.join(self.tmpdir.name, "title-index"),
+            "checkpoint_file_path": os.path.join(self.tmpdir.name, "checkpoints", "chunk.done"),
+            "max_entities": 10,
+            "chunk_codec": "none",
+        }
+        for key in task_27p1_parse_wikitext.OUT_FILE_KEYS:
+            self.args[key] = os.path.join(self.tmpdir.name, f"{key}.csv")
+        title_index.write_title_index(self.args["title_index_path"], ["Frodo"], [1])
+        with open(self.args["wikitext_file_path"], "w") as fp:
+            fp.write("xml")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_pages_written_in_order(self) -> None:
+        num_outputs = len(task_27p1_parse_wikitext.OUT_FILE_KEYS)
+        chunk_writer = task_27p1_parse_wikitext._ChunkWriter(self.args)
+        for page_idx in [2, 0, 3, 1]:
+            chunk_writer.add_page(page_idx, [f"{page_idx}\n"] * num_outputs)
+            self.assertFalse(chunk_writer.is_complete())
+        chunk_writer.num_pages = 4
+        self.assertTrue(chunk_writer.is_complete())
+        chunk_writer.close()
+
+        out_file_paths = task_27p1_parse_wikitext._get_out_file_paths(self.args)
+        for out_file_path in out_file_paths:
+            with open(out_file_path) as fp:
+                self.assertEqual(fp.read(), "0\n1\n2\n3\n")
+        self.assertTrue(
+            utils.is_chunk_complete(
+                self.args["checkpoint_file_path"],
+                self.args,
+                task_27p1_parse_wikitext._get_in_file_paths(self.args),
+                out_file_paths,
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
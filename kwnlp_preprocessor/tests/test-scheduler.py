@@ -0,0 +1,117 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import unittest
+
+from kwnlp_preprocessor import run_all_tasks, scheduler
+
+
+class TestBuildStages(unittest.TestCase):
+    def setUp(self) -> None:
+        self.params = {
+            "wp_yyyymmdd": "20210701",
+            "wd_yyyymmdd": "20210705",
+            "data_path": "",
+            "wiki": "enwiki",
+            "workers": 8,
+            "max_entities": 10,
+            "table_format": "csv",
+        }
+        module_names = [task.__name__ for task in run_all_tasks.TASKS]
+        stages = scheduler.build_stages(module_names, self.params, cpu_budget=4)
+        self.stages = {stage.name: stage for stage in stages}
+
+    def test_dependencies(self) -> None:
+        deps = {name: stage.deps for name, stage in self.stages.items()}
+        self.assertEqual(deps["task_00_download_raw_dumps"], frozenset())
+        self.assertEqual(
+            deps["task_18p1_filter_wikidata_dump"],
+            frozenset(["task_15p1_split_and_compress_wikidata"]),
+        )
+        self.assertEqual(
+            deps["task_15p1_split_and_compress_wikidata"],
+            frozenset(["task_00_download_raw_dumps"]),
+        )
+        for name in [
+            "task_36p1_collect_template_data",
+            "task_36p2_collect_length_data",
+            "task_42p1_collect_section_names",
+        ]:
+            self.assertEqual(deps[name], frozenset(["task_27p1_parse_wikitext"]))
+        self.assertEqual(
+            deps["task_24p1_create_kwnlp_article_pre"],
+            frozenset(
+                [
+                    "task_03p1_create_kwnlp_pagecounts",
+                    "task_06p1_create_kwnlp_page_props",
+                    "task_06p2_create_kwnlp_redirect_it2",
+                    "task_12p1_create_kwnlp_title_mapper",
+                    "task_21p1_gather_wikidata_chunks",
+                ]
+            ),
+        )
+
+    def test_kwargs_and_cpus(self) -> None:
+        stage = self.stages["task_27p1_parse_wikitext"]
+        self.assertEqual(stage.cpus, 4)
+        self.assertNotIn("wd_yyyymmdd", stage.kwargs)
+        self.assertEqual(stage.kwargs["workers"], 8)
+        self.assertEqual(self.stages["task_09p1_create_kwnlp_ultimate_redirect"].cpus, 1)
+
+    def test_multi_wiki(self) -> None:
+        module_names = [task.__name__ for task in run_all_tasks.TASKS]
+        params = dict(self.params, wikis=["enwiki", "dewiki"])
+        stages = {
+            stage.name: stage
+            for stage in scheduler.build_stages(module_names, params, cpu_budget=4)
+        }
+        # wikidata and pageviews are read once for all wikis
+        for name in ["task_03p1_create_kwnlp_pagecounts", "task_18p1_filter_wikidata_dump"]:
+            self.assertEqual(stages[name].kwargs["wikis"], ["enwiki", "dewiki"])
+            self.assertNotIn("wiki", stages[name].kwargs)
+        self.assertIn(
+            "wikidata-derived-20210705/dewiki-article-chunks/",
+            stages["task_18p1_filter_wikidata_dump"].outputs,
+        )
+        self.assertNotIn("task_27p1_parse_wikitext", stages)
+        stage = stages["task_24p1_create_kwnlp_article_pre_dewiki"]
+        self.assertEqual((stage.wiki, stage.kwargs["wiki"]), ("dewiki", "dewiki"))
+        self.assertEqual(
+            stage.deps,
+            frozenset(
+                [
+                    "task_03p1_create_kwnlp_pagecounts",
+                    "task_06p1_create_kwnlp_page_props_dewiki",
+                    "task_06p2_create_kwnlp_redirect_it2_dewiki",
+                    "task_12p1_create_kwnlp_title_mapper_dewiki",
+                    "task_21p1_gather_wikidata_chunks",
+                ]
+            ),
+        )
+        # shared chunk directories do not make wikis depend on each other
+        self.assertEqual(
+            stages["task_36p1_collect_template_data_enwiki"].deps,
+            frozenset(["task_27p1_parse_wikitext_enwiki"]),
+        )
+        self.assertEqual(
+            scheduler.get_downstream(list(stages.values()), ["task_27p1"]),
+            set(
+                f"{name}_{wiki}"
+                for name in [
+                    "task_27p1_parse_wikitext",
+                    "task_30p1_post_process_link_chunks",
+                    "task_33p1_collect_post_processed_link_data",
+                    "task_36p1_collect_template_data",
+                    "task_36p2_collect_length_data",
+                    "task_39p1_create_kwnlp_article",
+                    "task_42p1_collect_section_names",
+                ]
+                for wiki in ["enwiki", "dewiki"]
+            ),
+        )
+
+    def test_cycle_detection(self) -> None:
+        stages = [
+            scheduler.Stage("a", "a", {}, [], [], 1, frozenset(["b"])),
+            scheduler.Stage("b", "b", {}, [], [], 1, frozenset(["a"])),
+        ]
+        with self.assertRaises(ValueError):
+            scheduler._check_acyclic(stages)
@@ -0,0 +1,33 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from kwnlp_preprocessor import task_03p2_convert_sql_to_csv
+
+
+class TestSplitConversion(unittest.TestCase):
+    def test_split_matches_serial(self) -> None:
+        in_file_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data",
+            "inputs",
+            "wikipedia-raw-20210701",
+            "redirecttable",
+            "enwiki-20210701-redirect.sql.gz",
+        )
+        with TemporaryDirectory() as tmpdir:
+            contents = []
+            for workers in [1, 2]:
+                out_file_path = os.path.join(tmpdir, f"redirect-{workers}.csv")
+                task_03p2_convert_sql_to_csv.convert_table(
+                    "redirect", in_file_path, out_file_path, workers=workers
+                )
+                with open(out_file_path) as fp:
+                    contents.append(fp.read())
+        self.assertEqual(contents[0], contents[1])
+        self.assertTrue(contents[0].startswith("rd_from,rd_title\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+from typing import List
+import unittest
+
+import pandas as pd
+
+from kwnlp_preprocessor import table_io
+
+
+class TestTableIO(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _write_chunks(self, contents: List[str]) -> List[str]:
+        paths = []
+        for ii, content in enumerate(contents):
+            path = os.path.join(self.tmpdir.name, f"chunk-{ii}.csv")
+            with open(path, "w") as fp:
+                fp.write(content)
+            paths.append(path)
+        return paths
+
+    def test_round_trip(self) -> None:
+        df = pd.DataFrame({"page_id": [3, 1], "page_title": ["B", ""]}).set_index("page_id")
+        for table_format in table_io.TABLE_FORMATS:
+            file_path = os.path.join(self.tmpdir.name, f"table.{table_format}")
+            table_io.write_table(df, file_path, index=True)
+            df_read = table_io.read_table(file_path, keep_default_na=False)
+            self.assertEqual(list(df_read.columns), ["page_id", "page_title"])
+            self.assertEqual(df_read["page_id"].tolist(), [3, 1])
+            self.assertEqual(df_read["page_title"].tolist(), ["B", ""])
+            df_read = table_io.read_table(file_path, columns=["page_title"])
+            self.assertEqual(list(df_read.columns), ["page_title"])
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            table_io.write_table(pd.DataFrame(), os.path.join(self.tmpdir.name, "table.tsv"))
+
+    def test_gather_column_types(self) -> None:
+        # the title column looks like ints in the first chunk
+        paths = self._write_chunks(
+            ["page_id,title,views\n1,1984,2\n", "", "page_id,title,views\n2,Anarchism,3.5\n"]
+        )
+        column_types = {"page_id": "int64", "title": "string", "views": "float64"}
+        for table_format in ["parquet", "feather"]:
+            file_path = os.path.join(self.tmpdir.name, "out", f"gathered.{table_format}")
+            num_rows = table_io.gather_tables(paths, file_path, column_types)
+            self.assertEqual(num_rows, 2)
+            df = table_io.read_table(file_path)
+            self.assertEqual(df["page_id"].tolist(), [1, 2])
+            self.assertEqual(df["title"].tolist(), ["1984", "Anarchism"])
+            self.assertEqual(df["views"].tolist(), [2.0, 3.5])
+
+            table_io.gather_tables(paths, file_path, column_types, columns=["views", "page_id"])
+            self.assertEqual(list(table_io.read_table(file_path).columns), ["views", "page_id"])
+
+            # no chunks still gives a typed table
+            table_io.gather_tables([], file_path, column_types)
+            df = table_io.read_table(file_path)
+            self.assertEqual(list(df.columns), ["page_id", "title", "views"])
+            self.assertEqual(len(df), 0)
+
+            with self.assertRaises(ValueError):
+                table_io.gather_tables(paths, file_path, {"page_id": "int64"}, columns=["title"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+import numpy as np
+
+from kwnlp_preprocessor import title_dictionary
+
+
+class TestTitleDictionary(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "titles.npz")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self) -> None:
+        title_dictionary.write_title_dictionary(
+            self.file_path, ["Gandalf", "Éowyn", "1984"], [53221, 8, 7]
+        )
+        titles = title_dictionary.read_title_dictionary(self.file_path)
+        self.assertEqual(len(titles), 3)
+        codes = titles.encode(["1984", "Sauron", "Gandalf"])
+        self.assertEqual(codes.tolist(), [2, -1, 0])
+        self.assertEqual(titles.page_ids[codes[[0, 2]]].tolist(), [7, 53221])
+        codes = titles.encode_page_ids(np.array([8, 9, 7]))
+        self.assertEqual(codes.tolist(), [1, -1, 2])
+        self.assertEqual(titles.decode(codes[[0, 2]]).tolist(), ["Éowyn", "1984"])
+        with self.assertRaises(ValueError):
+            titles.decode(codes)
+
+    def test_empty(self) -> None:
+        title_dictionary.write_title_dictionary(self.file_path, [], [])
+        titles = title_dictionary.read_title_dictionary(self.file_path)
+        self.assertEqual(len(titles), 0)
+        self.assertEqual(titles.encode(["Gandalf"]).tolist(), [-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
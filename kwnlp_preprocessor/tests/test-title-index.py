@@ -0,0 +1,41 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+from tempfile import TemporaryDirectory
+from typing import Sequence
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from kwnlp_preprocessor import title_index
+
+
+class TestTitleIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.titles = ["Gandalf", "Frodo_Baggins", "Null", "Éowyn", "Gandalf_the_Grey"]
+        self.target_ids = [53221, 10583, 7, 8, 53221]
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_lookup(self) -> None:
+        title_index.write_title_index(self.tmpdir.name, self.titles, self.target_ids)
+        index = title_index.TitleIndex(self.tmpdir.name)
+        self.assertEqual(len(index), 5)
+        for title, target_id in zip(self.titles, self.target_ids):
+            self.assertEqual(index.get(title), target_id)
+        self.assertEqual(index.get("Sauron"), -1)
+        self.assertEqual(index.get_many(["Éowyn", "Sauron", "Gandalf"]).tolist(), [8, -1, 53221])
+        self.assertEqual(index.get_many([]).tolist(), [])
+
+    def test_collisions(self) -> None:
+        def bad_hash(titles: Sequence[str]) -> np.ndarray:
+            return np.array([ord(title[0]) for title in titles], dtype=np.uint64)
+
+        with mock.patch.object(title_index, "_hash_titles", bad_hash):
+            title_index.write_title_index(self.tmpdir.name, self.titles, self.target_ids)
+            index = title_index.TitleIndex(self.tmpdir.name)
+            self.assertEqual(index.collisions, {"Gandalf": 53221, "Gandalf_the_Grey": 53221})
+            for title, target_id in zip(self.titles, self.target_ids):
+                self.assertEqual(index.get(title), target_id)
+            self.assertEqual(index.get("Galadriel"), -1)
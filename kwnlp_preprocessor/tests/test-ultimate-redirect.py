@@ -0,0 +1,36 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import unittest
+
+import numpy as np
+
+from kwnlp_preprocessor import task_09p1_create_kwnlp_ultimate_redirect as ultimate_redirect
+
+
+class TestUltimateRedirect(unittest.TestCase):
+    def test_get_ultimate_rows(self) -> None:
+        # 1->2->3->4->5->100 is a chain, 6->6 is a self redirect,
+        # 7->8->7 is a circular pair and 9->7 leads into it.
+        redirects = [
+            (5, 100),
+            (1, 2),
+            (2, 3),
+            (3, 4),
+            (4, 5),
+            (6, 6),
+            (7, 8),
+            (8, 7),
+            (9, 7),
+            (10, 200),
+        ]
+        source_ids = np.array([source_id for source_id, _ in redirects])
+        target_ids = np.array([target_id for _, target_id in redirects])
+        ultimate_rows = ultimate_redirect.get_ultimate_rows(source_ids, target_ids)
+        self.assertEqual(ultimate_rows.tolist(), [0, 0, 0, 0, 0, -1, -1, -1, -1, 9])
+
+    def test_get_ultimate_rows_empty(self) -> None:
+        empty = np.array([], dtype=np.int64)
+        self.assertEqual(ultimate_redirect.get_ultimate_rows(empty, empty).tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
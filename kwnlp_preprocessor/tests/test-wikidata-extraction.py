@@ -0,0 +1,140 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+import bz2
+import json
+import os
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List
+import unittest
+
+from kwnlp_preprocessor import task_18p1_filter_wikidata_dump, wikidata_extraction
+
+WD = "20210705"
+
+
+def _claim(property_id: str, target: int, rank: str = "normal") -> Dict:
+    mainsnak = {
+        "snaktype": "value",
+        "property": property_id,
+        "datatype": "wikibase-item",
+        "datavalue": {
+            "value": {"entity-type": "item", "numeric-id": target, "id": f"Q{target}"},
+            "type": "wikibase-entityid",
+        },
+    }
+    return {"mainsnak": mainsnak, "type": "statement", "id": f"Q1${target}", "rank": rank}
+
+
+ENTITIES: List[Dict] = [
+    {
+        "type": "item",
+        "id": "Q1",
+        "labels": {
+            "en": {"language": "en", "value": "Gandalf"},
+            "fr": {"language": "fr", "value": "Gandalf le Gris"},
+        },
+        "descriptions": {"de": {"language": "de", "value": "Zauberer"}},
+        "aliases": {"fr": [{"language": "fr", "value": "Mithrandir"}]},
+        "claims": {
+            "P17": [_claim("P17", 3), _claim("P17", 4, rank="preferred")],
+            "P31": [_claim("P31", 5)],
+        },
+        "sitelinks": {
+            "enwiki": {"site": "enwiki", "title": "Gandalf"},
+            "frwiki": {"site": "frwiki", "title": "Gandalf (Tolkien)"},
+        },
+    },
+    {
+        "type": "property",
+        "id": "P17",
+        "labels": {"fr": {"language": "fr", "value": "pays"}},
+        "descriptions": [],
+        "aliases": [],
+        "claims": {},
+    },
+]
+
+SPEC: Dict[str, Any] = {
+    "tables": [
+        {"name": "label", "kind": "labels", "languages": ["fr", "de", "es"]},
+        {
+            "name": "property-label",
+            "kind": "labels",
+            "entity_type": "property",
+            "languages": ["fr"],
+        },
+        {"name": "alias", "kind": "aliases", "languages": ["fr"]},
+        {"name": "country", "kind": "claims", "properties": ["P17"]},
+        {"name": "truthy-country", "kind": "claims", "properties": ["P17"], "truthy": True},
+        {"name": "sitelink", "kind": "sitelinks", "wikis": ["frwiki", "dewiki"]},
+    ]
+}
+
+
+class TestWikidataExtraction(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_parse_spec(self) -> None:
+        tables = wikidata_extraction.parse_spec(SPEC)
+        self.assertEqual(
+            [table.sample for table in tables][:2], ["spec-label", "spec-property-label"]
+        )
+        self.assertEqual(tables[1].columns, ["property_id", "lang", "label", "description"])
+        self.assertEqual(tables[4].properties, ("P17",))
+
+        invalid_tables = [
+            {"name": "Label", "kind": "labels", "languages": ["fr"]},
+            {"name": "label", "kind": "label", "languages": ["fr"]},
+            {"name": "label", "kind": "labels"},
+            {"name": "label", "kind": "labels", "languages": ["fr"], "wikis": ["frwiki"]},
+            {"name": "label", "kind": "labels", "languages": ["fr"], "truthy": True},
+            {"name": "label", "kind": "labels", "languages": ["fr"], "lang": "fr"},
+            {"name": "country", "kind": "claims", "properties": ["17"]},
+            {"name": "sitelink", "kind": "sitelinks", "entity_type": "property", "wikis": ["x"]},
+        ]
+        for table in invalid_tables:
+            with self.assertRaises(ValueError):
+                wikidata_extraction.parse_spec({"tables": [table]})
+        with self.assertRaises(ValueError):
+            wikidata_extraction.parse_spec({"tables": [SPEC["tables"][0]] * 2})
+
+    def test_parse_file(self) -> None:
+        chunk_path = os.path.join(self.tmpdir.name, "chunk.jsonl.bz2")
+        with bz2.open(chunk_path, "wt") as fp:
+            fp.write("".join(f"{json.dumps(entity)}\n" for entity in ENTITIES))
+        tables = wikidata_extraction.parse_spec(SPEC)
+        args = {
+            "wikis": ["enwiki"],
+            "data_path": self.tmpdir.name,
+            "wd_yyyymmdd": WD,
+            "wikidata_file_path": chunk_path,
+            "out_file_base": f"wikidata-{WD}-chunk-0000",
+            "max_entities": 100,
+            "include_item_statements": False,
+            "extraction_spec": [dict(table._asdict()) for table in tables],
+        }
+        task_18p1_filter_wikidata_dump.parse_file(args)
+        out_file_paths = task_18p1_filter_wikidata_dump._get_out_file_paths(args)
+
+        expected = {
+            "spec-label": [
+                "item_id,lang,label,description",
+                "1,fr,Gandalf le Gris,",
+                "1,de,,Zauberer",
+            ],
+            "spec-property-label": ["property_id,lang,label,description", "17,fr,pays,"],
+            "spec-alias": ["item_id,lang,alias", "1,fr,Mithrandir"],
+            "spec-country": ["source_id,property_id,target_id,rnk", "1,17,3,1", "1,17,4,0"],
+            "spec-truthy-country": ["source_id,property_id,target_id,rnk", "1,17,4,0"],
+            "spec-sitelink": ["item_id,wiki,title", "1,frwiki,Gandalf (Tolkien)"],
+        }
+        for sample, lines in expected.items():
+            with open(out_file_paths[sample]) as fp:
+                self.assertEqual(fp.read().splitlines(), lines, sample)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Dictionary encoding of the page titles of one dump.
+
+Each page title gets a dense integer code (its row in the page table). Tasks
+join and carry these codes instead of title strings and only decode them when
+they write their output. The dictionary is written by task 06p2 as a .npz
+file with,
+
+* titles: page titles joined with newlines as utf-8 bytes (uint8)
+* page_ids: page id of each title (int32), aligned with titles
+"""
+import logging
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def write_title_dictionary(file_path: str, titles: Sequence[str], page_ids: Sequence[int]) -> None:
+    """Atomically write a title dictionary. Titles must be unique."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    titles_blob = "\n".join(titles).encode("utf-8")
+    tmp_file_path = f"{file_path}.tmp.npz"
+    np.savez(
+        tmp_file_path,
+        titles=np.frombuffer(titles_blob, dtype=np.uint8),
+        page_ids=np.array(page_ids, dtype=np.int32),
+    )
+    os.replace(tmp_file_path, file_path)
+
+
+def read_title_dictionary(file_path: str) -> "TitleDictionary":
+    with np.load(file_path) as npz:
+        titles_blob = npz["titles"].tobytes()
+        page_ids = npz["page_ids"]
+    titles = titles_blob.decode("utf-8").split("\n") if len(page_ids) > 0 else []
+    return TitleDictionary(titles, page_ids)
+
+
+class TitleDictionary:
+    """Map page titles and page ids to codes and codes back to titles.
+
+    Lookups of titles or page ids that are not in the dictionary return -1.
+    """
+
+    def __init__(self, titles: Sequence[str], page_ids: Sequence[int]):
+        self.titles = np.array(titles, dtype=object)
+        self.page_ids = np.asarray(page_ids, dtype=np.int64)
+        self._title_codes: Optional[pd.Index] = None
+        self._page_id_codes: Optional[pd.Index] = None
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def encode(self, titles: Sequence[str]) -> np.ndarray:
+        """Return the code of each title."""
+        if self._title_codes is None:
+            self._title_codes = pd.Index(self.titles)
+        return self._title_codes.get_indexer(titles)
+
+    def encode_page_ids(self, page_ids: Sequence[int]) -> np.ndarray:
+        """Return the code of the title of each page id."""
+        if self._page_id_codes is None:
+            self._page_id_codes = pd.Index(self.page_ids)
+        return self._page_id_codes.get_indexer(page_ids)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Return the title of each code. Raise ValueError for codes not in the dictionary."""
+        codes = np.asarray(codes)
+        # -1 (not in the dictionary) would otherwise index the last title
+        num_missing = int((codes < 0).sum())
+        if num_missing > 0:
+            raise ValueError(f"{num_missing} of {len(codes)} codes are not in the dictionary")
+        return self.titles[codes]
@@ -0,0 +1,110 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Compact on disk title to page id index.
+
+The index is a directory with two numpy arrays,
+
+* hashes.npy: sorted 64 bit hashes of page titles (uint64)
+* target_ids.npy: the page id each title maps to (int32), aligned with hashes
+
+Lookups hash the title and binary search the sorted hashes. The arrays are
+opened with mmap so every process that opens the index shares one copy
+through the page cache instead of building its own dict of every title.
+
+Titles whose hashes collide are left out of the arrays and stored in
+collisions.json instead. A title that is not in the index can still match
+the hash of one that is but with 64 bit hashes and tens of millions of
+titles the chance of that for any single lookup is about 1e-12.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+HASHES_FILE_NAME = "hashes.npy"
+TARGET_IDS_FILE_NAME = "target_ids.npy"
+COLLISIONS_FILE_NAME = "collisions.json"
+
+
+def _hash_titles(titles: Sequence[str]) -> np.ndarray:
+    digests = b"".join(
+        hashlib.blake2b(title.encode("utf-8"), digest_size=8).digest() for title in titles
+    )
+    return np.frombuffer(digests, dtype="<u8").astype(np.uint64)
+
+
+def write_title_index(dir_path: str, titles: Sequence[str], target_ids: Sequence[int]) -> None:
+    """Write a title index.
+
+    Args:
+        dir_path: directory to write the index files to
+        titles: page titles. if a title is repeated the last target id is used.
+        target_ids: page id for each title
+    """
+    # keep the last target id for repeated titles (same as building a dict)
+    title_to_id: Dict[str, int] = dict(zip(titles, target_ids))
+    unique_titles = list(title_to_id.keys())
+    hashes = _hash_titles(unique_titles)
+    ids = np.array(list(title_to_id.values()), dtype=np.int32)
+
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    ids = ids[order]
+
+    # set aside titles with colliding hashes
+    is_collision = np.zeros(len(hashes), dtype=bool)
+    if len(hashes) > 1:
+        same_as_next = hashes[1:] == hashes[:-1]
+        is_collision[1:] |= same_as_next
+        is_collision[:-1] |= same_as_next
+    collisions = {
+        unique_titles[title_idx]: int(target_id)
+        for title_idx, target_id in zip(order[is_collision], ids[is_collision])
+    }
+    if collisions:
+        logger.info(f"{len(collisions)} titles with colliding hashes")
+
+    os.makedirs(dir_path, exist_ok=True)
+    np.save(os.path.join(dir_path, HASHES_FILE_NAME), hashes[~is_collision])
+    np.save(os.path.join(dir_path, TARGET_IDS_FILE_NAME), ids[~is_collision])
+    with open(os.path.join(dir_path, COLLISIONS_FILE_NAME), "w") as fp:
+        json.dump(collisions, fp)
+
+
+class TitleIndex:
+    """Read only title to page id lookup backed by memory mapped arrays."""
+
+    def __init__(self, dir_path: str):
+        self.dir_path = dir_path
+        self.hashes = np.load(os.path.join(dir_path, HASHES_FILE_NAME), mmap_mode="r")
+        self.target_ids = np.load(os.path.join(dir_path, TARGET_IDS_FILE_NAME), mmap_mode="r")
+        with open(os.path.join(dir_path, COLLISIONS_FILE_NAME)) as fp:
+            self.collisions: Dict[str, int] = json.load(fp)
+
+    def __len__(self) -> int:
+        return len(self.hashes) + len(self.collisions)
+
+    def get(self, title: str, default: int = -1) -> int:
+        return int(self.get_many([title], default=default)[0])
+
+    def get_many(self, titles: Sequence[str], default: int = -1) -> np.ndarray:
+        """Return an int array with the page id of each title (or `default`)."""
+        result = np.full(len(titles), default, dtype=np.int64)
+        if len(titles) == 0:
+            return result
+        if len(self.hashes) > 0:
+            hashes = _hash_titles(titles)
+            idxs = np.searchsorted(self.hashes, hashes)
+            idxs[idxs == len(self.hashes)] = 0
+            found = self.hashes[idxs] == hashes
+            result[found] = self.target_ids[idxs[found]]
+        if self.collisions:
+            for ii, title in enumerate(titles):
+                if title in self.collisions:
+                    result[ii] = self.collisions[title]
+        return result
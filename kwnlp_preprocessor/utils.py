@@ -1,7 +1,19 @@
 # Copyright 2021-present Kensho Technologies, LLC.
+import json
+import logging
 import os
 import re
-from typing import List, Pattern, Union
+from typing import IO, Dict, List, Optional, Pattern, Sequence, Union
+
+import pandas as pd
+
+from kwnlp_preprocessor import chunk_codecs
+
+logger = logging.getLogger(__name__)
+
+
+GATHER_BUFFER_SIZE = 16 * 1024 * 1024
+GATHER_CHUNK_ROWS = 1_000_000
 
 
 def _get_ordered_files_from_path(path: str, pattern: Pattern) -> List[re.Match]:
@@ -15,3 +27,148 @@ def _get_ordered_files_from_path(path: str, pattern: Pattern) -> List[re.Match]:
     matches: List[re.Match] = [match for match in all_matches if match is not None]
     matches = sorted(matches, key=lambda x: tuple(int(grp) for grp in x.groups()))
     return matches
+
+
+def _read_csv_header(file_path: str) -> Optional[List[str]]:
+    with chunk_codecs.open_chunk(file_path, "rb") as fp:
+        header_line = fp.readline()
+    if not header_line:
+        return None
+    return header_line.decode("utf-8").rstrip("\r\n").split(",")
+
+
+def _copy_csv_body(ifp: IO[bytes], ofp: IO[bytes]) -> int:
+    """Copy the rest of `ifp` to `ofp` and return the number of lines copied."""
+    num_lines = 0
+    last_byte = b"\n"
+    while True:
+        buffer = ifp.read(GATHER_BUFFER_SIZE)
+        if not buffer:
+            break
+        ofp.write(buffer)
+        num_lines += buffer.count(b"\n")
+        last_byte = buffer[-1:]
+    if last_byte != b"\n":
+        ofp.write(b"\n")
+        num_lines += 1
+    return num_lines
+
+
+def _get_gather_file_paths(in_file_paths: Sequence[str], check_header: bool = True) -> List[str]:
+    """Return the non empty chunk files, checking that their headers match."""
+    headers = {file_path: _read_csv_header(file_path) for file_path in in_file_paths}
+    file_paths = [file_path for file_path in in_file_paths if headers[file_path] is not None]
+    if check_header:
+        for file_path in file_paths[1:]:
+            if headers[file_path] != headers[file_paths[0]]:
+                raise ValueError(
+                    f"header of {file_path} {headers[file_path]} does not match "
+                    f"header of {file_paths[0]} {headers[file_paths[0]]}"
+                )
+    return file_paths
+
+
+def gather_csv_files(
+    in_file_paths: Sequence[str],
+    out_file_path: str,
+    columns: Optional[Sequence[str]] = None,
+    check_header: bool = True,
+) -> int:
+    """Concatenate CSV chunk files (in order) into one CSV file.
+
+    Chunk files can be compressed with any codec in `chunk_codecs`. The
+    gathered file is not compressed.
+
+    Without `columns` the bytes of each chunk are copied into the output using
+    a fixed size buffer and only the header of the first chunk is kept. With
+    `columns` the chunks are read in pieces with pandas and only those columns
+    are written. Either way memory use does not grow with the size of the data.
+
+    Args:
+        in_file_paths: chunk files in the order they should be written
+        out_file_path: path of the gathered CSV file
+        columns: optional subset of the columns to write (in this order)
+        check_header: raise ValueError if the header of a chunk differs from the
+            header of the first chunk. empty chunk files are skipped.
+
+    Returns:
+        number of lines written (excluding the header). this is the number of
+        rows unless quoted values contain newlines.
+    """
+    file_paths = _get_gather_file_paths(in_file_paths, check_header=check_header)
+    os.makedirs(os.path.dirname(out_file_path) or os.curdir, exist_ok=True)
+    num_lines = 0
+    if columns is None:
+        with open(out_file_path, "wb") as ofp:
+            for ii, file_path in enumerate(file_paths):
+                logger.info(f"collecting from {file_path}")
+                with chunk_codecs.open_chunk(file_path, "rb") as ifp:
+                    header_line = ifp.readline()
+                    if ii == 0:
+                        ofp.write(header_line)
+                    num_lines += _copy_csv_body(ifp, ofp)
+    else:
+        with open(out_file_path, "w") as ofp:
+            for ii, file_path in enumerate(file_paths):
+                logger.info(f"collecting from {file_path}")
+                with chunk_codecs.open_chunk(file_path, "rb") as ifp:
+                    for jj, df in enumerate(
+                        pd.read_csv(ifp, usecols=columns, chunksize=GATHER_CHUNK_ROWS)
+                    ):
+                        df[list(columns)].to_csv(ofp, header=ii == 0 and jj == 0, index=False)
+                        num_lines += len(df)
+    return num_lines
+
+
+def _get_file_stats(file_paths: Sequence[str]) -> Dict[str, List[int]]:
+    stats = {}
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        stats[file_path] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def write_chunk_marker(
+    marker_path: str, args: Dict, input_paths: Sequence[str], output_paths: Sequence[str]
+) -> None:
+    """Mark a chunk as complete.
+
+    Must be called after all output files of the chunk are closed. Outputs are
+    synced to disk before the marker is atomically moved into place so that a
+    marker never refers to partially written data.
+    """
+    for output_path in output_paths:
+        with open(output_path, "rb") as fp:
+            os.fsync(fp.fileno())
+    marker = {
+        "args": args,
+        "inputs": _get_file_stats(input_paths),
+        "outputs": {path: stats[0] for path, stats in _get_file_stats(output_paths).items()},
+    }
+    os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+    tmp_marker_path = f"{marker_path}.tmp"
+    with open(tmp_marker_path, "w") as fp:
+        json.dump(marker, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_marker_path, marker_path)
+
+
+def is_chunk_complete(
+    marker_path: str, args: Dict, input_paths: Sequence[str], output_paths: Sequence[str]
+) -> bool:
+    """Return True if a chunk finished with the same args, inputs and intact outputs."""
+    if not os.path.exists(marker_path):
+        return False
+    with open(marker_path) as fp:
+        marker = json.load(fp)
+    if marker["args"] != json.loads(json.dumps(args)):
+        return False
+    if marker["inputs"] != _get_file_stats(input_paths):
+        return False
+    if sorted(marker["outputs"]) != sorted(output_paths):
+        return False
+    return all(
+        os.path.exists(path) and os.path.getsize(path) == size
+        for path, size in marker["outputs"].items()
+    )
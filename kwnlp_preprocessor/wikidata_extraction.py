@@ -0,0 +1,138 @@
+# Copyright 2021-present Kensho Technologies, LLC.
+"""Extra tables to extract from Wikidata in the same pass as the default ones.
+
+An extraction spec is a JSON file with a list of tables. Task 18p1 writes one
+table per entry while it filters the dump and task 21p1 gathers it into
+``wikidata-derived-{wd_yyyymmdd}/spec-{name}/``. For example,
+
+    {
+        "tables": [
+            {"name": "label", "kind": "labels", "languages": ["fr", "de"]},
+            {"name": "property-label", "kind": "labels", "entity_type": "property",
+             "languages": ["fr"]},
+            {"name": "location", "kind": "claims", "properties": ["P17", "P131"],
+             "truthy": true},
+            {"name": "sitelink", "kind": "sitelinks", "wikis": ["frwiki", "dewiki"]}
+        ]
+    }
+
+Table kinds and their columns (see KIND_COLUMN_TYPES for their types),
+
+* labels: {entity_type}_id, lang, label, description (entities with a label
+  or description in `languages`)
+* aliases: {entity_type}_id, lang, alias
+* claims: source_id, property_id, target_id, rnk (item valued claims of
+  `properties`. only the truthy claims if `truthy` is true)
+* sitelinks: item_id, wiki, title (items only)
+
+Like the default tables, items skipped by task 18p1 are left out.
+"""
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# pyarrow type names of the columns of each kind of table (see table_io.gather_tables)
+KIND_COLUMN_TYPES: Dict[str, Dict[str, str]] = {
+    "labels": {
+        "{entity_type}_id": "int64",
+        "lang": "string",
+        "label": "string",
+        "description": "string",
+    },
+    "aliases": {"{entity_type}_id": "int64", "lang": "string", "alias": "string"},
+    "claims": {"source_id": "int64", "property_id": "int64", "target_id": "int64", "rnk": "int64"},
+    "sitelinks": {"{entity_type}_id": "int64", "wiki": "string", "title": "string"},
+}
+# list of values each kind of table selects
+KIND_KEYS: Dict[str, str] = {
+    "labels": "languages",
+    "aliases": "languages",
+    "claims": "properties",
+    "sitelinks": "wikis",
+}
+ENTITY_TYPES = ("item", "property")
+
+_NAME_RE = re.compile(r"[a-z0-9][a-z0-9-]*")
+_PROPERTY_RE = re.compile(r"P[1-9]\d*")
+
+
+class TableSpec(NamedTuple):
+    name: str
+    kind: str
+    entity_type: str = "item"
+    languages: Tuple[str, ...] = ()
+    properties: Tuple[str, ...] = ()
+    wikis: Tuple[str, ...] = ()
+    truthy: bool = False
+
+    @property
+    def sample(self) -> str:
+        """Name of the table files and directories (e.g. spec-label)."""
+        return f"spec-{self.name}"
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.column_types)
+
+    @property
+    def column_types(self) -> Dict[str, str]:
+        return {
+            column.format(entity_type=self.entity_type): column_type
+            for column, column_type in KIND_COLUMN_TYPES[self.kind].items()
+        }
+
+
+def _parse_table(obj: Dict[str, Any]) -> TableSpec:
+    name = obj.get("name", "")
+    if not isinstance(name, str) or not _NAME_RE.fullmatch(name):
+        raise ValueError(f"table names must be lowercase letters, digits and -, got {name!r}")
+    unknown = set(obj) - set(TableSpec._fields)
+    if unknown:
+        raise ValueError(f"unknown keys {sorted(unknown)} in table {name}")
+    kind = obj.get("kind")
+    if kind not in KIND_COLUMN_TYPES:
+        raise ValueError(
+            f"kind must be one of {tuple(KIND_COLUMN_TYPES)}, got {kind} in table {name}"
+        )
+    entity_type = obj.get("entity_type", "item")
+    if entity_type not in ENTITY_TYPES or (kind == "sitelinks" and entity_type != "item"):
+        raise ValueError(f"entity_type {entity_type} can not be used in table {name}")
+    for key in ["languages", "properties", "wikis"]:
+        values = obj.get(key, [])
+        if not isinstance(values, list) or not all(isinstance(el, str) for el in values):
+            raise ValueError(f"{key} must be a list of strings in table {name}")
+        if bool(values) != (key == KIND_KEYS[kind]):
+            raise ValueError(f"{kind} tables need {KIND_KEYS[kind]} and no {key}, table {name}")
+    for property_id in obj.get("properties", []):
+        if not _PROPERTY_RE.fullmatch(property_id):
+            raise ValueError(f"properties must be ids like P31, got {property_id} in table {name}")
+    if not isinstance(obj.get("truthy", False), bool) or (obj.get("truthy") and kind != "claims"):
+        raise ValueError(f"truthy must be true or false and only set for claims, table {name}")
+    return TableSpec(
+        name=name,
+        kind=kind,
+        entity_type=entity_type,
+        languages=tuple(obj.get("languages", [])),
+        properties=tuple(obj.get("properties", [])),
+        wikis=tuple(obj.get("wikis", [])),
+        truthy=obj.get("truthy", False),
+    )
+
+
+def parse_spec(obj: Dict[str, Any]) -> List[TableSpec]:
+    """Return the tables of a decoded extraction spec. Raises ValueError if invalid."""
+    if not isinstance(obj, dict) or not isinstance(obj.get("tables"), list) or len(obj) > 1:
+        raise ValueError("an extraction spec must be an object with a list of tables")
+    tables = [_parse_table(table) for table in obj["tables"]]
+    names = [table.name for table in tables]
+    if len(set(names)) != len(names):
+        raise ValueError(f"table names must be unique, got {names}")
+    return tables
+
+
+def read_spec(file_path: str) -> List[TableSpec]:
+    """Return the tables of the extraction spec in `file_path` ("" for none)."""
+    if not file_path:
+        return []
+    with open(file_path) as fp:
+        return parse_spec(json.load(fp))
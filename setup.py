@@ -44,22 +44,28 @@ setup(
     author="Kensho Technologies LLC.",
     author_email="kwnlp@kensho.com",
     license="Apache 2.0",
-    packages=find_packages(exclude=["tests*"]),
+    packages=find_packages(exclude=["tests*", "benchmarks*"]),
     package_data={"": []},
     install_requires=[
-        "funcy",
         "kwnlp_dump_downloader>=0.1.0,<0.2",
         "kwnlp_sql_parser>=0.0.2,<0.1",
         "mwtext",
         "mwxml",
         "networkx",
+        "numpy",
         "pandas",
         "qwikidata>=0.4.1,<0.5",
     ],
     extras_require={
+        "columnar": [
+            "pyarrow",
+        ],
         "dev": [
             "pre-commit",
-        ]
+        ],
+        "fast": [
+            "orjson",
+        ],
     },
     classifiers=[
         "Development Status :: 4 - Beta",